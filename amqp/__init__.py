@@ -28,8 +28,8 @@ VERSION = version_info = version_info_t(
 del(_temp)
 del(re)
 
-from .basic_message import Message  # noqa
-from .channel import Channel        # noqa
+from .basic_message import CompactMessage, Message  # noqa
+from .channel import Channel, PreparedPublish  # noqa
 from .connection import Connection  # noqa
 from .exceptions import (           # noqa
     AMQPError,
@@ -40,6 +40,8 @@ from .exceptions import (           # noqa
     RecoverableChannelError,
     IrrecoverableChannelError,
     ConsumerCancelled,
+    MessageNacked,
+    PoolLimitExceeded,
     ContentTooLarge,
     NoConsumers,
     ConnectionForced,
@@ -65,7 +67,9 @@ from .utils import promise      # noqa
 __all__ = [
     'Connection',
     'Channel',
+    'PreparedPublish',
     'Message',
+    'CompactMessage',
     'promise',
     'AMQPError',
     'ConnectionError',
@@ -75,6 +79,8 @@ __all__ = [
     'RecoverableChannelError',
     'IrrecoverableChannelError',
     'ConsumerCancelled',
+    'MessageNacked',
+    'PoolLimitExceeded',
     'ContentTooLarge',
     'NoConsumers',
     'ConnectionForced',
@@ -76,7 +76,7 @@ class AbstractChannel(object):
 
         try:
             while not p.ready:
-                self.connection.drain_events(timeout=timeout)
+                self._drain_events(timeout)
 
             if p.value:
                 args, kwargs = p.value
@@ -88,6 +88,10 @@ class AbstractChannel(object):
                 else:
                     pending.pop(m, None)
 
+    def _drain_events(self, timeout=None):
+        # Wait for and dispatch the methods received on this channel.
+        return self.connection.drain_events(timeout=timeout)
+
     def dispatch_method(self, method_sig, payload, content):
         if content and \
                 self.auto_decode and \
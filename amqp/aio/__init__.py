@@ -0,0 +1,16 @@
+"""asyncio AMQP client.
+
+Requires Python 3.5 or later, and is not installed on older versions.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import sys
+
+if sys.version_info < (3, 5):  # pragma: no cover
+    raise ImportError('amqp.aio requires Python 3.5 or later')
+
+from .channel import Channel  # noqa
+from .connection import Connection  # noqa
+from .transport import AsyncTransport  # noqa
+
+__all__ = ['Connection', 'Channel', 'AsyncTransport']
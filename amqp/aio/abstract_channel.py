@@ -0,0 +1,86 @@
+"""Code common to the asyncio Connection and Channel objects."""
+from __future__ import absolute_import, unicode_literals
+
+import socket
+
+from vine import ensure_promise
+
+from .. import abstract_channel
+
+__all__ = ['AbstractChannel']
+
+
+class AbstractChannel(abstract_channel.AbstractChannel):
+    """Superclass for the asyncio Connection and Channel.
+
+    Methods are dispatched by the event loop as soon as they are
+    received, so instead of draining events until the reply arrives,
+    :meth:`wait` returns a :class:`asyncio.Future` that is completed
+    by the reply.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._waiters = {}
+        super(AbstractChannel, self).__init__(*args, **kwargs)
+
+    def wait(self, method, callback=None, timeout=None, returns_tuple=False):
+        """Wait for one of the given methods to be received.
+
+        The waiter is registered before this returns, so that a reply
+        to a method sent just before cannot be missed.
+
+        Returns:
+            asyncio.Future: completed with the arguments of the method,
+                or failed with :exc:`socket.timeout` if it was not
+                received within ``timeout`` seconds.
+        """
+        fut = self.connection.loop.create_future()
+        p = ensure_promise(callback)
+        pending = self._pending
+        if not isinstance(method, list):
+            method = [method]
+        prev_p = [pending.get(m) for m in method]
+        for m in method:
+            pending[m] = p
+
+        restored = []
+
+        def restore(*args):
+            if restored:
+                return
+            restored.append(True)
+            if timer is not None:
+                timer.cancel()
+            self._waiters.pop(fut, None)
+            for i, m in enumerate(method):
+                if prev_p[i] is not None:
+                    pending[m] = prev_p[i]
+                elif pending.get(m) is p:
+                    pending.pop(m, None)
+
+        def on_ready(*args, **kwargs):
+            if not fut.done():
+                restore()
+                result = None
+                if p.value:
+                    args, kwargs = p.value
+                    result = args if returns_tuple else (args and args[0])
+                fut.set_result(result)
+
+        def on_error(exc):
+            if not fut.done():
+                restore()
+                fut.set_exception(exc)
+
+        timer = None
+        if timeout is not None:
+            timer = self.connection.loop.call_later(
+                timeout, on_error, socket.timeout())
+        p.then(on_ready, on_error)
+        fut.add_done_callback(restore)  # cancelled
+        self._waiters[fut] = on_error
+        return fut
+
+    def _fail_waiters(self, exc):
+        for on_error in list(self._waiters.values()):
+            on_error(exc)
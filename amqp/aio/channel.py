@@ -0,0 +1,251 @@
+"""asyncio AMQP Channels."""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import logging
+import socket
+
+from .. import channel, spec
+from ..exceptions import (ChannelError, RecoverableChannelError,
+                          error_for_code)
+from ..protocol import queue_declare_ok_t
+from .abstract_channel import AbstractChannel
+
+__all__ = ['Channel']
+
+AMQP_LOGGER = logging.getLogger('amqp')
+
+
+class Channel(AbstractChannel, channel.Channel):
+    """asyncio AMQP Channel.
+
+    Works like :class:`amqp.channel.Channel`, except that the methods
+    waiting for a reply from the server return awaitables, and
+    :meth:`basic_publish`, :meth:`basic_consume`, :meth:`basic_get`,
+    :meth:`queue_declare` and :meth:`wait_for_confirms` are coroutines.
+
+    Example:
+        >>> async def main():
+        ...     async with Connection('localhost') as conn:
+        ...         channel = await conn.channel()
+        ...         await channel.basic_publish(Message('hello'), 'ex')
+    """
+
+    #: Timer flushing the coalesced acks, see :meth:`coalesce_acks`.
+    _ack_timer = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def open(self):
+        """Open a channel for use.
+
+        Returns:
+            asyncio.Future: completed when the channel is open.
+        """
+        if self.is_open:
+            return self._done(None)
+        return super(Channel, self).open()
+
+    async def close(self, reply_code=0, reply_text='', method_sig=(0, 0),
+                    argsig='BsBB'):
+        """Request a channel close.
+
+        See :meth:`amqp.channel.Channel.close`.
+        """
+        try:
+            is_closed = (
+                not self.is_open or
+                self.connection is None or
+                self.connection.channels is None
+            )
+            if is_closed:
+                return
+
+            self._flush_acks()
+            # the connection is needed to release the channel
+            # once the Close-Ok is received.
+            await self.send_method(
+                spec.Channel.Close, argsig,
+                (reply_code, reply_text, method_sig[0], method_sig[1]),
+                wait=spec.Channel.CloseOk,
+            )
+        finally:
+            self.connection = None
+
+    def _schedule_ack_flush(self, delay):
+        # A consumer awaiting something else than drain_events()
+        # would otherwise keep the acks, and the prefetch credit.
+        if self._ack_timer is None and self.connection is not None:
+            self._ack_timer = self.connection.loop.call_later(
+                delay, self._on_ack_timer)
+
+    def _on_ack_timer(self):
+        self._ack_timer = None
+        if self.connection is None:
+            return
+        try:
+            self._flush_acks()
+        except Exception as exc:
+            AMQP_LOGGER.error(
+                'Cannot send acks on channel %s: %r', self.channel_id, exc,
+                exc_info=1)
+
+    def _flush_acks(self):
+        if self._ack_timer is not None:
+            self._ack_timer.cancel()
+            self._ack_timer = None
+        super(Channel, self)._flush_acks()
+
+    def _on_close(self, reply_code, reply_text, class_id, method_id):
+        self._fail_waiters(error_for_code(
+            reply_code, reply_text, (class_id, method_id), ChannelError,
+        ))
+        return super(Channel, self)._on_close(
+            reply_code, reply_text, class_id, method_id)
+
+    def _done(self, result):
+        fut = self.connection.loop.create_future()
+        fut.set_result(result)
+        return fut
+
+    async def queue_declare(self, queue='', passive=False, durable=False,
+                            exclusive=False, auto_delete=True, nowait=False,
+                            arguments=None, argsig='BsbbbbbF'):
+        """Declare queue, create if needed.
+
+        See :meth:`amqp.channel.Channel.queue_declare`.
+        """
+        self.send_method(
+            spec.Queue.Declare, argsig,
+            (0, queue, passive, durable, exclusive, auto_delete,
+             nowait, arguments),
+        )
+        if not nowait:
+            return queue_declare_ok_t(*(await self.wait(
+                spec.Queue.DeclareOk, returns_tuple=True,
+            )))
+
+    async def basic_consume(self, queue='', consumer_tag='', no_local=False,
+                            no_ack=False, exclusive=False, nowait=False,
+                            callback=None, arguments=None, on_cancel=None,
+                            argsig='BssbbbbF'):
+        """Start a queue consumer.
+
+        See :meth:`amqp.channel.Channel.basic_consume`.
+
+        Returns:
+            str: the consumer tag.
+        """
+        def on_consume_ok(consumer_tag):
+            # Registered before the messages following the Consume-Ok
+            # are dispatched, as they may arrive in the same packet.
+            self.callbacks[consumer_tag] = callback
+            if on_cancel:
+                self.cancel_callbacks[consumer_tag] = on_cancel
+            if no_ack:
+                self.no_ack_consumers.add(consumer_tag)
+            return consumer_tag
+
+        self.send_method(
+            spec.Basic.Consume, argsig,
+            (0, queue, consumer_tag, no_local, no_ack, exclusive,
+             nowait, arguments),
+        )
+        if nowait:
+            return on_consume_ok(consumer_tag)
+        return await self.wait(spec.Basic.ConsumeOk, callback=on_consume_ok)
+
+    async def basic_get(self, queue='', no_ack=False, argsig='Bsb'):
+        """Direct access to a queue.
+
+        See :meth:`amqp.channel.Channel.basic_get`.
+
+        Returns:
+            ~amqp.basic_message.Message: the message,
+                or :const:`None` if the queue is empty.
+        """
+        ret = await self.send_method(
+            spec.Basic.Get, argsig, (0, queue, no_ack),
+            wait=[spec.Basic.GetOk, spec.Basic.GetEmpty], returns_tuple=True,
+        )
+        if not ret or len(ret) < 2:
+            return self._on_get_empty(*ret)
+        return self._on_get_ok(*ret)
+
+    async def basic_publish(self, msg, exchange='', routing_key='',
+                            mandatory=False, immediate=False, timeout=None,
+                            argsig='Bssbb'):
+        """Publish message to an exchange.
+
+        The message is written to the event loop buffer, and this
+        only waits for the buffer to be flushed if it has reached the
+        high-water mark.
+
+        See :meth:`amqp.channel.Channel.basic_publish`.
+
+        Raises:
+            ~amqp.exceptions.RecoverableChannelError: if the buffer was
+                not flushed within ``timeout`` seconds.
+        """
+        ret = self._basic_publish(
+            msg, exchange, routing_key, mandatory, immediate,
+            argsig=argsig,
+        )
+        try:
+            await asyncio.wait_for(self.connection.transport.drain(), timeout)
+        except asyncio.TimeoutError:
+            raise RecoverableChannelError('basic_publish: timed out')
+        return ret
+
+    async def basic_publish_confirm(self, *args, **kwargs):
+        if not self._confirm_selected:
+            self._confirm_selected = True
+            await self.confirm_select()
+        p = await Channel.basic_publish(self, *args, **kwargs)
+        await self._wait_promises([p])
+        if p.failed:
+            # MessageNacked if rejected by the broker.
+            raise p.reason
+        return p
+
+    def _wait_confirmed(self, promises):
+        # Called by PreparedPublish, which cannot block the event loop:
+        # the promises are returned, see wait_for_confirms().
+        pass
+
+    async def wait_for_confirms(self, timeout=None):
+        """Wait for the broker to confirm all published messages.
+
+        See :meth:`amqp.channel.Channel.wait_for_confirms`.
+        """
+        if self._unconfirmed is None:
+            raise ChannelError(
+                'wait_for_confirms: channel is not in confirm mode')
+        try:
+            await asyncio.wait_for(
+                self._wait_promises(list(self._unconfirmed.values())),
+                timeout,
+            )
+        except asyncio.TimeoutError:
+            raise socket.timeout()
+        nacked, self._nacked = self._nacked, False
+        return not nacked
+
+    def _wait_promises(self, promises):
+        # Futures completed when the promises are fulfilled or failed,
+        # ignoring the errors (rejected messages are reported
+        # by the promise itself).
+        loop = self.connection.loop
+        futures = []
+        for p in promises:
+            fut = loop.create_future()
+            p.then(
+                lambda *args, fut=fut: fut.done() or fut.set_result(None),
+                lambda exc, fut=fut: fut.done() or fut.set_result(None),
+            )
+            futures.append(fut)
+        return asyncio.gather(*futures)
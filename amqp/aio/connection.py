@@ -0,0 +1,209 @@
+"""asyncio AMQP Connections."""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import logging
+import socket
+
+from .. import connection, spec
+from ..exceptions import (ConnectionError, ConnectionForced,
+                          RecoverableConnectionError, error_for_code)
+from ..five import values
+from .abstract_channel import AbstractChannel
+from .channel import Channel
+from .transport import AsyncTransport
+
+__all__ = ['Connection']
+
+AMQP_LOGGER = logging.getLogger('amqp')
+
+
+class Connection(AbstractChannel, connection.Connection):
+    """asyncio AMQP Connection.
+
+    Works like :class:`amqp.connection.Connection`, but the frames
+    are read by the event loop and dispatched as soon as they are
+    received, so any number of connections can be served by a single
+    thread.
+
+    :meth:`connect`, :meth:`channel`, :meth:`close` and
+    :meth:`drain_events` are coroutines, and the methods waiting for
+    a reply from the server return awaitables, see
+    :class:`amqp.aio.channel.Channel`.
+
+    Heartbeats are sent and checked by the event loop, so there's no
+    need to call :meth:`heartbeat_tick`.
+
+    Errors raised by the handlers of methods that were not waited for,
+    like a consumer cancelled by the server, are raised by
+    :meth:`drain_events` if it's being awaited, and logged otherwise.
+
+    Keyword Arguments:
+        loop (asyncio.AbstractEventLoop): Event loop to use,
+            by default the current event loop.
+    """
+
+    Channel = Channel
+
+    def __init__(self, *args, loop=None, **kwargs):
+        self.loop = loop
+        self._drainers = set()
+        self._heartbeat_timer = None
+        super(Connection, self).__init__(*args, **kwargs)
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def Transport(self, host, connect_timeout,
+                  ssl=False, read_timeout=None, write_timeout=None,
+                  socket_settings=None, **kwargs):
+        return AsyncTransport(
+            host, connect_timeout=connect_timeout, ssl=ssl, loop=self.loop,
+            **kwargs)
+
+    async def connect(self, callback=None):
+        """Connect to the server and wait for the handshake to complete."""
+        if self.connected:
+            return callback() if callback else None
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        self.transport = self.Transport(
+            self.host, self.connect_timeout, self.ssl,
+            self.read_timeout, self.write_timeout,
+            socket_settings=self.socket_settings,
+        )
+        self.on_inbound_frame = self.frame_handler_cls(
+            self, self.on_inbound_method)
+        self.frame_writer = self.frame_writer_cls(self, self.transport)
+        self.transport.on_frame = self.on_inbound_frame
+        self.transport.on_error = self._on_transport_error
+
+        opened = self.wait(spec.Connection.OpenOk,
+                           timeout=self.connect_timeout)
+        try:
+            await self.transport.connect()
+        except BaseException:
+            opened.cancel()
+            raise
+        await opened
+        self._schedule_heartbeat()
+        if callback:
+            return callback()
+
+    async def channel(self, channel_id=None, callback=None):
+        """Create new channel, and wait for it to be opened.
+
+        See :meth:`amqp.connection.Connection.channel`.
+        """
+        if self.channels is None:
+            raise RecoverableConnectionError('Connection already closed.')
+        try:
+            return self.channels[channel_id]
+        except KeyError:
+            channel = self.Channel(self, channel_id, on_open=callback)
+            await channel.open()
+            return channel
+
+    async def close(self, *args, **kwargs):
+        """Request a connection close.
+
+        See :meth:`amqp.connection.Connection.close`.
+        """
+        fut = super(Connection, self).close(*args, **kwargs)
+        if fut is not None:
+            await fut
+
+    async def drain_events(self, timeout=None):
+        """Wait for the next method to be dispatched.
+
+        Methods are dispatched by the event loop whether or not this
+        is awaited.
+
+        Raises:
+            socket.timeout: if no method was received within
+                ``timeout`` seconds.
+            Exception: raised while dispatching the method.
+        """
+        if self._ack_channels:
+            self._flush_acks()
+        fut = self.loop.create_future()
+        self._drainers.add(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            raise socket.timeout()
+        finally:
+            self._drainers.discard(fut)
+
+    def _wake_drainers(self, exc=None):
+        drainers, self._drainers = self._drainers, set()
+        for fut in drainers:
+            if not fut.done():
+                if exc is None:
+                    fut.set_result(None)
+                else:
+                    fut.set_exception(exc)
+        return bool(drainers)
+
+    def on_inbound_method(self, channel_id, method_sig, payload, content):
+        try:
+            self.channels[channel_id].dispatch_method(
+                method_sig, payload, content,
+            )
+        except Exception as exc:
+            if not self._wake_drainers(exc):
+                AMQP_LOGGER.error(
+                    'Unhandled error on channel %s: %r', channel_id, exc,
+                    exc_info=1)
+        else:
+            if self._drainers:
+                self._wake_drainers()
+
+    def _on_transport_error(self, exc):
+        # The connection can't be used after the transport failed.
+        if self.channels is None:
+            return
+        self._fail_all_waiters(exc)
+        if not self._wake_drainers(exc):
+            AMQP_LOGGER.error('Connection failed: %r', exc)
+        self.collect()
+
+    def _fail_all_waiters(self, exc):
+        for channel in list(values(self.channels or {})):
+            channel._fail_waiters(exc)
+
+    def _on_close(self, reply_code, reply_text, class_id, method_id):
+        self._fail_all_waiters(error_for_code(
+            reply_code, reply_text, (class_id, method_id), ConnectionError,
+        ))
+        return super(Connection, self)._on_close(
+            reply_code, reply_text, class_id, method_id)
+
+    def collect(self):
+        if self._heartbeat_timer is not None:
+            self._heartbeat_timer.cancel()
+            self._heartbeat_timer = None
+        # Channel requests will never be answered now.
+        exc = RecoverableConnectionError('connection already closed')
+        for channel in list(values(self.channels or {})):
+            if channel is not self:
+                channel._fail_waiters(exc)
+        super(Connection, self).collect()
+
+    def _schedule_heartbeat(self):
+        if self.heartbeat:
+            self._heartbeat_timer = self.loop.call_later(
+                self.heartbeat / 2.0, self._on_heartbeat_timer)
+
+    def _on_heartbeat_timer(self):
+        self._heartbeat_timer = None
+        try:
+            self.heartbeat_tick()
+        except ConnectionForced as exc:
+            self._on_transport_error(exc)
+        else:
+            self._schedule_heartbeat()
@@ -0,0 +1,156 @@
+"""asyncio transport."""
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import ssl as _ssl
+from contextlib import contextmanager
+
+from ..exceptions import RecoverableConnectionError, UnexpectedFrame
+from ..platform import unpack_from
+from ..transport import AMQP_PROTOCOL_HEADER, to_host_port
+
+__all__ = ['AsyncTransport']
+
+
+class AsyncTransport(asyncio.Protocol):
+    """asyncio protocol splitting the byte stream into AMQP frames.
+
+    Complete frames are passed to :attr:`on_frame` as soon as they are
+    received, in the same ``(frame_type, channel, payload)`` form as
+    returned by :meth:`amqp.transport._AbstractTransport.read_frame`,
+    so that the frame handler of the connection can be used unchanged.
+
+    The write methods mirror the blocking transports, so the same
+    frame writer can be used: writes never block, but are buffered by
+    the event loop, see :meth:`drain`.
+    """
+
+    #: Called with every complete frame received.
+    on_frame = None
+
+    #: Called with the exception raised by :attr:`on_frame`, or
+    #: when the connection is lost.
+    on_error = None
+
+    def __init__(self, host, connect_timeout=None, ssl=False, loop=None,
+                 **kwargs):
+        self.host = host
+        self.connect_timeout = connect_timeout
+        self.ssl = ssl
+        self.loop = loop
+        self.connected = False
+        self._transport = None
+        self._buffer = bytearray()
+        self._paused = False
+        self._drain_waiters = []
+
+    async def connect(self):
+        host, port = to_host_port(self.host)
+        loop = self.loop or asyncio.get_event_loop()
+        ssl = self.ssl
+        if ssl is True:
+            ssl = _ssl.create_default_context()
+        await asyncio.wait_for(
+            loop.create_connection(lambda: self, host, port, ssl=ssl or None),
+            self.connect_timeout,
+        )
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self.connected = True
+        transport.write(AMQP_PROTOCOL_HEADER)
+
+    def connection_lost(self, exc):
+        was_connected, self.connected = self.connected, False
+        self._transport = None
+        self._wake_drain_waiters(exc)
+        if was_connected and self.on_error is not None:
+            self.on_error(exc or RecoverableConnectionError(
+                'Server unexpectedly closed connection'))
+
+    def data_received(self, data, unpack_from=unpack_from):
+        buf = self._buffer
+        buf.extend(data)
+        end = len(buf)
+        offset = 0
+        view = memoryview(buf)
+        try:
+            while end - offset >= 7:
+                frame_type, channel, size = unpack_from('>BHI', buf, offset)
+                if end - offset < size + 8:
+                    break
+                start, offset = offset + 7, offset + size + 8
+                if buf[offset - 1] != 206:  # '\xce'
+                    raise UnexpectedFrame(
+                        'Received {0:#04x} while expecting 0xce'.format(
+                            buf[offset - 1]))
+                payload = view[start:offset - 1].tobytes()
+                self.on_frame((frame_type, channel, payload))
+                if self._transport is None:
+                    # connection closed while handling the frame.
+                    return
+        except Exception as exc:
+            self.close()
+            self.on_error(exc)
+        finally:
+            view.release()
+            del buf[:offset]
+
+    def pause_writing(self):
+        self._paused = True
+
+    def resume_writing(self):
+        self._paused = False
+        self._wake_drain_waiters()
+
+    def _wake_drain_waiters(self, exc=None):
+        waiters, self._drain_waiters = self._drain_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                if exc is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(exc)
+
+    async def drain(self):
+        """Wait until the write buffer of the event loop is flushed.
+
+        Only waits if the buffer has reached the high-water mark,
+        see :meth:`asyncio.WriteTransport.set_write_buffer_limits`.
+        """
+        if self._transport is None:
+            raise RecoverableConnectionError('connection already closed')
+        if self._paused:
+            waiter = (self.loop or asyncio.get_event_loop()).create_future()
+            self._drain_waiters.append(waiter)
+            await waiter
+
+    @contextmanager
+    def having_timeout(self, timeout):
+        # writes are buffered by the event loop and never block.
+        yield self
+
+    def write(self, s):
+        if self._transport is None:
+            raise RecoverableConnectionError('connection already closed')
+        # the frame writer reuses its buffer, and the event loop may keep
+        # a reference to the data it could not send immediately.
+        self._transport.write(bytes(s))
+
+    def writev(self, buffers):
+        if self._transport is None:
+            raise RecoverableConnectionError('connection already closed')
+        # the buffers passed by the frame writer never reference
+        # the reused frame buffer, so they can be passed on as is.
+        self._transport.writelines(buffers)
+
+    def close(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+        self.connected = False
+
+    @property
+    def sock(self):
+        if self._transport is not None:
+            return self._transport.get_extra_info('socket')
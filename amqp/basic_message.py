@@ -14,7 +14,7 @@ from .serialization import GenericContent
 #   http://stackoverflow.com/a/14216937/4982251
 from .spec import Basic
 
-__all__ = ['Message']
+__all__ = ['Message', 'CompactMessage']
 
 
 class Message(GenericContent):
@@ -24,6 +24,13 @@ class Message(GenericContent):
 
         body: string
         children: (not supported)
+        body_size: int
+
+    The body can also be a :class:`mmap.mmap`, a file object or an
+    iterator of chunks, which are streamed when published instead of
+    being read in memory.  ``body_size`` is the size of the body, it
+    must be set for iterators, and for file objects to only send part
+    of the rest of the file.
 
     Keyword properties may include:
 
@@ -102,13 +109,18 @@ class Message(GenericContent):
         ('cluster_id', 's')
     ]
 
-    #: set by basic_consume/basic_get
-    delivery_info = None
+    # __dict__ is kept so that any attribute can still be set.
+    __slots__ = ('channel', 'delivery_info', '__dict__')
 
-    def __init__(self, body='', children=None, channel=None, **properties):
+    def __init__(self, body='', children=None, channel=None, body_size=None,
+                 **properties):
         super(Message, self).__init__(**properties)
         self.body = body
+        # None while unknown, 0 is the size of an empty body.
+        self.body_size = body_size
         self.channel = channel
+        #: set by basic_consume/basic_get
+        self.delivery_info = None
 
     @property
     def headers(self):
@@ -117,3 +129,67 @@ class Message(GenericContent):
     @property
     def delivery_tag(self):
         return self.delivery_info.get('delivery_tag')
+
+    def _set_delivery_info(self, delivery_tag, redelivered, exchange,
+                           routing_key, consumer_tag=None,
+                           message_count=None):
+        # consumer_tag is set by basic_consume, message_count by basic_get.
+        info = {
+            'delivery_tag': delivery_tag,
+            'redelivered': redelivered,
+            'exchange': exchange,
+            'routing_key': routing_key,
+        }
+        if consumer_tag is not None:
+            info['consumer_tag'] = consumer_tag
+        if message_count is not None:
+            info['message_count'] = message_count
+        self.delivery_info = info
+
+
+class CompactMessage(Message):
+    """Message using less memory, for many messages in flight.
+
+    The delivery information is kept in attributes, and the
+    :attr:`delivery_info` dictionary is only created when accessed.
+
+    Enabled using the ``message_class`` argument of
+    :class:`~amqp.Connection`.
+    """
+
+    __slots__ = (
+        'delivery_tag', 'consumer_tag', 'redelivered', 'exchange',
+        'routing_key', 'message_count', '_delivery_info',
+    )
+
+    _DELIVERY_INFO = (
+        'delivery_tag', 'consumer_tag', 'redelivered', 'exchange',
+        'routing_key', 'message_count',
+    )
+
+    @property
+    def delivery_info(self):
+        if self._delivery_info is None and self.delivery_tag is not None:
+            self._delivery_info = {
+                key: getattr(self, key) for key in self._DELIVERY_INFO
+                if getattr(self, key) is not None
+            }
+        return self._delivery_info
+
+    @delivery_info.setter
+    def delivery_info(self, info):
+        info = info or {}
+        for key in self._DELIVERY_INFO:
+            setattr(self, key, info.get(key))
+        self._delivery_info = info or None
+
+    def _set_delivery_info(self, delivery_tag, redelivered, exchange,
+                           routing_key, consumer_tag=None,
+                           message_count=None):
+        self.delivery_tag = delivery_tag
+        self.redelivered = redelivered
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.consumer_tag = consumer_tag
+        self.message_count = message_count
+        self._delivery_info = None
@@ -4,20 +4,24 @@ from __future__ import absolute_import, unicode_literals
 
 import logging
 import socket
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from warnings import warn
 
-from vine import ensure_promise
+from vine import ensure_promise, promise
 
 from . import spec
 from .abstract_channel import AbstractChannel
-from .exceptions import (ChannelError, ConsumerCancelled,
+from .exceptions import (ChannelError, ConsumerCancelled, MessageNacked,
                          RecoverableChannelError, RecoverableConnectionError,
                          error_for_code)
-from .five import Queue
+from .five import Queue, monotonic, values
+from .method_framing import FRAME_END
+from .platform import pack
 from .protocol import queue_declare_ok_t
+from .serialization import dumps, loads
+from .utils import str_to_bytes
 
-__all__ = ['Channel']
+__all__ = ['Channel', 'PreparedPublish']
 
 AMQP_LOGGER = logging.getLogger('amqp')
 
@@ -36,6 +40,274 @@ class VDeprecationWarning(DeprecationWarning):
     pass
 
 
+class _ConsumerBatch(object):
+    """Messages of a batch consumer, not yet passed to its callback.
+
+    See the ``batch_size`` argument of :meth:`Channel.basic_consume`.
+    """
+
+    def __init__(self, callback, size, timeout=0):
+        self.callback = callback
+        self.size = size
+        self.timeout = timeout
+        self.messages = []
+        #: Time the first message of the batch was received.
+        self.since = None
+
+    def __call__(self, message):
+        messages = self.messages
+        if not messages:
+            self.since = monotonic()
+        messages.append(message)
+        if len(messages) >= self.size:
+            self.flush()
+
+    def flush(self):
+        messages, self.messages = self.messages, []
+        if messages:
+            self.callback(messages)
+
+
+class _ConsumerStream(object):
+    """Callbacks of a streaming consumer.
+
+    See the ``on_chunk`` argument of :meth:`Channel.basic_consume`.
+    """
+
+    def __init__(self, on_header, on_chunk, on_complete=None):
+        self.on_header = on_header
+        self.on_chunk = on_chunk
+        self.on_complete = on_complete
+
+    def __call__(self, message):
+        # Called as the consumer callback when the header is received.
+        if self.on_header is not None:
+            self.on_header(message)
+
+    def complete(self, message):
+        if self.on_complete is not None:
+            self.on_complete(message)
+
+
+class _AckCoalescer(object):
+    """Acknowledgements of a channel, not sent yet.
+
+    See :meth:`Channel.coalesce_acks`.
+    """
+
+    def __init__(self, channel, max_pending, max_delay):
+        self.channel = channel
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.reset()
+
+    def reset(self):
+        #: Every message up to this delivery tag is acknowledged
+        #: or does not need to be, so they can be acknowledged
+        #: together by a single ack with ``multiple`` set.
+        self.settled = 0
+        #: Highest delivery tag up to ``settled`` acknowledged but not
+        #: sent yet, or 0.  The multiple ack is sent with this tag,
+        #: as the tags above may have been rejected or acked already.
+        self.unsent = 0
+        #: Delivery tags above ``settled`` acknowledged, but not sent yet.
+        self.acked = set()
+        #: Delivery tags above ``settled`` acknowledged already,
+        #: rejected or delivered to a ``no_ack`` consumer.
+        self.done = set()
+        #: Highest delivery tag received.
+        self.delivered = 0
+        #: Number of acks not sent yet, and time of the first one.
+        self.pending = 0
+        self.since = None
+
+    def on_delivered(self, delivery_tag, no_ack=False):
+        if delivery_tag > self.delivered:
+            self.delivered = delivery_tag
+        if no_ack:
+            self.settle(delivery_tag)
+
+    def ack(self, delivery_tag):
+        if delivery_tag == self.settled + 1:
+            self.settled = self.unsent = delivery_tag
+            self._advance()
+        else:
+            self.acked.add(delivery_tag)
+        if not self.pending:
+            self.since = monotonic()
+            self.channel.connection._ack_channels.add(self.channel)
+            self.channel._schedule_ack_flush(self.max_delay)
+        self.pending += 1
+        if self.pending >= self.max_pending or \
+                monotonic() - self.since >= self.max_delay:
+            self.flush()
+
+    def settle(self, delivery_tag):
+        if delivery_tag == self.settled + 1:
+            self.settled = delivery_tag
+            self._advance()
+        elif delivery_tag > self.settled:
+            self.done.add(delivery_tag)
+
+    def settle_through(self, delivery_tag):
+        # all messages up to delivery_tag are settled, by a method
+        # with multiple set sent after flush().
+        if delivery_tag > self.settled:
+            self.settled = delivery_tag
+            self.done = {tag for tag in self.done if tag > delivery_tag}
+            self._advance()
+
+    def _advance(self):
+        settled, acked, done = self.settled + 1, self.acked, self.done
+        while 1:
+            if settled in acked:
+                acked.discard(settled)
+                self.unsent = settled
+            elif settled in done:
+                done.discard(settled)
+            else:
+                break
+            settled += 1
+        self.settled = settled - 1
+
+    def flush(self):
+        send_method = self.channel.send_method
+        if self.unsent:
+            unsent, self.unsent = self.unsent, 0
+            send_method(spec.Basic.Ack, 'Lb', (unsent, True))
+        if self.acked:
+            # out of order, sent one by one.
+            acked, self.acked = self.acked, set()
+            for delivery_tag in sorted(acked):
+                send_method(spec.Basic.Ack, 'Lb', (delivery_tag, False))
+            self.done.update(acked)
+        self.pending = 0
+        if self.channel.connection is not None:
+            self.channel.connection._ack_channels.discard(self.channel)
+
+
+class PreparedPublish(object):
+    """Publish messages differing only by their body.
+
+    The Basic.Publish method frame and the content header frame
+    are encoded once, from the exchange, the routing key and the
+    properties of a prototype message, so publishing a message only
+    packs the body size and the body frames.
+
+    Created by :meth:`Channel.prepare_publish`.
+
+    Example:
+        >>> prototype = Message(content_type='application/json',
+        ...                     delivery_mode=2)
+        >>> publish = channel.prepare_publish(
+        ...     prototype, exchange='metrics', routing_key='cpu')
+        >>> publish(b'{"load": 0.7}')
+
+    Note:
+        The properties of the prototype are copied when created,
+        later changes to the prototype are not seen.
+
+    Note:
+        If ``confirm_publish`` is enabled for the connection, the
+        channel is put in confirm mode when first used, and every call
+        waits for the messages to be confirmed, like
+        :meth:`Channel.basic_publish` does.
+    """
+
+    def __init__(self, channel, prototype, exchange='', routing_key='',
+                 mandatory=False, immediate=False, argsig='Bssbb'):
+        self.channel = channel
+        self.exchange = exchange
+        self.routing_key = routing_key
+        channel_id = channel.channel_id
+        method = b''.join([
+            pack('>HH', *spec.Basic.Publish),
+            dumps(argsig, (0, exchange, routing_key, mandatory, immediate)),
+        ])
+        properties = prototype._serialize_properties()
+        # method frame, and content header frame up to the body size.
+        self._head = b''.join([
+            pack('>BHI', 1, channel_id, len(method)), method, FRAME_END,
+            pack('>BHIHH', 2, channel_id, 12 + len(properties),
+                 spec.Basic.CLASS_ID, 0),
+        ])
+        self._tail = properties + FRAME_END
+        self._channel_id = channel_id
+
+    def __call__(self, body, timeout=None):
+        """Publish a message with this body.
+
+        Returns the confirmation promise if the channel is
+        in confirm mode (see :meth:`Channel.confirm_select`).
+        """
+        return self._publish([body], timeout)[0]
+
+    def publish_batch(self, bodies, timeout=None):
+        """Publish a message for every body, written at once.
+
+        See :meth:`Channel.basic_publish_batch`.
+        """
+        return self._publish(bodies, timeout)
+
+    def _publish(self, bodies, timeout=None):
+        channel = self.channel
+        connection = channel.connection
+        if not connection or channel.channel_id != self._channel_id:
+            raise RecoverableConnectionError(
+                'prepared publish: channel closed')
+        confirm = connection.confirm_publish
+        if confirm and not channel._confirm_selected:
+            channel._confirm_selected = True
+            channel.confirm_select()
+        lock = connection.write_lock
+        if lock is not None:
+            lock.acquire()
+        try:
+            buffers = []
+            count = 0
+            for body in bodies:
+                self._frames(body, connection.frame_max - 8, buffers)
+                count += 1
+            if not count:
+                return []
+            promises = channel._track_confirms(count)
+            transport = connection.transport
+            try:
+                with transport.having_timeout(timeout):
+                    transport.writev(buffers)
+            except socket.timeout:
+                channel._untrack_confirms(promises)
+                raise RecoverableChannelError(
+                    'prepared publish: timed out')
+            except Exception:
+                channel._untrack_confirms(promises)
+                raise
+            connection.bytes_sent += count
+        finally:
+            if lock is not None:
+                lock.release()
+        if promises is None:
+            return [None] * count
+        if confirm:
+            channel._wait_confirmed(promises)
+        return promises
+
+    def _frames(self, body, chunk_size, out, pack=pack):
+        body = str_to_bytes(body)
+        size = len(body)
+        out.extend([self._head, pack('>Q', size), self._tail])
+        if size <= chunk_size:
+            if size:
+                out.extend([pack('>BHI', 3, self._channel_id, size),
+                            body, FRAME_END])
+            return
+        body = memoryview(body)
+        for i in range(0, size, chunk_size):
+            frame = body[i:i + chunk_size]
+            out.extend([pack('>BHI', 3, self._channel_id, len(frame)),
+                        frame, FRAME_END])
+
+
 class Channel(AbstractChannel):
     """AMQP Channel.
 
@@ -93,6 +365,7 @@ class Channel(AbstractChannel):
         spec.method(spec.Tx.SelectOk),
         spec.method(spec.Confirm.SelectOk),
         spec.method(spec.Basic.Ack, 'Lb'),
+        spec.method(spec.Basic.Nack, 'Lbb'),
     }
     _METHODS = {m.method_sig: m for m in _METHODS}
 
@@ -115,18 +388,43 @@ class Channel(AbstractChannel):
         self.auto_decode = auto_decode
         self.events = defaultdict(set)
         self.no_ack_consumers = set()
+        self._batches = {}
+        self._streams = {}
+        self._acks = None
 
         self.on_open = ensure_promise(on_open)
 
         # set first time basic_publish_confirm is called
         # and publisher confirms are enabled for this channel.
         self._confirm_selected = False
+        self._reset_confirms()
         if self.connection.confirm_publish:
             self.basic_publish = self.basic_publish_confirm
 
     def then(self, on_success, on_error=None):
         return self.on_open.then(on_success, on_error)
 
+    def dispatch_method(self, method_sig, payload, content,
+                        deliver=spec.Basic.Deliver, loads=loads):
+        if method_sig != deliver or deliver in self._pending:
+            return super(Channel, self).dispatch_method(
+                method_sig, payload, content)
+        # ## FAST: Basic.Deliver, by far the most frequent method,
+        # goes straight to the consumer, without looking up
+        # the method and its listeners.
+        if self.auto_decode:
+            # only the head of lazy properties is decoded.
+            encoding = content._properties.get('content_encoding')
+            if encoding is not None:
+                try:
+                    content.body = content.body.decode(encoding)
+                except Exception:
+                    pass
+        (consumer_tag, delivery_tag, redelivered,
+         exchange, routing_key), _ = loads('sLbss', payload, 4)
+        self._on_basic_deliver(consumer_tag, delivery_tag, redelivered,
+                               exchange, routing_key, content)
+
     def _setup_listeners(self):
         self._callbacks.update({
             spec.Channel.Close: self._on_close,
@@ -138,6 +436,7 @@ class Channel(AbstractChannel):
             spec.Basic.Deliver: self._on_basic_deliver,
             spec.Basic.Return: self._on_basic_return,
             spec.Basic.Ack: self._on_basic_ack,
+            spec.Basic.Nack: self._on_basic_nack,
         })
 
     def collect(self):
@@ -152,13 +451,27 @@ class Channel(AbstractChannel):
         if connection:
             connection.channels.pop(channel_id, None)
             connection._avail_channel_ids.append(channel_id)
+            connection._batch_channels.discard(self)
+            connection._ack_channels.discard(self)
+            connection._stream_channels.discard(channel_id)
         self.callbacks.clear()
         self.cancel_callbacks.clear()
         self.events.clear()
         self.no_ack_consumers.clear()
+        # the messages cannot be acknowledged anymore,
+        # and will be delivered again by the server.
+        self._batches.clear()
+        self._streams.clear()
+        if self._acks is not None:
+            self._acks.reset()
+        self._reset_confirms()
 
     def _do_revive(self):
         self.is_open = False
+        self._confirm_selected = False
+        self._reset_confirms()
+        if self._acks is not None:
+            self._acks.reset()
         self.open()
 
     def close(self, reply_code=0, reply_text='', method_sig=(0, 0),
@@ -217,6 +530,7 @@ class Channel(AbstractChannel):
             if is_closed:
                 return
 
+            self._flush_acks()
             return self.send_method(
                 spec.Channel.Close, argsig,
                 (reply_code, reply_text, method_sig[0], method_sig[1]),
@@ -1388,10 +1702,69 @@ class Channel(AbstractChannel):
                     tag refers to an delivered message, and raise a
                     channel exception if this is not the case.
         """
+        acks = self._acks
+        if acks is not None:
+            if not multiple:
+                return acks.ack(delivery_tag)
+            acks.flush()
+            acks.settle_through(delivery_tag or acks.delivered)
         return self.send_method(
             spec.Basic.Ack, argsig, (delivery_tag, multiple),
         )
 
+    def coalesce_acks(self, max_pending=100, max_delay=0.5):
+        """Send the acks of consecutive messages together.
+
+        When enabled, :meth:`basic_ack` does not send the ack right
+        away.  The acks are sent when ``max_pending`` are waiting, when
+        the first one has waited ``max_delay`` seconds, or before
+        waiting for incoming methods: the messages acknowledged with
+        no gap in the delivery tags are acknowledged with a single
+        ack, and any other ack is sent separately.
+
+        This must be enabled before consuming messages.
+
+        Arguments:
+            max_pending (int): Maximum number of acks waiting to be
+                sent, :const:`None` disables coalescing.
+            max_delay (float): Maximum time an ack waits to be sent,
+                in seconds.
+        """
+        if max_pending and self._acks is None and self.callbacks:
+            raise ChannelError(
+                'Ack coalescing must be enabled before consuming')
+        self._flush_acks()
+        self._acks = (
+            _AckCoalescer(self, max_pending, max_delay)
+            if max_pending else None
+        )
+
+    def _flush_acks(self):
+        if self._acks is not None and self._acks.pending:
+            self._acks.flush()
+
+    def _schedule_ack_flush(self, delay):
+        # Called when an ack is left waiting to be sent.  Acks are
+        # sent before blocking in drain_events(), so there's nothing
+        # to do here, but event loops can flush them on time.
+        pass
+
+    def basic_ack_batch(self, messages):
+        """Acknowledge a batch of messages with a single method.
+
+        The message with the highest delivery tag is acknowledged with
+        ``multiple`` set, so this also acknowledges any message received
+        before it on this channel, e.g. by another consumer.
+
+        Arguments:
+            messages (Sequence[~amqp.basic_message.Message]): the messages
+                received by this channel, e.g. a batch passed to the
+                callback of :meth:`basic_consume`.
+        """
+        if messages:
+            return self.basic_ack(
+                max(m.delivery_tag for m in messages), multiple=True)
+
     def basic_cancel(self, consumer_tag, nowait=False, argsig='sb'):
         """End a queue consumer.
 
@@ -1455,12 +1828,45 @@ class Channel(AbstractChannel):
 
     def _remove_tag(self, consumer_tag):
         self.callbacks.pop(consumer_tag, None)
+        batch = self._batches.pop(consumer_tag, None)
+        if batch is not None:
+            if not self._batches and self.connection is not None:
+                self.connection._batch_channels.discard(self)
+            batch.flush()
+        if self._streams.pop(consumer_tag, None) is not None:
+            if not self._streams and self.connection is not None:
+                self.connection._stream_channels.discard(self.channel_id)
         return self.cancel_callbacks.pop(consumer_tag, None)
 
+    def _stream_for(self, message):
+        # Called by the frame handler when the header of a message
+        # is received on a channel having streaming consumers.
+        if message.frame_method != spec.Basic.Deliver:
+            return None
+        consumer_tag = loads('s', message.frame_args, 4)[0][0]
+        return self._streams.get(consumer_tag)
+
+    def _batch_deadline(self):
+        # Time the first partial batch is due, or None if no batch
+        # has messages waiting.
+        deadlines = [
+            batch.since + batch.timeout
+            for batch in values(self._batches) if batch.messages
+        ]
+        return min(deadlines) if deadlines else None
+
+    def _flush_batches(self):
+        # Called by Connection.drain_events() after every pass.
+        now = monotonic()
+        for batch in list(values(self._batches)):
+            if batch.messages and now - batch.since >= batch.timeout:
+                batch.flush()
+
     def basic_consume(self, queue='', consumer_tag='', no_local=False,
                       no_ack=False, exclusive=False, nowait=False,
                       callback=None, arguments=None, on_cancel=None,
-                      argsig='BssbbbbF'):
+                      argsig='BssbbbbF', batch_size=None, batch_timeout=0,
+                      on_header=None, on_chunk=None, on_complete=None):
         """Start a queue consumer.
 
         This method asks the server to start a "consumer", which is a
@@ -1554,7 +1960,61 @@ class Channel(AbstractChannel):
                 as the single argument.  If no callable is specified,
                 messages are quietly discarded, no_ack should probably
                 be set to True in that case.
+
+            batch_size: int
+
+                deliver messages in batches
+
+                If set, the callback is called with a list of up to
+                this many messages instead.  The messages received
+                by a single :meth:`~amqp.Connection.drain_events` call
+                are passed together, see :meth:`basic_ack_batch` to
+                acknowledge them.
+
+            batch_timeout: float
+
+                maximum time to wait for a batch to fill up
+
+                If set, the messages are kept across
+                :meth:`~amqp.Connection.drain_events` calls,
+                until the batch is full or this many seconds
+                passed since the first message was received.
+
+            on_chunk: Python callable
+
+                stream message bodies
+
+                If set, the body of a message is not kept in memory,
+                instead ``on_chunk(message, chunk)`` is called for
+                every body frame as soon as it is received,
+                so that it can be hashed, decompressed or written
+                to disk a frame at a time.  The chunk is a
+                :class:`memoryview` that is only valid until the
+                callback returns, copy it to keep it.
+                ``on_header(message)`` is called first, when the
+                properties of the message are received, and
+                ``on_complete(message)`` once the whole body is.
+                The body of the message is left empty.
+                Callbacks are called by the thread reading the frames,
+                so streaming is not supported by
+                :class:`~amqp.ThreadSafeConnection`.
+
+            on_header: Python callable
+
+                called with each message before its body is streamed,
+                defaults to ``callback``.
+
+            on_complete: Python callable
+
+                called with each message after its body was streamed.
         """
+        if on_chunk is not None:
+            if batch_size:
+                raise ValueError('batch_size cannot be used with on_chunk')
+            callback = _ConsumerStream(
+                on_header or callback, on_chunk, on_complete)
+        elif batch_size:
+            callback = _ConsumerBatch(callback, batch_size, batch_timeout)
         p = self.send_method(
             spec.Basic.Consume, argsig,
             (0, queue, consumer_tag, no_local, no_ack, exclusive,
@@ -1567,6 +2027,12 @@ class Channel(AbstractChannel):
             consumer_tag = p
 
         self.callbacks[consumer_tag] = callback
+        if batch_size:
+            self._batches[consumer_tag] = callback
+            self.connection._batch_channels.add(self)
+        elif on_chunk is not None:
+            self._streams[consumer_tag] = callback
+            self.connection._stream_channels.add(self.channel_id)
 
         if on_cancel:
             self.cancel_callbacks[consumer_tag] = on_cancel
@@ -1577,13 +2043,11 @@ class Channel(AbstractChannel):
     def _on_basic_deliver(self, consumer_tag, delivery_tag, redelivered,
                           exchange, routing_key, msg):
         msg.channel = self
-        msg.delivery_info = {
-            'consumer_tag': consumer_tag,
-            'delivery_tag': delivery_tag,
-            'redelivered': redelivered,
-            'exchange': exchange,
-            'routing_key': routing_key,
-        }
+        msg._set_delivery_info(delivery_tag, redelivered, exchange,
+                               routing_key, consumer_tag=consumer_tag)
+        if self._acks is not None:
+            self._acks.on_delivered(
+                delivery_tag, consumer_tag in self.no_ack_consumers)
 
         try:
             fun = self.callbacks[consumer_tag]
@@ -1638,6 +2102,8 @@ class Channel(AbstractChannel):
         )
         if not ret or len(ret) < 2:
             return self._on_get_empty(*ret)
+        if self._acks is not None:
+            self._acks.on_delivered(ret[0], no_ack)
         return self._on_get_ok(*ret)
 
     def _on_get_empty(self, cluster_id=None):
@@ -1646,13 +2112,8 @@ class Channel(AbstractChannel):
     def _on_get_ok(self, delivery_tag, redelivered, exchange, routing_key,
                    message_count, msg):
         msg.channel = self
-        msg.delivery_info = {
-            'delivery_tag': delivery_tag,
-            'redelivered': redelivered,
-            'exchange': exchange,
-            'routing_key': routing_key,
-            'message_count': message_count
-        }
+        msg._set_delivery_info(delivery_tag, redelivered, exchange,
+                               routing_key, message_count=message_count)
         return msg
 
     def _basic_publish(self, msg, exchange='', routing_key='',
@@ -1725,23 +2186,124 @@ class Channel(AbstractChannel):
         if not self.connection:
             raise RecoverableConnectionError(
                 'basic_publish: connection closed')
+        lock = self.connection.write_lock
+        if lock is not None:
+            lock.acquire()
         try:
-            with self.connection.transport.having_timeout(timeout):
-                return self.send_method(
-                    spec.Basic.Publish, argsig,
-                    (0, exchange, routing_key, mandatory, immediate), msg
-                )
-        except socket.timeout:
-            raise RecoverableChannelError('basic_publish: timed out')
+            promises = self._track_confirms(1)
+            try:
+                with self.connection.transport.having_timeout(timeout):
+                    p = self.send_method(
+                        spec.Basic.Publish, argsig,
+                        (0, exchange, routing_key, mandatory, immediate), msg
+                    )
+            except socket.timeout:
+                self._untrack_confirms(promises)
+                raise RecoverableChannelError('basic_publish: timed out')
+            except Exception:
+                self._untrack_confirms(promises)
+                raise
+        finally:
+            if lock is not None:
+                lock.release()
+        return promises[0] if promises is not None else p
     basic_publish = _basic_publish
 
+    def basic_publish_batch(self, messages, exchange='', routing_key='',
+                            mandatory=False, immediate=False, timeout=None,
+                            argsig='Bssbb'):
+        """Publish a batch of messages.
+
+        Works like :meth:`basic_publish`, except that every message
+        in the batch is published to the same exchange with the
+        same routing key, and the frames for the whole batch are
+        written to the socket at once, instead of once per message.
+
+        PARAMETERS:
+            messages: iterable of Message
+
+                The messages to publish, in order.
+
+        See :meth:`basic_publish` for the remaining arguments.
+
+        Note:
+            If the channel is in confirm mode a list with the
+            confirmation promise of every message is returned (see
+            :meth:`confirm_select`).  If ``confirm_publish`` is
+            enabled for the connection, the channel is put in confirm
+            mode when first used, and the messages of the batch are
+            waited for, like :meth:`basic_publish` does.
+        """
+        if not self.connection:
+            raise RecoverableConnectionError(
+                'basic_publish_batch: connection closed')
+        confirm = self.connection.confirm_publish
+        if confirm and not self._confirm_selected:
+            self._confirm_selected = True
+            self.confirm_select()
+        args = dumps(argsig, (0, exchange, routing_key, mandatory, immediate))
+        write_frame = self.connection.frame_writer
+        lock = self.connection.write_lock
+        if lock is not None:
+            # the frames are written at once, bypassing the frame writer.
+            lock.acquire()
+        try:
+            buffers = []
+            count = 0
+            for msg in messages:
+                write_frame(1, self.channel_id, spec.Basic.Publish,
+                            args, msg, buffers)
+                count += 1
+            if not count:
+                return [] if self._unconfirmed is not None else None
+            promises = self._track_confirms(count)
+            transport = self.connection.transport
+            try:
+                with transport.having_timeout(timeout):
+                    transport.writev(buffers)
+            except socket.timeout:
+                self._untrack_confirms(promises)
+                raise RecoverableChannelError(
+                    'basic_publish_batch: timed out')
+            except Exception:
+                self._untrack_confirms(promises)
+                raise
+        finally:
+            if lock is not None:
+                lock.release()
+        if promises is not None and confirm:
+            self._wait_confirmed(promises)
+        return promises
+
+    def prepare_publish(self, prototype, exchange='', routing_key='',
+                        mandatory=False, immediate=False, argsig='Bssbb'):
+        """Prepare publishing messages only differing by their body.
+
+        Returns a :class:`PreparedPublish`, called with the body of
+        every message to publish, with the properties of ``prototype``.
+        The frames that do not depend on the body are encoded once.
+
+        See :meth:`basic_publish` for the arguments.
+        """
+        return PreparedPublish(self, prototype, exchange, routing_key,
+                               mandatory, immediate, argsig)
+
     def basic_publish_confirm(self, *args, **kwargs):
         if not self._confirm_selected:
             self._confirm_selected = True
             self.confirm_select()
-        ret = self._basic_publish(*args, **kwargs)
-        self.wait(spec.Basic.Ack)
-        return ret
+        p = self._basic_publish(*args, **kwargs)
+        self._wait_confirmed([p])
+        return p
+
+    def _wait_confirmed(self, promises):
+        # Wait for the confirms of published messages, raising
+        # MessageNacked if one was rejected by the broker.
+        for p in promises:
+            while not (p.ready or p.failed):
+                self.wait([spec.Basic.Ack, spec.Basic.Nack])
+            if p.failed:
+                raise p.reason
 
     def basic_qos(self, prefetch_size, prefetch_count, a_global,
                   argsig='lBb'):
@@ -1841,11 +2403,20 @@ class Channel(AbstractChannel):
                 potentially then delivering it to an alternative
                 subscriber.
         """
+        self._flush_acks()
+        self._recovered()
         return self.send_method(spec.Basic.Recover, 'b', (requeue,))
 
     def basic_recover_async(self, requeue=False):
+        self._flush_acks()
+        self._recovered()
         return self.send_method(spec.Basic.RecoverAsync, 'b', (requeue,))
 
+    def _recovered(self):
+        # the messages are delivered again with new delivery tags.
+        if self._acks is not None:
+            self._acks.settle_through(self._acks.delivered)
+
     def basic_reject(self, delivery_tag, requeue, argsig='Lb'):
         """Reject an incoming message.
 
@@ -1915,6 +2486,8 @@ class Channel(AbstractChannel):
                     queue and redeliver it to the same client at a
                     later stage.
         """
+        if self._acks is not None:
+            self._acks.settle(delivery_tag)
         return self.send_method(
             spec.Basic.Reject, argsig, (delivery_tag, requeue),
         )
@@ -2023,17 +2596,124 @@ class Channel(AbstractChannel):
 
         Can now be used if the channel is in transactional mode.
 
+        Once enabled, every message published on the channel is
+        assigned a sequence number, and :meth:`basic_publish` returns
+        a promise that is fulfilled when the broker acknowledges the
+        message, or fails with :exc:`~amqp.exceptions.MessageNacked`
+        if the broker rejects it.  The confirms arrive asynchronously
+        while draining events, and :meth:`wait_for_confirms` can be used
+        to wait for all outstanding confirms.
+
         :param nowait:
             If set, the server will not respond to the method.
             The client should not wait for a reply method. If the
             server could not complete the method it will raise a channel
             or connection exception.
         """
+        if self._unconfirmed is None:
+            self._unconfirmed = OrderedDict()
         return self.send_method(
             spec.Confirm.Select, 'b', (nowait,),
             wait=None if nowait else spec.Confirm.SelectOk,
         )
 
+    def wait_for_confirms(self, timeout=None):
+        """Wait for the broker to confirm all published messages.
+
+        Requires the channel to be in confirm mode (see
+        :meth:`confirm_select`).
+
+        Arguments:
+            timeout (float): Maximum number of seconds to wait.
+
+        Returns:
+            bool: :const:`False` if any of the messages published since
+                the last call was rejected by the broker,
+                :const:`True` otherwise.
+
+        Raises:
+            socket.timeout: if not all messages were confirmed in time.
+        """
+        if self._unconfirmed is None:
+            raise ChannelError(
+                'wait_for_confirms: channel is not in confirm mode')
+        deadline = monotonic() + timeout if timeout is not None else None
+        while self._unconfirmed:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise socket.timeout()
+            self._drain_events(remaining)
+        nacked, self._nacked = self._nacked, False
+        return not nacked
+
+    @property
+    def unconfirmed(self):
+        """Number of published messages not yet confirmed by the broker."""
+        return len(self._unconfirmed) if self._unconfirmed else 0
+
+    def _reset_confirms(self):
+        unconfirmed = getattr(self, '_unconfirmed', None)
+        self._unconfirmed = None
+        self._publish_seq = 0
+        self._nacked = False
+        if unconfirmed:
+            exc = RecoverableChannelError('channel closed before confirm')
+            for p in unconfirmed.values():
+                p.throw(exc, propagate=False)
+
+    def _track_confirm(self):
+        self._publish_seq += 1
+        p = self._unconfirmed[self._publish_seq] = promise()
+        return p
+
+    def _track_confirms(self, count):
+        # Called holding the write lock, before writing the messages:
+        # they may be confirmed before the write returns, and the
+        # confirm dispatched by another thread (see ThreadSafeConnection).
+        if self._unconfirmed is None:
+            return None
+        return [self._track_confirm() for _ in range(count)]
+
+    def _untrack_confirms(self, promises):
+        # Forget the confirms tracked for messages that were not sent,
+        # the last ones tracked as the write lock is still held.
+        if promises and self._unconfirmed is not None:
+            for _ in promises:
+                self._unconfirmed.pop(self._publish_seq, None)
+                self._publish_seq -= 1
+
+    def _settle_confirms(self, delivery_tag, multiple):
+        # Outstanding confirms are kept in publish order, so with
+        # multiple=True we only have to pop from the front.
+        unconfirmed = self._unconfirmed
+        if not unconfirmed:
+            return []
+        if not multiple:
+            p = unconfirmed.pop(delivery_tag, None)
+            return [p] if p is not None else []
+        settled = []
+        while unconfirmed:
+            tag = next(iter(unconfirmed))
+            if delivery_tag and tag > delivery_tag:
+                break
+            settled.append(unconfirmed.popitem(last=False)[1])
+        return settled
+
     def _on_basic_ack(self, delivery_tag, multiple):
         for callback in self.events['basic_ack']:
             callback(delivery_tag, multiple)
+        for p in self._settle_confirms(delivery_tag, multiple):
+            p()
+
+    def _on_basic_nack(self, delivery_tag, multiple, requeue):
+        for callback in self.events['basic_nack']:
+            callback(delivery_tag, multiple)
+        settled = self._settle_confirms(delivery_tag, multiple)
+        if settled:
+            self._nacked = True
+            exc = MessageNacked(
+                'message nacked by broker', spec.Basic.Nack)
+            for p in settled:
+                p.throw(exc, propagate=False)
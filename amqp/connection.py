@@ -4,6 +4,7 @@ from __future__ import absolute_import, unicode_literals
 
 import logging
 import socket
+import threading
 import uuid
 import warnings
 
@@ -11,13 +12,14 @@ from vine import ensure_promise
 
 from . import __version__, sasl, spec
 from .abstract_channel import AbstractChannel
+from .basic_message import Message
 from .channel import Channel
 from .exceptions import (AMQPDeprecationWarning, ChannelError, ConnectionError,
                          ConnectionForced, RecoverableChannelError,
                          RecoverableConnectionError, ResourceError,
                          error_for_code)
 from .five import array, items, monotonic, range, string, values
-from .method_framing import frame_handler, frame_writer
+from .method_framing import frame_handler, frame_writer, locked_frame_writer
 from .transport import Transport
 
 try:
@@ -97,6 +99,32 @@ class Connection(AbstractChannel):
 
     The "socket_settings" parameter is a dictionary defining tcp
     settings which will be applied as socket options.
+
+    When "lazy_properties" is enabled, the properties of received
+    messages are only decoded when first accessed, which saves decoding
+    the headers of messages that are never looked at.
+
+    When "bytearray_bodies" is enabled, message bodies are received
+    into a :class:`bytearray` allocated at the size of the body, which
+    is kept as the body, instead of collecting the body frames and
+    joining them into :class:`bytes`.  Large messages then only need
+    their size in memory once, and are copied once less.
+
+    The "spool_threshold" parameter is a size in bytes above which
+    message bodies are received into a temporary file instead of
+    memory, the body then being a read-only :class:`mmap.mmap` of the
+    file, so that large messages do not need to fit in memory.
+    The file is deleted once the body is closed or garbage collected.
+
+    The "message_class" parameter is the class of received messages,
+    e.g. :class:`~amqp.basic_message.CompactMessage` to use less memory.
+
+    The "heartbeat_thread" parameter is a
+    :class:`~amqp.heartbeat.HeartbeatThread` sending the heartbeats
+    of the connection in the background, even while the thread using
+    the connection is busy.  The thread only sends heartbeats: the
+    thread reading frames still has to call :meth:`heartbeat_tick`
+    (or :meth:`check_heartbeats`) to find out that the server is gone.
     """
 
     Channel = Channel
@@ -184,7 +212,9 @@ class Connection(AbstractChannel):
                  on_unblocked=None, confirm_publish=False,
                  on_tune_ok=None, read_timeout=None, write_timeout=None,
                  socket_settings=None, frame_handler=frame_handler,
-                 frame_writer=frame_writer, **kwargs):
+                 frame_writer=frame_writer, lazy_properties=False,
+                 message_class=Message, heartbeat_thread=None,
+                 bytearray_bodies=False, spool_threshold=None, **kwargs):
         self._connection_id = uuid.uuid4().hex
         channel_max = channel_max or 65535
         frame_max = frame_max or 131072
@@ -232,19 +262,33 @@ class Connection(AbstractChannel):
         self._handshake_complete = False
 
         self.channels = {}
+        # Channels having batch consumers, see Channel.basic_consume.
+        self._batch_channels = set()
+        # Channels having acks not sent yet, see Channel.coalesce_acks.
+        self._ack_channels = set()
+        # Ids of channels having streaming consumers,
+        # see Channel.basic_consume.
+        self._stream_channels = set()
         # The connection object itself is treated as channel 0
         super(Connection, self).__init__(self, 0)
 
         self._frame_writer = None
         self._on_inbound_frame = None
+        #: Lock held while writing frames, see :meth:`enable_write_lock`.
+        self.write_lock = None
         self._transport = None
 
         # Properties set in the Tune method
         self.channel_max = channel_max
         self.frame_max = frame_max
         self.client_heartbeat = heartbeat
+        self.heartbeat_thread = heartbeat_thread
 
         self.confirm_publish = confirm_publish
+        self.lazy_properties = lazy_properties
+        self.bytearray_bodies = bytearray_bodies
+        self.spool_threshold = spool_threshold
+        self.message_class = message_class
         self.ssl = ssl
         self.read_timeout = read_timeout
         self.write_timeout = write_timeout
@@ -342,8 +386,31 @@ class Connection(AbstractChannel):
 
     @frame_writer.setter
     def frame_writer(self, frame_writer):
+        if self.write_lock is not None and frame_writer is not None:
+            frame_writer = locked_frame_writer(frame_writer, self.write_lock)
         self._frame_writer = frame_writer
 
+    def enable_write_lock(self, lock=None):
+        """Make writing frames safe when done from several threads.
+
+        Every frame, or group of frames for a message, is written
+        holding :attr:`write_lock`, so that frames written by
+        different threads are never interleaved.
+
+        Keyword Arguments:
+            lock: The lock to use, a new :class:`threading.RLock`
+                by default.  It must be reentrant.
+
+        Returns:
+            The lock used.  Nothing is changed if one is already
+            set.
+        """
+        if self.write_lock is None:
+            self.write_lock = lock or threading.RLock()
+            if self._frame_writer is not None:
+                self.frame_writer = self._frame_writer
+        return self.write_lock
+
     def _on_start(self, version_major, version_minor, server_properties,
                   mechanisms, locales, argsig='FsSs'):
         client_properties = self.client_properties
@@ -426,6 +493,8 @@ class Connection(AbstractChannel):
 
     def _on_open_ok(self):
         self._handshake_complete = True
+        if self.heartbeat_thread is not None:
+            self.heartbeat_thread.add(self)
         self.on_open(self)
 
     def Transport(self, host, connect_timeout,
@@ -441,6 +510,8 @@ class Connection(AbstractChannel):
         return self._transport and self._transport.connected
 
     def collect(self):
+        if self.heartbeat_thread is not None:
+            self.heartbeat_thread.remove(self)
         try:
             if self._transport:
                 self._transport.close()
@@ -486,16 +557,103 @@ class Connection(AbstractChannel):
     def is_alive(self):
         raise NotImplementedError('Use AMQP heartbeats')
 
-    def drain_events(self, timeout=None):
+    def drain_events(self, timeout=None, max_frames=None):
+        """Wait for and dispatch events until a method is received.
+
+        Keyword Arguments:
+            timeout (float): Timeout in seconds for the socket read.
+            max_frames (int): Enable bulk reads, processing up to this
+                many frames per socket read: every complete frame
+                already received is dispatched in the same pass,
+                instead of reading one frame at a time.
+                Frames above the limit are kept buffered for the next
+                call.
+
+        Messages of batch consumers (see
+        :meth:`~amqp.channel.Channel.basic_consume`) received
+        during the call are passed to their callback before returning:
+        the messages that can be read without waiting are read first,
+        to fill the batches.  The wait is shortened to the time a
+        batch is due, the call then returns once it is passed on.
+        """
+        if self._ack_channels:
+            # don't keep acks waiting while blocked reading.
+            self._flush_acks()
+        batch_due = False
+        if self._batch_channels:
+            timeout, batch_due = self._batch_timeout(timeout)
+            if batch_due and not timeout:
+                return self._flush_batches()
         # read until message is ready
-        while not self.blocking_read(timeout):
-            pass
+        try:
+            if max_frames:
+                while not self.bulk_read(timeout, max_frames):
+                    pass
+            else:
+                while not self.blocking_read(timeout):
+                    pass
+            if self._batch_channels:
+                self._fill_batches()
+        except socket.timeout:
+            if self._batch_channels:
+                self._flush_batches()
+            if not batch_due:
+                raise
+            return
+        if self._batch_channels:
+            self._flush_batches()
+
+    def _batch_timeout(self, timeout):
+        # Shorten the wait to the time the next partial batch is due.
+        # Returns the timeout, and whether it was shortened.
+        deadlines = [
+            deadline for deadline in (
+                channel._batch_deadline()
+                for channel in self._batch_channels
+            ) if deadline is not None
+        ]
+        if deadlines:
+            delay = max(min(deadlines) - monotonic(), 0)
+            if timeout is None or delay < timeout:
+                return delay, True
+        return timeout, False
+
+    def _fill_batches(self):
+        # Dispatch the frames that can be read without waiting for
+        # as long as batches are partially filled, so that they are
+        # not passed on a message at a time.
+        transport = self.transport
+        while self.connected and transport.readable() and any(
+                channel._batch_deadline() is not None
+                for channel in self._batch_channels):
+            for frame in transport.read_ready_frames():
+                self.on_inbound_frame(frame)
+                if not self.connected:
+                    break
+
+    def _flush_batches(self):
+        for channel in list(self._batch_channels):
+            channel._flush_batches()
+
+    def _flush_acks(self):
+        for channel in list(self._ack_channels):
+            channel._flush_acks()
 
     def blocking_read(self, timeout=None):
         with self.transport.having_timeout(timeout):
             frame = self.transport.read_frame()
         return self.on_inbound_frame(frame)
 
+    def bulk_read(self, timeout=None, max_frames=None):
+        frames = self.transport.read_frames(max_frames)
+        with self.transport.having_timeout(timeout):
+            frame = next(frames)
+        on_inbound_frame = self.on_inbound_frame
+        ready = on_inbound_frame(frame)
+        for frame in frames:
+            ready = on_inbound_frame(frame) or ready
+        return ready
+
     def on_inbound_method(self, channel_id, method_sig, payload, content):
         return self.channels[channel_id].dispatch_method(
             method_sig, payload, content,
@@ -559,6 +717,8 @@ class Connection(AbstractChannel):
             # already closed
             return
 
+        if self._ack_channels:
+            self._flush_acks()
         return self.send_method(
             spec.Connection.Close, argsig,
             (reply_code, reply_text, method_sig[0], method_sig[1]),
@@ -675,47 +835,78 @@ class Connection(AbstractChannel):
 
         Note:
             This should be called frequently, on the order of
-            once per second.
+            once per second, unless the connection has a
+            :attr:`heartbeat_thread` doing it.
 
         Keyword Arguments:
             rate (int): Previously used, but ignored now.
         """
-        AMQP_LOGGER.debug('heartbeat_tick : for connection %s',
-                          self._connection_id)
+        debug = AMQP_LOGGER.isEnabledFor(logging.DEBUG)
+        if debug:
+            AMQP_LOGGER.debug('heartbeat_tick : for connection %s',
+                              self._connection_id)
         if not self.heartbeat:
             return
 
-        # treat actual data exchange in either direction as a heartbeat
+        if debug:
+            AMQP_LOGGER.debug(
+                'heartbeat_tick : Prev sent/recv: %s/%s, '
+                'now - %s/%s, monotonic - %s, '
+                'last_heartbeat_sent - %s, heartbeat int. - %s '
+                'for connection %s',
+                self.prev_sent, self.prev_recv,
+                self.bytes_sent, self.bytes_recv, monotonic(),
+                self.last_heartbeat_sent,
+                self.heartbeat,
+                self._connection_id,
+            )
+        self.send_heartbeat_if_due()
+        self.check_heartbeats()
+
+    def send_heartbeat_if_due(self):
+        """Send a heartbeat if nothing was sent for a heartbeat interval.
+
+        This is the part of :meth:`heartbeat_tick` done by a
+        :class:`~amqp.heartbeat.HeartbeatThread`.
+        """
+        if not self.heartbeat:
+            return
+        # treat actual data exchange as a heartbeat
         sent_now = self.bytes_sent
-        recv_now = self.bytes_recv
-        if self.prev_sent is None or self.prev_sent != sent_now:
-            self.last_heartbeat_sent = monotonic()
-        if self.prev_recv is None or self.prev_recv != recv_now:
-            self.last_heartbeat_received = monotonic()
-
         now = monotonic()
-        AMQP_LOGGER.debug(
-            'heartbeat_tick : Prev sent/recv: %s/%s, '
-            'now - %s/%s, monotonic - %s, '
-            'last_heartbeat_sent - %s, heartbeat int. - %s '
-            'for connection %s',
-            self.prev_sent, self.prev_recv,
-            sent_now, recv_now, now,
-            self.last_heartbeat_sent,
-            self.heartbeat,
-            self._connection_id,
-        )
-
-        self.prev_sent, self.prev_recv = sent_now, recv_now
+        if self.prev_sent is None or self.prev_sent != sent_now:
+            self.last_heartbeat_sent = now
+        self.prev_sent = sent_now
 
         # send a heartbeat if it's time to do so
         if now > self.last_heartbeat_sent + self.heartbeat:
-            AMQP_LOGGER.debug(
-                'heartbeat_tick: sending heartbeat for connection %s',
-                self._connection_id)
+            if AMQP_LOGGER.isEnabledFor(logging.DEBUG):
+                AMQP_LOGGER.debug(
+                    'heartbeat_tick: sending heartbeat for connection %s',
+                    self._connection_id)
             self.send_heartbeat()
             self.last_heartbeat_sent = monotonic()
 
+    def check_heartbeats(self):
+        """Check that the server is still sending heartbeats.
+
+        This is the part of :meth:`heartbeat_tick` that must be done
+        by the thread reading frames, as nothing is received while
+        it's busy doing something else.
+
+        Raises:
+            ~amqp.exceptions.ConnectionForced: if none have been
+                received recently.
+        """
+        if not self.heartbeat:
+            return
+        # treat actual data exchange as a heartbeat
+        recv_now = self.bytes_recv
+        now = monotonic()
+        if self.prev_recv is None or self.prev_recv != recv_now:
+            self.last_heartbeat_received = now
+        self.prev_recv = recv_now
+
         # if we've missed two intervals' heartbeats, fail; this gives the
         # server enough time to send heartbeats a little late
         if (self.last_heartbeat_received and
@@ -10,7 +10,8 @@ __all__ = [
     'ConnectionError', 'ChannelError',
     'RecoverableConnectionError', 'IrrecoverableConnectionError',
     'RecoverableChannelError', 'IrrecoverableChannelError',
-    'ConsumerCancelled', 'ContentTooLarge', 'NoConsumers',
+    'ConsumerCancelled', 'MessageNacked', 'PoolLimitExceeded',
+    'ContentTooLarge', 'NoConsumers',
     'ConnectionForced', 'InvalidPath', 'AccessRefused', 'NotFound',
     'ResourceLocked', 'PreconditionFailed', 'FrameError', 'FrameSyntaxError',
     'InvalidCommand', 'ChannelNotOpen', 'UnexpectedFrame', 'ResourceError',
@@ -84,6 +85,14 @@ class ConsumerCancelled(RecoverableConnectionError):
     """AMQP Consumer Cancelled Predicate."""
 
 
+class MessageNacked(RecoverableChannelError):
+    """Published message was rejected by the broker (Basic.Nack)."""
+
+
+class PoolLimitExceeded(RecoverableConnectionError):
+    """No connection available from the pool (see :mod:`amqp.pool`)."""
+
+
 class ContentTooLarge(RecoverableChannelError):
     """AMQP Content Too Large Error."""
 
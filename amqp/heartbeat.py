@@ -0,0 +1,177 @@
+"""Heartbeat scheduling."""
+from __future__ import absolute_import, unicode_literals
+
+import heapq
+import logging
+import threading
+from itertools import count
+
+from .five import monotonic
+
+__all__ = ['HeartbeatSchedule', 'HeartbeatThread']
+
+AMQP_LOGGER = logging.getLogger('amqp')
+
+
+class HeartbeatSchedule(object):
+    """Deadlines of the next heartbeat tick of many connections.
+
+    Every connection is due for a call to its ``heartbeat_tick``
+    method twice per heartbeat interval.  The deadlines are kept in
+    a heap, so the next one is known without going through all the
+    connections.  Connections without heartbeats are ignored.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = count()
+        # connection -> sequence number of its entry in the heap.
+        self._entries = {}
+
+    def __contains__(self, connection):
+        return connection in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, connection, now=None):
+        """Schedule the first tick of connection."""
+        if not connection.heartbeat:
+            return
+        seq = self._entries[connection] = next(self._seq)
+        self._push(connection, seq, now or monotonic())
+
+    def remove(self, connection):
+        """Stop scheduling ticks for connection."""
+        self._entries.pop(connection, None)
+
+    def next_deadline(self):
+        """Return the time of the next tick, or None if nothing is due."""
+        heap, entries = self._heap, self._entries
+        while heap and entries.get(heap[0][2]) != heap[0][1]:
+            # connection removed, or removed then added again.
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now):
+        """Return the connections due for a tick at ``now``.
+
+        The next tick of these connections is scheduled right away.
+        """
+        due = []
+        deadline = self.next_deadline()
+        while deadline is not None and deadline <= now:
+            _, seq, connection = heapq.heappop(self._heap)
+            self._push(connection, seq, now)
+            due.append(connection)
+            deadline = self.next_deadline()
+        return due
+
+    def _push(self, connection, seq, now):
+        heapq.heappush(
+            self._heap, (now + connection.heartbeat / 2.0, seq, connection))
+
+
+class HeartbeatThread(threading.Thread):
+    """Thread sending the heartbeats of connections in the background.
+
+    Heartbeats keep being sent while the thread using the connection
+    is busy, e.g. in a long running consumer callback, which would
+    otherwise starve :meth:`~amqp.connection.Connection.heartbeat_tick`
+    and get the connection closed by the broker.
+
+    The thread only sends heartbeats, see
+    :meth:`~amqp.connection.Connection.send_heartbeat_if_due`: as
+    nothing is received while the connection is busy, checking for
+    missed heartbeats is left to the thread reading frames.
+
+    The thread sleeps until the next deadline of the
+    :class:`HeartbeatSchedule`, instead of polling the connections.
+    Connections added get a write lock (see
+    :meth:`~amqp.connection.Connection.enable_write_lock`), so that
+    heartbeats are never written in the middle of another frame.
+
+    Example:
+        >>> heartbeats = HeartbeatThread()
+        >>> conn = Connection(heartbeat=60, heartbeat_thread=heartbeats)
+        >>> conn.connect()
+
+    Connections passed ``heartbeat_thread`` are added once connected,
+    and removed when closed.  The thread is started by the first
+    connection added.
+
+    Arguments:
+        on_error (Callable): Called as ``on_error(connection, exc)``
+            from the thread when sending a heartbeat fails, e.g. with
+            a socket error.  The connection is removed first.
+            Errors are logged if not set.
+    """
+
+    def __init__(self, on_error=None, name='amqp-heartbeat'):
+        super(HeartbeatThread, self).__init__(name=name)
+        self.daemon = True
+        self.on_error = on_error
+        self.schedule = HeartbeatSchedule()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def add(self, connection):
+        """Start sending heartbeats for connection."""
+        if not connection.heartbeat:
+            return
+        connection.enable_write_lock()
+        with self._cond:
+            self.schedule.add(connection)
+            self._cond.notify()
+            if self.ident is None:
+                self.start()
+
+    def remove(self, connection):
+        """Stop sending heartbeats for connection."""
+        with self._cond:
+            self.schedule.remove(connection)
+
+    def stop(self, timeout=None):
+        """Stop the thread, and wait for it to exit."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self.ident is not None:
+            self.join(timeout)
+
+    def run(self):
+        while 1:
+            with self._cond:
+                due = self._wait()
+            if due is None:
+                break
+            for connection in due:
+                self._tick(connection)
+
+    def _wait(self):
+        schedule, cond = self.schedule, self._cond
+        while not self._stopped:
+            deadline = schedule.next_deadline()
+            now = monotonic()
+            if deadline is None:
+                cond.wait()
+            elif deadline > now:
+                cond.wait(deadline - now)
+            else:
+                return schedule.pop_due(now)
+
+    def _tick(self, connection):
+        if connection not in self.schedule:
+            return  # removed since.
+        if not connection.connected:
+            return self.remove(connection)
+        try:
+            connection.send_heartbeat_if_due()
+        except Exception as exc:
+            self.remove(connection)
+            if self.on_error is None:
+                AMQP_LOGGER.error(
+                    'Heartbeat failed for connection %s: %r',
+                    connection._connection_id, exc)
+            else:
+                self.on_error(connection, exc)
@@ -0,0 +1,163 @@
+"""Event loop serving many connections from a single thread."""
+from __future__ import absolute_import, unicode_literals
+
+from .five import monotonic
+from .heartbeat import HeartbeatSchedule
+
+try:
+    import selectors
+except ImportError:  # pragma: no cover
+    try:
+        import selectors2 as selectors  # Python 2 backport
+    except ImportError:
+        selectors = None  # noqa
+
+__all__ = ['Hub']
+
+
+class Hub(object):
+    """Event loop serving many connections from a single thread.
+
+    Instead of blocking in :meth:`Connection.drain_events
+    <amqp.connection.Connection.drain_events>` for every connection,
+    the sockets of all the connections added are watched using
+    :mod:`selectors`, and the frames received by every readable
+    connection are dispatched as they arrive.
+
+    Heartbeats of all the connections are driven by the hub too,
+    using a single :class:`~amqp.heartbeat.HeartbeatSchedule`:
+    :meth:`Connection.heartbeat_tick
+    <amqp.connection.Connection.heartbeat_tick>` is called twice per
+    heartbeat interval, so an idle connection no longer needs its
+    own thread to stay alive.
+
+    Pending coalesced acks are sent before waiting for events, and
+    the messages of batch consumers are flushed after every pass.
+
+    Example:
+        >>> hub = Hub()
+        >>> for conn in connections:
+        ...     conn.connect()
+        ...     hub.add(conn)
+        >>> hub.run_forever()
+
+    Arguments:
+        selector (selectors.BaseSelector): Selector to use,
+            :class:`selectors.DefaultSelector` by default.
+        on_error (Callable): Called as ``on_error(connection, exc)``
+            when a connection fails, either when reading, when
+            dispatching its frames or because it missed heartbeats.
+            The connection is removed from the hub first.
+            If not set, the exception is raised by :meth:`run_once`.
+    """
+
+    def __init__(self, selector=None, on_error=None):
+        if selector is None:
+            if selectors is None:  # pragma: no cover
+                raise NotImplementedError(
+                    'Hub requires the selectors module '
+                    '(install selectors2 on Python 2)')
+            selector = selectors.DefaultSelector()
+        self.selector = selector
+        self.on_error = on_error
+        #: Connections served, mapped to the socket registered.
+        self.connections = {}
+        self.heartbeats = HeartbeatSchedule()
+
+    def add(self, connection):
+        """Start serving an already connected connection."""
+        sock = connection.sock
+        self.selector.register(sock, selectors.EVENT_READ, connection)
+        self.connections[connection] = sock
+        self.heartbeats.add(connection)
+
+    def remove(self, connection):
+        """Stop serving connection, without closing it."""
+        self.heartbeats.remove(connection)
+        try:
+            sock = self.connections.pop(connection)
+        except KeyError:
+            return
+        try:
+            self.selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass  # socket already closed.
+
+    def close(self):
+        """Remove all connections, and close the selector."""
+        for connection in list(self.connections):
+            self.remove(connection)
+        self.selector.close()
+
+    def run_forever(self, timeout=None):
+        """Serve the connections until none is left.
+
+        Keyword Arguments:
+            timeout (float): Maximum time to wait for events in a
+                single pass, see :meth:`run_once`.
+        """
+        while self.connections:
+            self.run_once(timeout)
+
+    def run_once(self, timeout=None):
+        """Wait for events, and dispatch them.
+
+        Keyword Arguments:
+            timeout (float): Maximum time to wait for a connection to
+                become readable.  The wait is shortened to send
+                heartbeats on time, and to flush partial batches of
+                batch consumers when their ``batch_timeout`` expires.
+
+        Returns:
+            int: the number of connections that were readable.
+        """
+        for connection in list(self.connections):
+            if connection._ack_channels:
+                self._call(connection, connection._flush_acks)
+        deadline = self.heartbeats.next_deadline()
+        if deadline is not None:
+            delay = max(deadline - monotonic(), 0)
+            timeout = delay if timeout is None else min(timeout, delay)
+        for connection in self.connections:
+            if connection._batch_channels:
+                timeout, _ = connection._batch_timeout(timeout)
+        events = self.selector.select(timeout)
+        for key, _ in events:
+            self._read(key.data)
+        if deadline is not None:
+            for connection in self.heartbeats.pop_due(monotonic()):
+                if connection in self.connections:
+                    self._call(connection, connection.heartbeat_tick)
+        for connection in list(self.connections):
+            if connection._batch_channels:
+                self._call(connection, connection._flush_batches)
+        return len(events)
+
+    def _read(self, connection):
+        if connection not in self.connections:
+            return  # removed while dispatching another connection.
+        try:
+            on_inbound_frame = connection.on_inbound_frame
+            for frame in connection.transport.read_ready_frames():
+                on_inbound_frame(frame)
+                if not connection.connected:
+                    break  # closed by a callback.
+        except Exception as exc:
+            self._on_error(connection, exc)
+        else:
+            if not connection.connected:
+                self.remove(connection)
+
+    def _call(self, connection, fun):
+        try:
+            fun()
+        except Exception as exc:
+            self._on_error(connection, exc)
+            return False
+        return True
+
+    def _on_error(self, connection, exc):
+        self.remove(connection)
+        if self.on_error is None:
+            raise exc
+        self.on_error(connection, exc)
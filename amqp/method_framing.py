@@ -2,16 +2,21 @@
 # Copyright (C) 2007-2008 Barry Pederson <bp@barryp.org>
 from __future__ import absolute_import, unicode_literals
 
+import io
+import mmap
+import os
 from collections import defaultdict
 
 from . import spec
-from .basic_message import Message
-from .exceptions import UnexpectedFrame
-from .five import range
+from .exceptions import RecoverableConnectionError, UnexpectedFrame
+from .five import range, string_t
 from .platform import pack, pack_into, unpack_from
 from .utils import str_to_bytes
 
-__all__ = ['frame_handler', 'frame_writer']
+__all__ = [
+    'frame_handler', 'frame_writer', 'locked_frame_writer',
+    'write_body_stream',
+]
 
 #: Set of methods that require both a content frame and a body frame.
 _CONTENT_METHODS = frozenset([
@@ -26,12 +31,22 @@ _CONTENT_METHODS = frozenset([
 #: and if it does not the message will fit into the preallocated buffer.
 FRAME_OVERHEAD = 40
 
+#: Octet marking the end of a frame.
+FRAME_END = b'\xce'
+
 
 def frame_handler(connection, callback,
                   unpack_from=unpack_from, content_methods=_CONTENT_METHODS):
     """Create closure that reads frames."""
     expected_types = defaultdict(lambda: 1)
     partial_messages = {}
+    # Messages being passed to a streaming consumer, by channel.
+    streams = {}
+    stream_channels = connection._stream_channels
+    lazy_properties = connection.lazy_properties
+    bytearray_bodies = connection.bytearray_bodies
+    spool_threshold = connection.spool_threshold
+    message_class = connection.message_class
 
     def on_frame(frame):
         frame_type, channel, buf = frame
@@ -46,7 +61,7 @@ def frame_handler(connection, callback,
 
             if method_sig in content_methods:
                 # Save what we've got so far and wait for the content-header
-                partial_messages[channel] = Message(
+                partial_messages[channel] = message_class(
                     frame_method=method_sig, frame_args=buf,
                 )
                 expected_types[channel] = 2
@@ -56,7 +71,12 @@ def frame_handler(connection, callback,
 
         elif frame_type == 2:
             msg = partial_messages[channel]
-            msg.inbound_header(buf)
+            msg.inbound_header(buf, lazy=lazy_properties)
+
+            if stream_channels and channel in stream_channels:
+                stream = connection.channels[channel]._stream_for(msg)
+                if stream is not None:
+                    return on_stream_header(channel, msg, stream)
 
             if not msg.ready:
                 # wait for the content-body
@@ -69,8 +89,11 @@ def frame_handler(connection, callback,
             callback(channel, msg.frame_method, msg.frame_args, msg)
 
         elif frame_type == 3:
+            if streams and channel in streams:
+                return on_stream_body(channel, buf)
             msg = partial_messages[channel]
-            msg.inbound_body(buf)
+            msg.inbound_body(
+                buf, inplace=bytearray_bodies, spool=spool_threshold)
             if msg.ready:
                 expected_types[channel] = 1
                 partial_messages.pop(channel, None)
@@ -80,14 +103,49 @@ def frame_handler(connection, callback,
             pass
         return True
 
+    def on_stream_header(channel, msg, stream):
+        # The message is dispatched now so that the consumer gets it
+        # before its body, which is then passed on a frame at a time.
+        partial_messages.pop(channel, None)
+        if msg.ready:
+            expected_types[channel] = 1
+            callback(channel, msg.frame_method, msg.frame_args, msg)
+            stream.complete(msg)
+        else:
+            streams[channel] = msg, stream
+            expected_types[channel] = 3
+            callback(channel, msg.frame_method, msg.frame_args, msg)
+        return True
+
+    def on_stream_body(channel, buf):
+        msg, stream = streams[channel]
+        msg.body_received += len(buf)
+        if msg.body_received >= msg.body_size:
+            msg.ready = True
+            del streams[channel]
+            expected_types[channel] = 1
+        if not isinstance(buf, memoryview):
+            buf = memoryview(buf)
+        stream.on_chunk(msg, buf)
+        if msg.ready:
+            stream.complete(msg)
+        return True
+
     return on_frame
 
 
 def frame_writer(connection, transport,
                  pack=pack, pack_into=pack_into, range=range, len=len,
                  bytes=bytes, str_to_bytes=str_to_bytes):
-    """Create closure that writes frames."""
+    """Create closure that writes frames.
+
+    Message bodies can also be a :class:`mmap.mmap` or
+    :class:`memoryview`, sent without copying, or a file object
+    or an iterator of chunks, streamed a frame at a time instead of
+    being read in memory first (see :func:`write_body_stream`).
+    """
     write = transport.write
+    writev = transport.writev
 
     # memoryview first supported in Python 2.7
     # Initial support was very shaky, so could be we have to
@@ -95,7 +153,10 @@ def frame_writer(connection, transport,
     buf = bytearray(connection.frame_max - 8)
     view = memoryview(buf)
 
-    def write_frame(type_, channel, method_sig, args, content):
+    def write_frame(type_, channel, method_sig, args, content, out=None):
+        # If an ``out`` list is passed the frames are added to it
+        # instead of being written, so that they can be sent later
+        # together with other frames (using ``transport.writev``).
         chunk_size = connection.frame_max - 8
         offset = 0
         properties = None
@@ -103,6 +164,21 @@ def frame_writer(connection, transport,
         if content:
             properties = content._serialize_properties()
             body = content.body
+            if not isinstance(body, (bytes, bytearray, string_t)):
+                try:
+                    body = memoryview(body)
+                except TypeError:
+                    if isinstance(body, mmap.mmap):  # pragma: no cover
+                        # Python 2 mmaps don't support memoryview.
+                        body = memoryview(body[:])
+                    else:
+                        # ## STREAM: file object or iterator of chunks.
+                        write_body_stream(
+                            transport, channel, method_sig, args, content,
+                            properties, chunk_size, out)
+                        connection.bytes_sent += 1
+                        return
+            body = str_to_bytes(body)
             bodylen = len(body)
             framelen = (
                 len(args) +
@@ -110,32 +186,44 @@ def frame_writer(connection, transport,
                 bodylen +
                 FRAME_OVERHEAD
             )
-            bigbody = framelen > chunk_size
+            # buffers like mmap cannot be packed, only sliced.
+            bigbody = framelen > chunk_size or isinstance(body, memoryview)
         else:
             body, bodylen, bigbody = None, 0, 0
 
         if bigbody:
-            # ## SLOW: string copy and write for every frame
+            # ## SLOW: the frames are sent using a vectored write,
+            # with body chunks passed as slices of the original buffer.
             frame = (b''.join([pack('>HH', *method_sig), args])
                      if type_ == 1 else b'')  # encode method frame
             framelen = len(frame)
-            write(pack('>BHI%dsB' % framelen,
-                       type_, channel, framelen, frame, 0xce))
-            if body:
+            buffers = [pack('>BHI%dsB' % framelen,
+                            type_, channel, framelen, frame, 0xce)]
+            if body is not None:
                 frame = b''.join([
-                    pack('>HHQ', method_sig[0], 0, len(body)),
+                    pack('>HHQ', method_sig[0], 0, bodylen),
                     properties,
                 ])
                 framelen = len(frame)
-                write(pack('>BHI%dsB' % framelen,
-                           2, channel, framelen, frame, 0xce))
+                buffers.append(pack('>BHI%dsB' % framelen,
+                                    2, channel, framelen, frame, 0xce))
 
+            if bodylen:
+                body = memoryview(body)
                 for i in range(0, bodylen, chunk_size):
                     frame = body[i:i + chunk_size]
-                    framelen = len(frame)
-                    write(pack('>BHI%dsB' % framelen,
-                               3, channel, framelen,
-                               str_to_bytes(frame), 0xce))
+                    if i:
+                        # frame-end of the previous frame + frame header
+                        buffers.append(pack('>BBHI',
+                                            0xce, 3, channel, len(frame)))
+                    else:
+                        buffers.append(pack('>BHI', 3, channel, len(frame)))
+                    buffers.append(frame)
+                buffers.append(FRAME_END)
+            if out is not None:
+                out.extend(buffers)
+            else:
+                writev(buffers)
 
         else:
             # ## FAST: pack into buffer and single write
@@ -147,7 +235,7 @@ def frame_writer(connection, transport,
             offset += 8 + framelen
             if body is not None:
                 frame = b''.join([
-                    pack('>HHQ', method_sig[0], 0, len(body)),
+                    pack('>HHQ', method_sig[0], 0, bodylen),
                     properties,
                 ])
                 framelen = len(frame)
@@ -156,14 +244,133 @@ def frame_writer(connection, transport,
                           2, channel, framelen, frame, 0xce)
                 offset += 8 + framelen
 
-                bodylen = len(body)
                 if bodylen > 0:
                     framelen = bodylen
                     pack_into('>BHI%dsB' % framelen, buf, offset,
-                              3, channel, framelen, str_to_bytes(body), 0xce)
+                              3, channel, framelen, body, 0xce)
                     offset += 8 + framelen
 
-            write(view[:offset])
+            if out is not None:
+                # the buffer is reused by the next call, so copy it.
+                out.append(view[:offset].tobytes())
+            else:
+                write(view[:offset])
 
         connection.bytes_sent += 1
     return write_frame
+
+
+def write_body_stream(transport, channel, method_sig, args, content,
+                      properties, chunk_size, out=None, pack=pack):
+    """Write a message with a body read from a file or an iterator.
+
+    The body is sent as it is read, so only one chunk is kept in
+    memory at a time, unless the frames are added to an ``out`` list.
+
+    File objects are read from their current position, up to
+    ``content.body_size`` bytes or to the end of the file.  For other
+    iterables every chunk produced is sent, ``content.body_size``
+    must be set to their total size.
+
+    Raises:
+        ValueError: if the size of the body is unknown, or if a
+            file is smaller than ``content.body_size``.
+        ~amqp.exceptions.RecoverableConnectionError: if reading the
+            body failed, or the body read does not match its size,
+            once the content header was written.  The frames
+            announced by the header cannot be sent anymore, so the
+            transport is closed.
+    """
+    body = content.body
+    bodylen = content.body_size
+    if bodylen is None:
+        bodylen = _stream_size(body)
+    elif hasattr(body, 'fileno'):
+        try:
+            available = _stream_size(body)
+        except ValueError:
+            pass  # checked while sending.
+        else:
+            if available < bodylen:
+                raise ValueError(
+                    'Body smaller than body_size ({0} < {1})'.format(
+                        available, bodylen))
+    frame = b''.join([pack('>HH', *method_sig), args])
+    header = b''.join([pack('>HHQ', method_sig[0], 0, bodylen), properties])
+    buffers = [
+        pack('>BHI', 1, channel, len(frame)), frame, FRAME_END,
+        pack('>BHI', 2, channel, len(header)), header, FRAME_END,
+    ]
+    if out is not None:
+        # nothing is written if this fails.
+        out.extend(buffers)
+        return _write_body_frames(
+            out.extend, body, channel, chunk_size, bodylen)
+    transport.writev(buffers)
+    try:
+        _write_body_frames(
+            transport.writev, body, channel, chunk_size, bodylen)
+    except Exception as exc:
+        transport.close()
+        raise RecoverableConnectionError(
+            'Publishing streamed body failed: {0!r}'.format(exc))
+
+
+def _write_body_frames(write, body, channel, chunk_size, bodylen,
+                       pack=pack, range=range, len=len):
+    sent = 0
+    for chunk in _read_chunks(body, chunk_size, bodylen):
+        chunk = memoryview(str_to_bytes(chunk))
+        sent += len(chunk)
+        if sent > bodylen:
+            raise ValueError(
+                'Body larger than body_size ({0})'.format(bodylen))
+        for i in range(0, len(chunk), chunk_size):
+            frame = chunk[i:i + chunk_size]
+            write([pack('>BHI', 3, channel, len(frame)), frame, FRAME_END])
+    if sent != bodylen:
+        raise ValueError('Body smaller than body_size ({0} < {1})'.format(
+            sent, bodylen))
+
+
+def _stream_size(body):
+    # size of the rest of a file, from its current position.
+    try:
+        return os.fstat(body.fileno()).st_size - body.tell()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        raise ValueError(
+            'body_size must be set to stream a body of unknown size')
+
+
+def _read_chunks(body, chunk_size, bodylen):
+    readinto = getattr(body, 'readinto', None)
+    if readinto is not None:
+        # a new buffer for every chunk, as transports may keep
+        # a reference to what was written (e.g. asyncio).
+        remaining = bodylen
+        while remaining:
+            buf = bytearray(min(chunk_size, remaining))
+            n = readinto(buf)
+            if not n:
+                break
+            remaining -= n
+            yield memoryview(buf)[:n]
+    elif hasattr(body, 'read'):
+        remaining = bodylen
+        while remaining:
+            chunk = body.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    else:
+        for chunk in body:
+            yield chunk
+
+
+def locked_frame_writer(write_frame, lock):
+    """Wrap frame writer so that frames are written holding lock."""
+    def locked_write_frame(*args, **kwargs):
+        with lock:
+            return write_frame(*args, **kwargs)
+    return locked_write_frame
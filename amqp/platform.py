@@ -1,6 +1,7 @@
 """Platform compatibility."""
 from __future__ import absolute_import, unicode_literals
 
+import os
 import platform
 import re
 import struct
@@ -54,6 +55,15 @@ if sys.platform.startswith('linux'):
 elif sys.platform.startswith('win'):
     KNOWN_TCP_OPTS = {'TCP_NODELAY'}
 
+# Maximum number of buffers that can be passed to a single sendmsg call.
+try:
+    IOV_MAX = os.sysconf(str('SC_IOV_MAX'))
+except (AttributeError, TypeError, ValueError, OSError):  # pragma: no cover
+    IOV_MAX = -1
+if IOV_MAX <= 0:  # pragma: no cover
+    # not reported by the platform, POSIX requires at least 16.
+    IOV_MAX = 16
+
 if sys.version_info < (2, 7, 7):  # pragma: no cover
     import functools
 
@@ -75,6 +85,7 @@ else:
 
 __all__ = [
     'LINUX_VERSION',
+    'IOV_MAX',
     'SOL_TCP',
     'KNOWN_TCP_OPTS',
     'pack',
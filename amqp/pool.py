@@ -0,0 +1,303 @@
+"""Pools of connections and channels kept open, to be reused."""
+from __future__ import absolute_import, unicode_literals
+
+import logging
+import socket
+import threading
+from contextlib import contextmanager
+
+from .connection import Connection
+from .exceptions import PoolLimitExceeded, RecoverableConnectionError
+from .five import monotonic
+
+__all__ = ['ConnectionPool', 'ChannelPool']
+
+AMQP_LOGGER = logging.getLogger('amqp')
+
+
+class ChannelPool(object):
+    """Pool of open channels of a connection.
+
+    Opening a channel is a round-trip to the broker, so channels
+    released are kept open to be handed out again.
+
+    Channels are only reused if still open, and if they have no
+    consumers: those are closed when released instead.
+
+    Arguments:
+        connection (~amqp.connection.Connection): The connection
+            the channels are opened on.
+
+    Keyword Arguments:
+        limit (int): Maximum number of idle channels kept open,
+            unlimited by default.
+    """
+
+    def __init__(self, connection, limit=None):
+        self.connection = connection
+        self.limit = limit
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Return an open channel, opening a new one if needed."""
+        while 1:
+            with self._lock:
+                if not self._idle:
+                    break
+                channel = self._idle.pop()
+            if self._is_usable(channel):
+                return channel
+        return self.connection.channel()
+
+    def release(self, channel):
+        """Give back a channel returned by :meth:`acquire`."""
+        if self._is_usable(channel) and not channel.callbacks:
+            with self._lock:
+                if self.limit is None or len(self._idle) < self.limit:
+                    self._idle.append(channel)
+                    return
+        self._close(channel)
+
+    @contextmanager
+    def channel(self):
+        """Context manager acquiring a channel, released when done."""
+        channel = self.acquire()
+        try:
+            yield channel
+        finally:
+            self.release(channel)
+
+    def close(self):
+        """Close all the idle channels."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for channel in idle:
+            self._close(channel)
+
+    def _is_usable(self, channel):
+        return (channel.is_open and
+                channel.connection is self.connection and
+                self.connection.connected)
+
+    def _close(self, channel):
+        if not channel.is_open or channel.connection is None:
+            return
+        try:
+            channel.close()
+        except Exception as exc:
+            AMQP_LOGGER.debug('Error closing pooled channel: %r', exc)
+
+    def __len__(self):
+        return len(self._idle)
+
+
+class ConnectionPool(object):
+    """Pool of connections kept open, to be reused.
+
+    Connections released are kept open to be handed out again, which
+    saves the TCP connect, TLS and AMQP handshakes of a new
+    connection.  Idle connections are validated before being handed
+    out: they must still be connected, the events received while
+    idle are dispatched, so that one closed by the broker is noticed,
+    and their heartbeats must be current.  Connections failing these
+    checks are discarded.  Connections idle for longer than
+    ``max_idle`` seconds are closed.
+
+    Every connection of the pool also keeps a :class:`ChannelPool`,
+    used by :meth:`channel`:
+
+    Example:
+        >>> pool = ConnectionPool(limit=10, host='broker:5672')
+        >>> with pool.channel() as channel:
+        ...     channel.basic_publish(message, routing_key='tasks')
+
+    Idle connections don't read from the socket, so the heartbeats of
+    connections idle for long should be sent by a
+    :class:`~amqp.heartbeat.HeartbeatThread` passed as
+    ``heartbeat_thread``.
+
+    Keyword Arguments:
+        limit (int): Maximum number of connections, in use or idle,
+            unlimited by default.
+        max_idle (float): Close connections idle for longer than this
+            many seconds.
+        channel_limit (int): Maximum number of idle channels kept
+            open per connection (see :class:`ChannelPool`).
+        connection_class (type): Class of the connections,
+            :class:`~amqp.connection.Connection` by default.
+        **kwargs: Arguments for the connections.
+    """
+
+    def __init__(self, limit=None, max_idle=None, channel_limit=None,
+                 connection_class=Connection, **kwargs):
+        self.limit = limit
+        self.max_idle = max_idle
+        self.channel_limit = channel_limit
+        self.connection_class = connection_class
+        self.connection_kwargs = kwargs
+        # stack of (connection, time released), most recent last.
+        self._idle = []
+        self._channels = {}
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def acquire(self, block=True, timeout=None):
+        """Return a connected connection.
+
+        An idle connection is reused if possible, otherwise a new one
+        is connected if the pool is below its limit.
+
+        Keyword Arguments:
+            block (bool): Wait for a connection to be released if the
+                pool is at its limit.
+            timeout (float): Maximum time to wait for it.
+
+        Raises:
+            ~amqp.exceptions.PoolLimitExceeded: if no connection is
+                available.
+        """
+        deadline = monotonic() + timeout if timeout is not None else None
+        while 1:
+            with self._cond:
+                connection = self._get(block, deadline)
+            if connection is None:
+                break  # a new connection can be created.
+            if self._is_usable(connection):
+                return connection
+            self.discard(connection)
+        try:
+            connection = self.connection_class(**self.connection_kwargs)
+            connection.connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._channels[connection] = ChannelPool(
+            connection, self.channel_limit)
+        return connection
+
+    def release(self, connection):
+        """Give back a connection returned by :meth:`acquire`."""
+        if self._closed or not connection.connected:
+            return self.discard(connection)
+        with self._cond:
+            self._idle.append((connection, monotonic()))
+            self._cond.notify()
+        self.evict_idle()
+
+    def discard(self, connection):
+        """Close a connection of the pool, and forget about it."""
+        channels = self._channels.pop(connection, None)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        try:
+            if connection.connected:
+                if channels is not None:
+                    channels.close()
+                connection.close()
+            else:
+                connection.collect()
+        except Exception as exc:
+            AMQP_LOGGER.debug('Error closing pooled connection: %r', exc)
+            connection.collect()
+
+    def evict_idle(self, now=None):
+        """Close the connections idle for longer than ``max_idle``."""
+        if self.max_idle is None:
+            return
+        expires = (now or monotonic()) - self.max_idle
+        with self._cond:
+            evicted = [c for c, released in self._idle if released < expires]
+            self._idle = [
+                (c, released) for c, released in self._idle
+                if released >= expires
+            ]
+        for connection in evicted:
+            self.discard(connection)
+
+    @contextmanager
+    def connection(self, block=True, timeout=None):
+        """Context manager acquiring a connection, released when done.
+
+        The connection is discarded instead if a connection error
+        was raised.
+        """
+        connection = self.acquire(block, timeout)
+        failed = False
+        try:
+            yield connection
+        except connection.connection_errors:
+            failed = True
+            raise
+        finally:
+            if failed:
+                self.discard(connection)
+            else:
+                self.release(connection)
+
+    @contextmanager
+    def channel(self, block=True, timeout=None):
+        """Context manager acquiring a channel of a pooled connection."""
+        with self.connection(block, timeout) as connection:
+            with self._channels[connection].channel() as channel:
+                yield channel
+
+    def close(self):
+        """Close the idle connections, and the others when released."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for connection, _ in idle:
+            self.discard(connection)
+
+    def _get(self, block, deadline):
+        # Pop an idle connection, or reserve room for a new one
+        # (returning None), holding the condition.
+        while 1:
+            if self._closed:
+                raise RecoverableConnectionError('Connection pool closed')
+            if self._idle:
+                return self._idle.pop()[0]
+            if self.limit is None or self._size < self.limit:
+                self._size += 1
+                return None
+            if not block:
+                raise PoolLimitExceeded(
+                    'No connection available (limit={0})'.format(self.limit))
+            if deadline is None:
+                self._cond.wait()
+            else:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise PoolLimitExceeded(
+                        'Timed out waiting for a connection')
+                self._cond.wait(remaining)
+
+    def _is_usable(self, connection):
+        if not connection.connected:
+            return False
+        try:
+            # dispatch what was received while idle, e.g. heartbeats,
+            # or the broker closing the connection.
+            while 1:
+                connection.drain_events(timeout=0)
+        except socket.timeout:
+            pass
+        except Exception as exc:
+            AMQP_LOGGER.debug('Pooled connection unusable: %r', exc)
+            return False
+        if connection.heartbeat and connection.heartbeat_thread is None:
+            try:
+                connection.heartbeat_tick()
+            except Exception as exc:
+                AMQP_LOGGER.debug('Pooled connection unusable: %r', exc)
+                return False
+        return bool(connection.connected)
+
+    def __len__(self):
+        return self._size
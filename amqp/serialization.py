@@ -7,14 +7,17 @@
 from __future__ import absolute_import, unicode_literals
 
 import calendar
+import mmap
 import sys
+import tempfile
 from datetime import datetime
 from decimal import Decimal
 from io import BytesIO
+from struct import Struct
 
 from .exceptions import FrameSyntaxError
 from .five import int_types, items, long_t, string, string_t
-from .platform import pack, unpack_from
+from .platform import pack, pack_into, unpack_from
 from .spec import Basic
 from .utils import bytes_to_str as pstr_t
 from .utils import str_to_bytes
@@ -34,6 +37,32 @@ ILLEGAL_TABLE_TYPE_WITH_VALUE = """\
 """
 
 
+class _ShortstrCache(dict):
+    """Decoded short strings, keyed by their raw bytes.
+
+    Values like routing keys, consumer tags and header names are
+    repeated in most messages, so these are only decoded once, and
+    share the same object.  The cache is cleared when more than
+    ``maxsize`` values are stored.
+    """
+
+    def __init__(self, maxsize=1024):
+        super(_ShortstrCache, self).__init__()
+        self.maxsize = maxsize
+
+    def __missing__(self, key):
+        value = pstr_t(key)
+        if len(self) >= self.maxsize:
+            self.clear()
+        self[key] = value
+        return value
+
+
+#: Cache used by the decoders, only for values that are likely to repeat
+#: (i.e. not for message ids).  Decoded buffers must be :class:`bytes`.
+shortstr_cache = _ShortstrCache()
+
+
 def _read_item(buf, offset=0, unpack_from=unpack_from, ftype_t=ftype_t):
     ftype = ftype_t(buf[offset]) if ftype_t else buf[offset]
     offset += 1
@@ -99,25 +128,10 @@ def _read_item(buf, offset=0, unpack_from=unpack_from, ftype_t=ftype_t):
         val = Decimal(n) / Decimal(10 ** d)
     # 'F': table
     elif ftype == 'F':
-        tlen, = unpack_from('>I', buf, offset)
-        offset += 4
-        limit = offset + tlen
-        val = {}
-        while offset < limit:
-            keylen, = unpack_from('>B', buf, offset)
-            offset += 1
-            key = pstr_t(buf[offset:offset + keylen])
-            offset += keylen
-            val[key], offset = _read_item(buf, offset)
+        val, offset = _read_table(buf, offset)
     # 'A': array
     elif ftype == 'A':
-        alen, = unpack_from('>I', buf, offset)
-        offset += 4
-        limit = offset + alen
-        val = []
-        while offset < limit:
-            v, offset = _read_item(buf, offset)
-            val.append(v)
+        val, offset = _read_array(buf, offset)
     # 't' (bool)
     elif ftype == 't':
         val, = unpack_from('>B', buf, offset)
@@ -138,9 +152,209 @@ def _read_item(buf, offset=0, unpack_from=unpack_from, ftype_t=ftype_t):
     return val, offset
 
 
-def loads(format, buf, offset=0,
-          ord=ord, unpack_from=unpack_from,
-          _read_item=_read_item, pstr_t=pstr_t):
+def _read_table(buf, offset, unpack_from=unpack_from, cache=shortstr_cache):
+    tlen, = unpack_from('>I', buf, offset)
+    offset += 4
+    limit = offset + tlen
+    val = {}
+    while offset < limit:
+        keylen, = unpack_from('>B', buf, offset)
+        offset += 1
+        key = cache[buf[offset:offset + keylen]]
+        offset += keylen
+        val[key], offset = _read_item(buf, offset)
+    return val, offset
+
+
+def _read_array(buf, offset, unpack_from=unpack_from):
+    alen, = unpack_from('>I', buf, offset)
+    offset += 4
+    limit = offset + alen
+    val = []
+    while offset < limit:
+        aval, offset = _read_item(buf, offset)
+        val.append(aval)
+    return val, offset
+
+
+#: Struct codes for the fixed-width argument types.
+_FIXED_CODES = {'o': 'B', 'B': 'H', 'l': 'I', 'L': 'Q', 'f': 'f', 'T': 'Q'}
+
+#: Struct codes for the length prefix of the string argument types.
+_STRING_CODES = {'s': 'B', 'S': 'I'}
+
+
+class _CodeBuilder(object):
+    """Helper used to generate the source of a compiled codec.
+
+    Adjacent fixed-width fields (including packed bits and string
+    length prefixes) are collected into a single :class:`struct.Struct`,
+    so that every run of them costs one ``pack``/``unpack_from`` call.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.namespace = {}
+        self.codes = []
+        self.fields = []
+
+    def constant(self, value, prefix='_c'):
+        name = '{0}{1}'.format(prefix, len(self.namespace))
+        self.namespace[name] = value
+        return name
+
+    def emit(self, line):
+        self.lines.append('    ' + line)
+
+    def take_run(self):
+        """Return the pending run as ``(struct_name, size, fields)``."""
+        if not self.codes:
+            return None, 0, []
+        struct = Struct('>' + ''.join(self.codes))
+        fields, self.codes, self.fields = self.fields, [], []
+        return self.constant(struct, '_s'), struct.size, fields
+
+    def build(self, name, args):
+        source = 'def {0}({1}):\n{2}\n'.format(
+            name, ', '.join(args), '\n'.join(self.lines))
+        exec(compile(source, '<amqp codec>', 'exec'), self.namespace)
+        return self.namespace[name]
+
+
+def _compile_loads(format):
+    """Compile AMQP argument format into a specialized decoder.
+
+    The returned function takes ``(buf, offset)`` and
+    returns ``(values, offset)`` exactly like :func:`loads`.
+    """
+    c = _CodeBuilder()
+    post = []
+    bitvar, bitcount = None, 8
+
+    def flush():
+        struct, size, fields = c.take_run()
+        if struct:
+            c.emit('{0}, = {1}.unpack_from(buf, offset)'.format(
+                ', '.join(fields), struct))
+            c.emit('offset += {0}'.format(size))
+        for line in post:
+            c.emit(line)
+        post[:] = []
+
+    values = []
+    for i, p in enumerate(pstr_t(format)):
+        var = 'v{0}'.format(i)
+        values.append(var)
+        if p == 'b':
+            if bitcount >= 8:
+                bitvar, bitcount = '_b{0}'.format(i), 0
+                c.codes.append('B')
+                c.fields.append(bitvar)
+            post.append('{0} = ({1} & {2}) != 0'.format(
+                var, bitvar, 1 << bitcount))
+            bitcount += 1
+            continue
+        bitcount = 8
+        if p in _FIXED_CODES:
+            c.codes.append(_FIXED_CODES[p])
+            c.fields.append(var)
+            if p == 'T':
+                post.append('{0} = utcfromtimestamp({0})'.format(var))
+        elif p in _STRING_CODES:
+            c.codes.append(_STRING_CODES[p])
+            c.fields.append('slen')
+            flush()
+            if p == 's' and ftype_t:
+                # Python 3 only, as shortstr values are
+                # decoded to unicode, not str, on Python 2.
+                c.emit('{0} = shortstr_cache[buf[offset:offset + slen]]'
+                       .format(var))
+            else:
+                c.emit("{0} = buf[offset:offset + slen].decode("
+                       "'utf-8', 'surrogatepass')".format(var))
+            c.emit('offset += slen')
+        elif p == 'F':
+            flush()
+            c.emit('{0}, offset = _read_table(buf, offset)'.format(var))
+        elif p == 'A':
+            flush()
+            c.emit('{0}, offset = _read_array(buf, offset)'.format(var))
+        else:
+            raise FrameSyntaxError(ILLEGAL_TABLE_TYPE.format(p))
+    flush()
+    c.emit('return [{0}], offset'.format(', '.join(values)))
+    c.namespace.update(
+        _read_table=_read_table, _read_array=_read_array,
+        utcfromtimestamp=datetime.utcfromtimestamp,
+        shortstr_cache=shortstr_cache,
+    )
+    return c.build('loads', ['buf', 'offset'])
+
+
+def _compile_dumps(format):
+    """Compile AMQP argument format into a specialized encoder.
+
+    The returned function takes a sequence of values and
+    returns the serialized bytes exactly like :func:`dumps`.
+    """
+    c = _CodeBuilder()
+    parts = []
+    bitvar, bitcount = None, 8
+
+    def flush():
+        struct, _, fields = c.take_run()
+        if struct:
+            parts.append('{0}.pack({1})'.format(struct, ', '.join(fields)))
+
+    for i, p in enumerate(pstr_t(format)):
+        var = 'v{0}'.format(i)
+        if p == 'b':
+            if bitcount >= 8:
+                bitvar, bitcount = '_b{0}'.format(i), 0
+                c.emit('{0} = 0'.format(bitvar))
+                c.codes.append('B')
+                c.fields.append(bitvar)
+            c.emit('if values[{0}]:'.format(i))
+            c.emit('    {0} |= {1}'.format(bitvar, 1 << bitcount))
+            bitcount += 1
+            continue
+        bitcount = 8
+        if p in _FIXED_CODES:
+            if p == 'B':
+                c.emit('{0} = int(values[{1}])'.format(var, i))
+            elif p == 'T':
+                c.emit('{0} = long_t(timegm(values[{1}].utctimetuple()))'
+                       .format(var, i))
+            else:
+                c.emit('{0} = values[{1}]'.format(var, i))
+            c.codes.append(_FIXED_CODES[p])
+            c.fields.append(var)
+        elif p in _STRING_CODES:
+            c.emit("{0} = values[{1}] or ''".format(var, i))
+            c.emit('if isinstance({0}, string):'.format(var))
+            c.emit("    {0} = {0}.encode('utf-8', 'surrogatepass')"
+                   .format(var))
+            c.codes.append(_STRING_CODES[p])
+            c.fields.append('len({0})'.format(var))
+            flush()
+            parts.append(var)
+        elif p == 'F':
+            flush()
+            parts.append('_dump_table(values[{0}] or {{}})'.format(i))
+        elif p == 'A':
+            flush()
+            parts.append('_dump_array(values[{0}] or [])'.format(i))
+    flush()
+    c.emit('return {0}.join([{1}])'.format(
+        c.constant(bytes()), ', '.join(parts)))
+    c.namespace.update(
+        _dump_table=_dump_table, _dump_array=_dump_array,
+        long_t=long_t, timegm=calendar.timegm, string=string,
+    )
+    return c.build('dumps', ['values'])
+
+
+def loads(format, buf, offset=0, _codecs={}):
     """Deserialize amqp format.
 
     bit = b
@@ -154,94 +368,23 @@ def loads(format, buf, offset=0,
     table = F
     array = A
     timestamp = T
-    """
-    bitcount = bits = 0
-
-    values = []
-    append = values.append
-    format = pstr_t(format)
 
-    for p in format:
-        if p == 'b':
-            if not bitcount:
-                bits = ord(buf[offset:offset + 1])
-            bitcount = 8
-            val = (bits & 1) == 1
-            bits >>= 1
-            bitcount -= 1
-            offset += 1
-        elif p == 'o':
-            bitcount = bits = 0
-            val, = unpack_from('>B', buf, offset)
-            offset += 1
-        elif p == 'B':
-            bitcount = bits = 0
-            val, = unpack_from('>H', buf, offset)
-            offset += 2
-        elif p == 'l':
-            bitcount = bits = 0
-            val, = unpack_from('>I', buf, offset)
-            offset += 4
-        elif p == 'L':
-            bitcount = bits = 0
-            val, = unpack_from('>Q', buf, offset)
-            offset += 8
-        elif p == 'f':
-            bitcount = bits = 0
-            val, = unpack_from('>f', buf, offset)
-            offset += 4
-        elif p == 's':
-            bitcount = bits = 0
-            slen, = unpack_from('B', buf, offset)
-            offset += 1
-            val = buf[offset:offset + slen].decode('utf-8', 'surrogatepass')
-            offset += slen
-        elif p == 'S':
-            bitcount = bits = 0
-            slen, = unpack_from('>I', buf, offset)
-            offset += 4
-            val = buf[offset:offset + slen].decode('utf-8', 'surrogatepass')
-            offset += slen
-        elif p == 'F':
-            bitcount = bits = 0
-            tlen, = unpack_from('>I', buf, offset)
-            offset += 4
-            limit = offset + tlen
-            val = {}
-            while offset < limit:
-                keylen, = unpack_from('>B', buf, offset)
-                offset += 1
-                key = pstr_t(buf[offset:offset + keylen])
-                offset += keylen
-                val[key], offset = _read_item(buf, offset)
-        elif p == 'A':
-            bitcount = bits = 0
-            alen, = unpack_from('>I', buf, offset)
-            offset += 4
-            limit = offset + alen
-            val = []
-            while offset < limit:
-                aval, offset = _read_item(buf, offset)
-                val.append(aval)
-        elif p == 'T':
-            bitcount = bits = 0
-            val, = unpack_from('>Q', buf, offset)
-            offset += 8
-            val = datetime.utcfromtimestamp(val)
-        else:
-            raise FrameSyntaxError(ILLEGAL_TABLE_TYPE.format(p))
-        append(val)
-    return values, offset
-
-
-def _flushbits(bits, write, pack=pack):
-    if bits:
-        write(pack('B' * len(bits), *bits))
-        bits[:] = []
-    return 0
+    Note:
+        The format is compiled into a specialized decoder
+        the first time it's used, and the decoder is cached
+        for subsequent calls.
+    """
+    try:
+        decode = _codecs[format]
+    except KeyError:
+        decode = _codecs[format] = _compile_loads(format)
+    if not isinstance(buf, bytes):
+        # slices must be hashable (see shortstr_cache).
+        buf = bytes(buf)
+    return decode(buf, offset)
 
 
-def dumps(format, values):
+def dumps(format, values, _codecs={}):
     """Serialize AMQP arguments.
 
     Notes:
@@ -254,116 +397,89 @@ def dumps(format, values):
         longstr = S
         table = F
         array = A
+
+        The format is compiled into a specialized encoder
+        the first time it's used, and the encoder is cached
+        for subsequent calls.
     """
-    bitcount = 0
-    bits = []
-    out = BytesIO()
-    write = out.write
+    if len(values) < len(format):
+        format = format[:len(values)]
+    try:
+        encode = _codecs[format]
+    except KeyError:
+        encode = _codecs[format] = _compile_dumps(format)
+    return encode(values)
 
-    format = pstr_t(format)
 
-    for i, val in enumerate(values):
-        p = format[i]
-        if p == 'b':
-            val = 1 if val else 0
-            shift = bitcount % 8
-            if shift == 0:
-                bits.append(0)
-            bits[-1] |= (val << shift)
-            bitcount += 1
-        elif p == 'o':
-            bitcount = _flushbits(bits, write)
-            write(pack('B', val))
-        elif p == 'B':
-            bitcount = _flushbits(bits, write)
-            write(pack('>H', int(val)))
-        elif p == 'l':
-            bitcount = _flushbits(bits, write)
-            write(pack('>I', val))
-        elif p == 'L':
-            bitcount = _flushbits(bits, write)
-            write(pack('>Q', val))
-        elif p == 'f':
-            bitcount = _flushbits(bits, write)
-            write(pack('>f', val))
-        elif p == 's':
-            val = val or ''
-            bitcount = _flushbits(bits, write)
-            if isinstance(val, string):
-                val = val.encode('utf-8', 'surrogatepass')
-            write(pack('B', len(val)))
-            write(val)
-        elif p == 'S':
-            val = val or ''
-            bitcount = _flushbits(bits, write)
-            if isinstance(val, string):
-                val = val.encode('utf-8', 'surrogatepass')
-            write(pack('>I', len(val)))
-            write(val)
-        elif p == 'F':
-            bitcount = _flushbits(bits, write)
-            _write_table(val or {}, write, bits)
-        elif p == 'A':
-            bitcount = _flushbits(bits, write)
-            _write_array(val or [], write, bits)
-        elif p == 'T':
-            write(pack('>Q', long_t(calendar.timegm(val.utctimetuple()))))
-    _flushbits(bits, write)
+def _dump_table(d):
+    buf = bytearray()
+    _encode_table(d, buf)
+    return bytes(buf)
+
 
-    return out.getvalue()
+def _dump_array(values):
+    buf = bytearray()
+    _encode_array(values, buf)
+    return bytes(buf)
 
 
-def _write_table(d, write, bits, pack=pack):
-    out = BytesIO()
-    twrite = out.write
+def _write_table(d, write, bits):
+    write(_dump_table(d))
+
+
+def _write_array(l, write, bits):
+    write(_dump_array(l))
+
+
+def _encode_table(d, buf, pack=pack, pack_into=pack_into, string=string):
+    # Nested tables and arrays are encoded into the same buffer,
+    # the length is filled in once the table is complete.
+    start = len(buf)
+    buf += b'\0\0\0\0'
     for k, v in items(d):
         if isinstance(k, string):
             k = k.encode('utf-8', 'surrogatepass')
-        twrite(pack('B', len(k)))
-        twrite(k)
+        buf += pack('B', len(k))
+        buf += k
         try:
-            _write_item(v, twrite, bits)
+            _encode_item(v, buf)
         except ValueError:
             raise FrameSyntaxError(
                 ILLEGAL_TABLE_TYPE_WITH_KEY.format(type(v), k, v))
-    table_data = out.getvalue()
-    write(pack('>I', len(table_data)))
-    write(table_data)
+    pack_into('>I', buf, start, len(buf) - start - 4)
 
 
-def _write_array(l, write, bits, pack=pack):
-    out = BytesIO()
-    awrite = out.write
+def _encode_array(l, buf, pack_into=pack_into):
+    start = len(buf)
+    buf += b'\0\0\0\0'
     for v in l:
         try:
-            _write_item(v, awrite, bits)
+            _encode_item(v, buf)
         except ValueError:
             raise FrameSyntaxError(
                 ILLEGAL_TABLE_TYPE_WITH_VALUE.format(type(v), v))
-    array_data = out.getvalue()
-    write(pack('>I', len(array_data)))
-    write(array_data)
+    pack_into('>I', buf, start, len(buf) - start - 4)
 
 
-def _write_item(v, write, bits, pack=pack,
-                string_t=string_t, bytes=bytes, string=string, bool=bool,
-                float=float, int_types=int_types, Decimal=Decimal,
-                datetime=datetime, dict=dict, list=list, tuple=tuple,
-                None_t=None):
+def _encode_item(v, buf, pack=pack,
+                 string_t=string_t, bytes=bytes, string=string, bool=bool,
+                 float=float, int_types=int_types, Decimal=Decimal,
+                 datetime=datetime, dict=dict, list=list, tuple=tuple,
+                 None_t=None):
     if isinstance(v, (string_t, bytes)):
         if isinstance(v, string):
             v = v.encode('utf-8', 'surrogatepass')
-        write(pack('>cI', b'S', len(v)))
-        write(v)
+        buf += pack('>cI', b'S', len(v))
+        buf += v
     elif isinstance(v, bool):
-        write(pack('>cB', b't', int(v)))
+        buf += pack('>cB', b't', int(v))
     elif isinstance(v, float):
-        write(pack('>cd', b'd', v))
+        buf += pack('>cd', b'd', v)
     elif isinstance(v, int_types):
         if v > 2147483647 or v < -2147483647:
-            write(pack('>cq', b'L', v))
+            buf += pack('>cq', b'L', v)
         else:
-            write(pack('>ci', b'I', v))
+            buf += pack('>ci', b'I', v)
     elif isinstance(v, Decimal):
         sign, digits, exponent = v.as_tuple()
         v = 0
@@ -371,25 +487,27 @@ def _write_item(v, write, bits, pack=pack,
             v = (v * 10) + d
         if sign:
             v = -v
-        write(pack('>cBi', b'D', -exponent, v))
+        buf += pack('>cBi', b'D', -exponent, v)
     elif isinstance(v, datetime):
-        write(
-            pack('>cQ', b'T', long_t(calendar.timegm(v.utctimetuple()))))
+        buf += pack(
+            '>cQ', b'T', long_t(calendar.timegm(v.utctimetuple())))
     elif isinstance(v, dict):
-        write(b'F')
-        _write_table(v, write, bits)
+        buf += b'F'
+        _encode_table(v, buf)
     elif isinstance(v, (list, tuple)):
-        write(b'A')
-        _write_array(v, write, bits)
+        buf += b'A'
+        _encode_array(v, buf)
     elif v is None_t:
-        write(b'V')
+        buf += b'V'
     else:
         raise ValueError()
 
 
-def decode_properties_basic(buf, offset=0,
-                            unpack_from=unpack_from, pstr_t=pstr_t):
+def decode_properties_basic(buf, offset=0, unpack_from=unpack_from,
+                            pstr_t=pstr_t, cache=shortstr_cache):
     """Decode basic properties."""
+    if not isinstance(buf, bytes):
+        buf = bytes(buf)
     properties = {}
 
     flags, = unpack_from('>H', buf, offset)
@@ -398,12 +516,12 @@ def decode_properties_basic(buf, offset=0,
     if flags & 0x8000:
         slen, = unpack_from('>B', buf, offset)
         offset += 1
-        properties['content_type'] = pstr_t(buf[offset:offset + slen])
+        properties['content_type'] = cache[buf[offset:offset + slen]]
         offset += slen
     if flags & 0x4000:
         slen, = unpack_from('>B', buf, offset)
         offset += 1
-        properties['content_encoding'] = pstr_t(buf[offset:offset + slen])
+        properties['content_encoding'] = cache[buf[offset:offset + slen]]
         offset += slen
     if flags & 0x2000:
         _f, offset = loads('F', buf, offset)
@@ -422,12 +540,12 @@ def decode_properties_basic(buf, offset=0,
     if flags & 0x0200:
         slen, = unpack_from('>B', buf, offset)
         offset += 1
-        properties['reply_to'] = pstr_t(buf[offset:offset + slen])
+        properties['reply_to'] = cache[buf[offset:offset + slen]]
         offset += slen
     if flags & 0x0100:
         slen, = unpack_from('>B', buf, offset)
         offset += 1
-        properties['expiration'] = pstr_t(buf[offset:offset + slen])
+        properties['expiration'] = cache[buf[offset:offset + slen]]
         offset += slen
     if flags & 0x0080:
         slen, = unpack_from('>B', buf, offset)
@@ -440,30 +558,61 @@ def decode_properties_basic(buf, offset=0,
     if flags & 0x0020:
         slen, = unpack_from('>B', buf, offset)
         offset += 1
-        properties['type'] = pstr_t(buf[offset:offset + slen])
+        properties['type'] = cache[buf[offset:offset + slen]]
         offset += slen
     if flags & 0x0010:
         slen, = unpack_from('>B', buf, offset)
         offset += 1
-        properties['user_id'] = pstr_t(buf[offset:offset + slen])
+        properties['user_id'] = cache[buf[offset:offset + slen]]
         offset += slen
     if flags & 0x0008:
         slen, = unpack_from('>B', buf, offset)
         offset += 1
-        properties['app_id'] = pstr_t(buf[offset:offset + slen])
+        properties['app_id'] = cache[buf[offset:offset + slen]]
         offset += slen
     if flags & 0x0004:
         slen, = unpack_from('>B', buf, offset)
         offset += 1
-        properties['cluster_id'] = pstr_t(buf[offset:offset + slen])
+        properties['cluster_id'] = cache[buf[offset:offset + slen]]
         offset += slen
     return properties, offset
 
 
+def _decode_properties_basic_head(buf, offset=0, unpack_from=unpack_from,
+                                  cache=shortstr_cache):
+    # Only decode the content type and encoding, which come first,
+    # used for lazy properties (see GenericContent.inbound_header).
+    if not isinstance(buf, bytes):
+        buf = bytes(buf)
+    properties = {}
+
+    flags, = unpack_from('>H', buf, offset)
+    offset += 2
+
+    if flags & 0x8000:
+        slen, = unpack_from('>B', buf, offset)
+        offset += 1
+        properties['content_type'] = cache[buf[offset:offset + slen]]
+        offset += slen
+    if flags & 0x4000:
+        slen, = unpack_from('>B', buf, offset)
+        offset += 1
+        properties['content_encoding'] = cache[buf[offset:offset + slen]]
+    return properties
+
+
 PROPERTY_CLASSES = {
     Basic.CLASS_ID: decode_properties_basic,
 }
 
+#: Decoders for the properties available before the full
+#: properties are decoded, when decoding lazily.
+_PROPERTY_HEADS = {
+    Basic.CLASS_ID: (
+        _decode_properties_basic_head, ('content_type', 'content_encoding'),
+    ),
+}
+
 
 class GenericContent(object):
     """Abstract base class for AMQP content.
@@ -474,12 +623,29 @@ class GenericContent(object):
     CLASS_ID = None
     PROPERTIES = [('dummy', 's')]
 
+    # Instances are created for every message received,
+    # so they should be as small as possible.
+    __slots__ = (
+        'frame_method', 'frame_args', 'body', 'body_received', 'body_size',
+        'ready', '_properties', '_pending_chunks',
+        # Raw properties ``(class_id, buf, offset)`` not decoded yet,
+        # see inbound_header().
+        '_raw_properties',
+        # Names of the properties already decoded when the
+        # properties are decoded lazily.
+        '_head_properties',
+        # Encoded properties ``(buf, offset)`` of a received message,
+        # sent again as-is as long as the properties are not modified.
+        '_encoded_properties',
+    )
+
     def __init__(self, frame_method=None, frame_args=None, **props):
         self.frame_method = frame_method
         self.frame_args = frame_args
 
         self.properties = props
-        self._pending_chunks = []
+        self._head_properties = ()
+        self._pending_chunks = None
         self.body_received = 0
         self.body_size = 0
         self.ready = False
@@ -487,14 +653,51 @@ class GenericContent(object):
     def __getattr__(self, name):
         # Look for additional properties in the 'properties'
         # dictionary, and if present - the 'delivery_info' dictionary.
-        if name == '__setstate__':
+        if name.startswith('_'):
             # Allows pickling/unpickling to work
-            raise AttributeError('__setstate__')
+            raise AttributeError(name)
 
-        if name in self.properties:
-            return self.properties[name]
+        if self._raw_properties is not None and name in self._head_properties:
+            # no need to decode everything.
+            properties = self._properties
+        else:
+            properties = self._get_properties()
+        if name in properties:
+            value = properties[name]
+            if isinstance(value, dict):
+                # may be modified in place.
+                self._encoded_properties = None
+            return value
         raise AttributeError(name)
 
+    def __getstate__(self):
+        # needed to pickle slots with protocols 0 and 1.
+        slots = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if name not in ('__dict__', '__weakref__') and \
+                        hasattr(self, name):
+                    slots[name] = getattr(self, name)
+        return getattr(self, '__dict__', None) or None, slots
+
+    @property
+    def properties(self):
+        # the properties may be modified through the returned dict,
+        # so the encoded properties cannot be reused anymore.
+        self._encoded_properties = None
+        return self._get_properties()
+
+    @properties.setter
+    def properties(self, properties):
+        self._raw_properties = self._encoded_properties = None
+        self._properties = properties
+
+    def _get_properties(self):
+        if self._raw_properties is not None:
+            class_id, buf, offset = self._raw_properties
+            self._load_properties(class_id, buf, offset)
+        return self._properties
+
     def _load_properties(self, class_id, buf, offset=0,
                          classes=PROPERTY_CLASSES, unpack_from=unpack_from):
         """Load AMQP properties.
@@ -505,7 +708,22 @@ class GenericContent(object):
         """
         # Read 16-bit shorts until we get one with a low bit set to zero
         props, offset = classes[class_id](buf, offset)
-        self.properties = props
+        self._properties, self._raw_properties = props, None
+        return offset
+
+    def _load_properties_lazy(self, class_id, buf, offset=0,
+                              heads=_PROPERTY_HEADS):
+        """Keep AMQP properties to be loaded on first access.
+
+        Only the leading properties (content type and encoding) are
+        decoded now, the others are decoded when accessed.
+        """
+        try:
+            decode_head, self._head_properties = heads[class_id]
+        except KeyError:
+            return self._load_properties(class_id, buf, offset)
+        self._properties = decode_head(buf, offset)
+        self._raw_properties = class_id, buf, offset
         return offset
 
     def _serialize_properties(self):
@@ -514,7 +732,14 @@ class GenericContent(object):
         Serialize the 'properties' attribute (a dictionary) into
         the raw bytes making up a set of property flags and a
         property list, suitable for putting into a content frame header.
+
+        The properties of a received message are not encoded again
+        unless modified, the received property list is used instead.
         """
+        if self._encoded_properties is not None:
+            buf, offset = self._encoded_properties
+            return buf[offset:]
+
         shift = 15
         flag_bits = 0
         flags = []
@@ -544,24 +769,78 @@ class GenericContent(object):
 
         return result.getvalue()
 
-    def inbound_header(self, buf, offset=0):
+    def inbound_header(self, buf, offset=0, lazy=False):
+        """Load a content header frame.
+
+        If ``lazy`` is set, the properties are only decoded when
+        first accessed. The property list, which is kept to be
+        sent again as-is, goes up to the end of ``buf``; the buffer
+        must not be modified afterwards.
+        """
         class_id, self.body_size = unpack_from('>HxxQ', buf, offset)
         offset += 12
-        self._load_properties(class_id, buf, offset)
+        if lazy:
+            self._load_properties_lazy(class_id, buf, offset)
+        else:
+            self._load_properties(class_id, buf, offset)
+        self._encoded_properties = buf, offset
         if not self.body_size:
             self.ready = True
         return offset
 
-    def inbound_body(self, buf):
+    def inbound_body(self, buf, inplace=False, spool=None):
+        """Load a content body frame.
+
+        If ``inplace`` is set, the body is copied into a
+        :class:`bytearray` allocated at the size of the body,
+        which becomes the body, instead of joining the frames.
+
+        If ``spool`` is set, bodies larger than that many bytes are
+        written to a temporary file instead of being kept in memory,
+        and the body is a read-only :class:`mmap.mmap` of the file.
+        """
         chunks = self._pending_chunks
         self.body_received += len(buf)
+        if spool is not None and self.body_size > spool:
+            return self._spool_body(buf)
+        if inplace:
+            if chunks is None:
+                chunks = self._pending_chunks = bytearray(self.body_size)
+            end = self.body_received
+            chunks[end - len(buf):end] = buf
+            if end >= self.body_size:
+                self.body, self._pending_chunks = chunks, None
+                self.ready = True
+            return
+        if isinstance(buf, memoryview):
+            # the transport will reuse this memory for the next frame.
+            buf = buf.tobytes()
         if self.body_received >= self.body_size:
             if chunks:
                 chunks.append(buf)
                 self.body = bytes().join(chunks)
-                chunks[:] = []
+                self._pending_chunks = None
             else:
                 self.body = buf
             self.ready = True
+        elif chunks is None:
+            self._pending_chunks = [buf]
         else:
             chunks.append(buf)
+
+    def _spool_body(self, buf):
+        spool = self._pending_chunks
+        if spool is None:
+            spool = self._pending_chunks = tempfile.TemporaryFile()
+        spool.write(buf)
+        if self.body_received >= self.body_size:
+            self._pending_chunks = None
+            try:
+                spool.flush()
+                # the mapping stays valid once the file is closed,
+                # and the file is deleted when it is unmapped.
+                self.body = mmap.mmap(
+                    spool.fileno(), 0, access=mmap.ACCESS_READ)
+            finally:
+                spool.close()
+            self.ready = True
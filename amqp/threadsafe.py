@@ -0,0 +1,255 @@
+"""Connection that can be shared by several threads."""
+from __future__ import absolute_import, unicode_literals
+
+import socket
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from .channel import Channel
+from .connection import Connection
+from .exceptions import RecoverableConnectionError
+from .five import items, monotonic
+
+__all__ = ['ThreadSafeConnection', 'ThreadSafeChannel']
+
+
+class ThreadSafeChannel(Channel):
+    """Channel of a :class:`ThreadSafeConnection`.
+
+    Waiting for a reply parks the thread until the reader thread of
+    the connection received it, instead of reading from the socket.
+    A channel should only be used by one thread at a time.
+    """
+
+    def wait(self, *args, **kwargs):
+        with self.connection._claimed(self.channel_id):
+            return super(ThreadSafeChannel, self).wait(*args, **kwargs)
+
+    def wait_for_confirms(self, timeout=None):
+        with self.connection._claimed(self.channel_id):
+            return super(ThreadSafeChannel, self).wait_for_confirms(timeout)
+
+    def _drain_events(self, timeout=None):
+        return self.connection.drain_channel(self.channel_id, timeout)
+
+    def basic_consume(self, *args, **kwargs):
+        if kwargs.get('on_chunk') is not None:
+            raise NotImplementedError(
+                'Streaming consumers are not supported by '
+                'ThreadSafeConnection')
+        return super(ThreadSafeChannel, self).basic_consume(*args, **kwargs)
+
+
+class ThreadSafeConnection(Connection):
+    """Connection that can be shared by several threads.
+
+    Once connected, a reader thread reads all the frames received,
+    and queues the methods received by every channel.  Threads
+    waiting for a reply on a channel dispatch the methods of that
+    channel only, and park on a condition variable while there are
+    none, so that threads using different channels never wait on each
+    other, nor on the socket.
+
+    Frames are written holding the write lock of the connection (see
+    :meth:`~amqp.connection.Connection.enable_write_lock`), so the
+    frames of a message are never interleaved with the frames written
+    by other threads.
+
+    :meth:`drain_events` dispatches the methods of every channel not
+    being waited on by another thread, e.g. to deliver messages to
+    consumers.  Consumer callbacks are called by the thread draining
+    events, or by the thread waiting on the channel.
+
+    Heartbeats are not sent by the reader thread, see
+    :class:`~amqp.heartbeat.HeartbeatThread`.
+    """
+
+    Channel = ThreadSafeChannel
+
+    def __init__(self, *args, **kwargs):
+        self._cond = threading.Condition()
+        # channel id -> methods received and not dispatched yet.
+        self._queues = defaultdict(deque)
+        # channel id -> (thread, depth), for channels being dispatched.
+        self._owners = {}
+        self._reader = None
+        self._reader_error = None
+        super(ThreadSafeConnection, self).__init__(*args, **kwargs)
+
+    def connect(self, callback=None):
+        if self.connected:
+            return callback() if callback else None
+        # the handshake is done by this thread, before starting the reader.
+        self._reader = self._reader_error = None
+        self._queues.clear()
+        super(ThreadSafeConnection, self).connect(callback)
+        self.enable_write_lock()
+        self._reader = threading.Thread(
+            target=self._read_frames, name='amqp-reader')
+        self._reader.daemon = True
+        self._reader.start()
+
+    def close(self, *args, **kwargs):
+        try:
+            return super(ThreadSafeConnection, self).close(*args, **kwargs)
+        finally:
+            reader = self._reader
+            if reader is not None and \
+                    reader is not threading.current_thread() and \
+                    self._transport is None:
+                reader.join()
+
+    def wait(self, *args, **kwargs):
+        with self._claimed(0):
+            return super(ThreadSafeConnection, self).wait(*args, **kwargs)
+
+    def _drain_events(self, timeout=None):
+        if self._reader is None:
+            return super(ThreadSafeConnection, self)._drain_events(timeout)
+        return self.drain_channel(0, timeout)
+
+    def drain_events(self, timeout=None, max_frames=None):
+        """Wait for and dispatch methods received on any channel.
+
+        Every method received on channels not being waited on by
+        another thread is dispatched, waiting for one if needed.
+
+        Keyword Arguments:
+            timeout (float): Timeout in seconds for the wait.
+            max_frames (int): Ignored, the frames are read by the
+                reader thread.
+        """
+        if self._reader is None:
+            return super(ThreadSafeConnection, self).drain_events(
+                timeout, max_frames)
+        if self._ack_channels:
+            self._flush_acks()
+        batch_due = False
+        if self._batch_channels:
+            timeout, batch_due = self._batch_timeout(timeout)
+        try:
+            with self._cond:
+                channel_ids = self._wait(self._ready_channels, timeout)
+                # claimed before releasing the condition, so that no
+                # other thread can claim them before they're dispatched.
+                for channel_id in channel_ids:
+                    self._claim(channel_id)
+            try:
+                for channel_id in channel_ids:
+                    self._dispatch_queued(channel_id)
+            finally:
+                for channel_id in channel_ids:
+                    self._release(channel_id)
+        except socket.timeout:
+            if self._batch_channels:
+                self._flush_batches()
+            if not batch_due:
+                raise
+            return
+        if self._batch_channels:
+            self._flush_batches()
+
+    def drain_channel(self, channel_id, timeout=None):
+        """Wait for and dispatch methods received on one channel.
+
+        Raises:
+            socket.timeout: if nothing was received in time.
+        """
+        with self._claimed(channel_id):
+            with self._cond:
+                queue = self._queues[channel_id]
+                self._wait(lambda: queue, timeout)
+            self._dispatch_queued(channel_id)
+
+    def on_inbound_method(self, channel_id, method_sig, payload, content):
+        if self._reader is None:
+            return super(ThreadSafeConnection, self).on_inbound_method(
+                channel_id, method_sig, payload, content)
+        with self._cond:
+            self._queues[channel_id].append((method_sig, payload, content))
+            self._cond.notify_all()
+
+    def _read_frames(self):
+        transport = self._transport
+        on_inbound_frame = self.on_inbound_frame
+        try:
+            while 1:
+                try:
+                    frame = transport.read_frame()
+                except socket.timeout:
+                    continue
+                on_inbound_frame(frame)
+        except Exception as exc:
+            if self._transport is None:
+                exc = RecoverableConnectionError('connection already closed')
+            with self._cond:
+                self._reader_error = exc
+                self._cond.notify_all()
+
+    def _dispatch_queued(self, channel_id):
+        # Dispatch the methods queued for channel, without waiting.
+        with self._claimed(channel_id):
+            with self._cond:
+                queue = self._queues[channel_id]
+            while queue:
+                method_sig, payload, content = queue.popleft()
+                super(ThreadSafeConnection, self).on_inbound_method(
+                    channel_id, method_sig, payload, content)
+
+    def _ready_channels(self):
+        # Channels having methods that can be dispatched by this thread.
+        current, owners = threading.current_thread(), self._owners
+        return [
+            channel_id for channel_id, queue in items(self._queues)
+            if queue and owners.get(channel_id, (current,))[0] is current
+        ]
+
+    def _wait(self, predicate, timeout=None):
+        # Wait until predicate returns something, holding the condition.
+        deadline = monotonic() + timeout if timeout is not None else None
+        while 1:
+            result = predicate()
+            if result:
+                return result
+            if self._reader_error is not None:
+                raise self._reader_error
+            if deadline is None:
+                self._cond.wait()
+            else:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    raise socket.timeout()
+                self._cond.wait(remaining)
+
+    @contextmanager
+    def _claimed(self, channel_id):
+        # Make sure only the current thread dispatches channel.
+        current, owners = threading.current_thread(), self._owners
+        with self._cond:
+            owner = owners.get(channel_id)
+            while owner is not None and owner[0] is not current:
+                self._cond.wait()
+                owner = owners.get(channel_id)
+            self._claim(channel_id)
+        try:
+            yield
+        finally:
+            self._release(channel_id)
+
+    def _claim(self, channel_id):
+        # Called holding the condition, the channel being free
+        # or already claimed by the current thread.
+        owner = self._owners.get(channel_id)
+        self._owners[channel_id] = (
+            threading.current_thread(), owner[1] + 1 if owner else 1)
+
+    def _release(self, channel_id):
+        owners = self._owners
+        with self._cond:
+            current, depth = owners[channel_id]
+            if depth > 1:
+                owners[channel_id] = (current, depth - 1)
+            else:
+                del owners[channel_id]
+                self._cond.notify_all()
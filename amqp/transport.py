@@ -4,13 +4,15 @@ from __future__ import absolute_import, unicode_literals
 
 import errno
 import re
+import select
 import socket
 import ssl
 from contextlib import contextmanager
 
 from .exceptions import UnexpectedFrame
 from .five import items
-from .platform import KNOWN_TCP_OPTS, SOL_TCP, pack, unpack
+from .platform import (IOV_MAX, KNOWN_TCP_OPTS, SOL_TCP, pack, unpack,
+                       unpack_from)
 from .utils import get_errno, set_cloexec
 
 try:
@@ -225,6 +227,14 @@ class _AbstractTransport(object):
         """Completely write a string to the peer."""
         raise NotImplementedError('Must be overriden in subclass')
 
+    def _writev(self, buffers):
+        """Completely write a sequence of buffers to the peer."""
+        # Python 2 can't join memoryview or bytearray buffers.
+        self._write(EMPTY_BUFFER.join(
+            buf if isinstance(buf, bytes) else bytes(bytearray(buf))
+            for buf in buffers
+        ))
+
     def close(self):
         if self.sock is not None:
             self._shutdown_transport()
@@ -270,6 +280,29 @@ class _AbstractTransport(object):
             raise UnexpectedFrame(
                 'Received {0:#04x} while expecting 0xce'.format(ch))
 
+    def read_frames(self, max_frames=None):
+        """Read frames in bulk.
+
+        Transports that don't support bulk reads
+        will only read a single frame.
+        """
+        yield self.read_frame()
+
+    def readable(self):
+        """Return true if data can be read without waiting for it."""
+        sock = self.sock
+        return sock is not None and _sock_readable(sock)
+
+    def read_ready_frames(self):
+        """Read the frames available when the socket is readable.
+
+        Used by event loops (see :class:`amqp.hub.Hub`) once the
+        socket is reported as readable.  Transports that can't tell
+        how much data is available will read a single frame,
+        blocking until it's complete.
+        """
+        yield self.read_frame()
+
     def write(self, s):
         try:
             self._write(s)
@@ -280,6 +313,21 @@ class _AbstractTransport(object):
                 self.connected = False
             raise
 
+    def writev(self, buffers):
+        """Write a sequence of buffers using as few system calls as possible.
+
+        Transports supporting scatter/gather I/O will send the buffers
+        without joining them into a single string first.
+        """
+        try:
+            self._writev(buffers)
+        except socket.timeout:
+            raise
+        except (OSError, IOError, socket.error) as exc:
+            if get_errno(exc) not in _UNAVAIL:
+                self.connected = False
+            raise
+
 
 class SSLTransport(_AbstractTransport):
     """Transport that works over SSL."""
@@ -378,6 +426,24 @@ class SSLTransport(_AbstractTransport):
         result, self._read_buffer = rbuf[:n], rbuf[n:]
         return result
 
+    def read_ready_frames(self):
+        """Read the frames available when the socket is readable.
+
+        Data already decrypted by the SSL layer won't make the
+        socket readable again, so frames are read for as long as
+        some is pending.
+        """
+        yield self.read_frame()
+        while self.sock is not None and self.sock.pending():
+            yield self.read_frame()
+
+    def readable(self):
+        # data already decrypted doesn't make the socket readable.
+        if self._read_buffer or (
+                self.sock is not None and self.sock.pending()):
+            return True
+        return super(SSLTransport, self).readable()
+
     def _write(self, s):
         """Write a string out to the SSL socket fully."""
         write = self.sock.write
@@ -399,38 +465,224 @@ class SSLTransport(_AbstractTransport):
 
 
 class TCPTransport(_AbstractTransport):
-    """Transport that deals directly with TCP socket."""
+    """Transport that deals directly with TCP socket.
+
+    Data is received with ``recv_into`` straight into a reusable
+    read buffer that grows to fit the largest frame seen, so frames
+    are no longer assembled by concatenating and slicing strings.
+
+    Content body payloads are returned as :class:`memoryview` objects
+    pointing into the read buffer: they are only valid until the next
+    call to :meth:`read_frame`, and must be copied by the consumer
+    if they need to be kept around.
+    """
+
+    #: Initial size of the read buffer, in bytes.
+    #: This will fit the largest frame allowed by the default
+    #: ``frame_max``, but the buffer will grow if needed.
+    read_buffer_size = 131072
 
     def _setup_transport(self):
         # Setup to _write() directly to the socket, and
         # do our own buffered reads.
         self._write = self.sock.sendall
-        self._read_buffer = EMPTY_BUFFER
+        self._read_buffer = bytearray(self.read_buffer_size)
+        self._read_view = memoryview(self._read_buffer)
+        self._read_start = self._read_end = 0
         self._quick_recv = self.sock.recv
+        self._quick_recv_into = self.sock.recv_into
 
-    def _read(self, n, initial=False, _errnos=(errno.EAGAIN, errno.EINTR)):
-        """Read exactly n bytes from the socket."""
-        recv = self._quick_recv
-        rbuf = self._read_buffer
+    def _writev(self, buffers, iov_max=IOV_MAX):
+        """Write a sequence of buffers to the socket using sendmsg."""
         try:
-            while len(rbuf) < n:
+            sendmsg = self.sock.sendmsg
+        except AttributeError:  # pragma: no cover
+            # sendmsg not available on this platform/Python version.
+            return super(TCPTransport, self)._writev(buffers)
+        buffers = list(buffers)
+        while buffers:
+            sent = sendmsg(buffers[:iov_max])
+            # drop what was sent, and keep the rest of a partial buffer.
+            i = 0
+            while i < len(buffers) and len(buffers[i]) <= sent:
+                sent -= len(buffers[i])
+                i += 1
+            if sent:
+                buffers[i] = memoryview(buffers[i])[sent:]
+            del buffers[:i]
+
+    def _reserve(self, n):
+        """Make room for n bytes of pending data in the read buffer."""
+        buf, start, end = self._read_buffer, self._read_start, self._read_end
+        if start + n <= len(buf):
+            return
+        pending = end - start
+        if n > len(buf):
+            buf = bytearray(max(n, len(buf) * 2))
+            buf[:pending] = self._read_view[start:end]
+            self._read_buffer, self._read_view = buf, memoryview(buf)
+        elif pending:
+            buf[:pending] = self._read_view[start:end].tobytes()
+        self._read_start, self._read_end = 0, pending
+
+    def _fill(self, n, initial=False, bulk=False,
+              _errnos=(errno.EAGAIN, errno.EINTR)):
+        """Make sure at least n bytes are available in the read buffer.
+
+        In bulk mode every receive asks for as much data as will fit
+        in the buffer, instead of just the n bytes needed.
+        """
+        if self._read_end - self._read_start >= n:
+            return
+        self._reserve(n)
+        recv_into = self._quick_recv_into
+        view = self._read_view
+        want = self._read_start + n
+        limit = len(view) if bulk else want
+        end = self._read_end
+        try:
+            while end < want:
                 try:
-                    s = recv(n - len(rbuf))
+                    nbytes = recv_into(view[end:limit])
                 except socket.error as exc:
                     if exc.errno in _errnos:
                         if initial and self.raise_on_initial_eintr:
                             raise socket.timeout()
                         continue
                     raise
-                if not s:
+                if not nbytes:
                     raise IOError('Socket closed')
-                rbuf += s
-        except:  # noqa
-            self._read_buffer = rbuf
+                end += nbytes
+        finally:
+            self._read_end = end
+
+    def _consume(self, n):
+        start = self._read_start + n
+        if start >= self._read_end:
+            # buffer drained, start from the beginning again.
+            self._read_start = self._read_end = 0
+        else:
+            self._read_start = start
+        return start - n
+
+    def _read(self, n, initial=False):
+        """Read exactly n bytes from the socket."""
+        self._fill(n, initial)
+        start = self._consume(n)
+        return self._read_view[start:start + n].tobytes()
+
+    def read_frame(self, unpack_from=unpack_from, _bulk=False):
+        # Nothing is consumed from the read buffer until the complete
+        # frame is available, so a timeout never loses partial data.
+        try:
+            self._fill(7, True, _bulk)
+            frame_type, channel, size = unpack_from(
+                '>BHI', self._read_buffer, self._read_start)
+            self._fill(size + 8, bulk=_bulk)
+        except socket.timeout:
+            raise
+        except (OSError, IOError, socket.error) as exc:
+            if get_errno(exc) not in _UNAVAIL:
+                self.connected = False
             raise
+        return self._pop_frame(frame_type, channel, size)
 
-        result, self._read_buffer = rbuf[:n], rbuf[n:]
-        return result
+    def read_frames(self, max_frames=None):
+        """Read frames in bulk.
+
+        The first frame is read using receives as large as the read
+        buffer allows, then every other complete frame that arrived
+        with it is yielded without touching the socket again.
+        Frames are only consumed from the read buffer as they are
+        yielded, so frames not processed are kept for the next read.
+        """
+        yield self.read_frame(_bulk=True)
+        count = 1
+        while max_frames is None or count < max_frames:
+            header = self._pending_frame()
+            if header is None:
+                break
+            yield self._pop_frame(*header)
+            count += 1
+
+    def readable(self):
+        # complete frames left in the read buffer, e.g. by
+        # read_frames(max_frames), don't make the socket readable.
+        if self._pending_frame() is not None:
+            return True
+        return super(TCPTransport, self).readable()
+
+    def read_ready_frames(self, unpack_from=unpack_from,
+                          _errnos=(errno.EAGAIN, errno.EINTR)):
+        """Read the frames available when the socket is readable.
+
+        A single receive is done, so this never blocks when the
+        socket is known to be readable, then every complete frame
+        in the read buffer is yielded.  Partial frames are kept
+        for the next call.  Nothing is received if complete frames
+        are in the read buffer already.
+        """
+        if self._pending_frame() is None:
+            pending = self._read_end - self._read_start
+            if pending >= 7:
+                size = unpack_from(
+                    '>BHI', self._read_buffer, self._read_start)[2]
+                self._reserve(size + 8)
+            else:
+                self._reserve(7)
+            try:
+                nbytes = self._quick_recv_into(
+                    self._read_view[self._read_end:])
+            except socket.error as exc:
+                if exc.errno in _errnos:
+                    return  # spurious wakeup, nothing to read.
+                if get_errno(exc) not in _UNAVAIL:
+                    self.connected = False
+                raise
+            if not nbytes:
+                self.connected = False
+                raise IOError('Socket closed')
+            self._read_end += nbytes
+        while 1:
+            header = self._pending_frame()
+            if header is None:
+                break
+            yield self._pop_frame(*header)
+
+    def _pending_frame(self, unpack_from=unpack_from):
+        # Header of the next frame if it's complete in the read buffer.
+        pending = self._read_end - self._read_start
+        if pending < 7:
+            return None
+        frame_type, channel, size = unpack_from(
+            '>BHI', self._read_buffer, self._read_start)
+        if pending < size + 8:
+            return None
+        return frame_type, channel, size
+
+    def _pop_frame(self, frame_type, channel, size):
+        start = self._consume(size + 8) + 7
+        ch = self._read_buffer[start + size]
+        if ch != 206:  # '\xce'
+            raise UnexpectedFrame(
+                'Received {0:#04x} while expecting 0xce'.format(ch))
+        payload = self._read_view[start:start + size]
+        if frame_type != 3:
+            # only content bodies are passed on without copying,
+            # other payloads may be kept after the next read.
+            payload = payload.tobytes()
+        return frame_type, channel, payload
+
+
+if hasattr(select, 'poll'):
+    def _sock_readable(sock):
+        # poll has no limit on the file descriptor number, unlike select.
+        poller = select.poll()
+        poller.register(sock, select.POLLIN)
+        return bool(poller.poll(0))
+else:  # pragma: no cover
+    def _sock_readable(sock):
+        return bool(select.select([sock], [], [], 0)[0])
 
 
 def Transport(host, connect_timeout=None, ssl=False, **kwargs):
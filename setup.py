@@ -14,6 +14,11 @@ if sys.version_info < (2, 7):
 
 NAME = 'amqp'
 
+EXCLUDE_PACKAGES = ['ez_setup', 't', 't.*']
+if sys.version_info < (3, 5):
+    # amqp.aio uses async/await, and cannot even be byte-compiled.
+    EXCLUDE_PACKAGES += ['amqp.aio', 'amqp.aio.*']
+
 # -*- Classifiers -*-
 
 classes = """
@@ -102,7 +107,7 @@ class pytest(setuptools.command.test.test):
 
 setuptools.setup(
     name=NAME,
-    packages=setuptools.find_packages(exclude=['ez_setup', 't', 't.*']),
+    packages=setuptools.find_packages(exclude=EXCLUDE_PACKAGES),
     long_description=long_description,
     version=meta['version'],
     description=meta['doc'],
@@ -0,0 +1,20 @@
+"""Benchmarks for the codec, framing and transport hot paths.
+
+The benchmarks don't need a broker or network access: the end-to-end
+benchmarks talk to an in-process fake broker over a socket pair.
+
+Run them with::
+
+    $ python -m t.benchmarks
+
+Glob patterns can be given to only run some of the benchmarks::
+
+    $ python -m t.benchmarks 'loads.*' 'frame_writer.*'
+
+To catch performance regressions, save the results before upgrading
+or changing the code, then compare with the saved baseline (the exit
+status is non-zero if any benchmark got slower than the threshold)::
+
+    $ python -m t.benchmarks --output baseline.json
+    $ python -m t.benchmarks --compare baseline.json --threshold 1.1
+"""
@@ -0,0 +1,8 @@
+from __future__ import absolute_import, unicode_literals
+
+import sys
+
+from .runner import main
+
+if __name__ == '__main__':
+    sys.exit(main())
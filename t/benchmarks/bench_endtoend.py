@@ -0,0 +1,140 @@
+"""End-to-end benchmarks, against an in-process fake broker."""
+from __future__ import absolute_import, unicode_literals
+
+from amqp.basic_message import Message
+
+from .bench_serialization import HEADERS
+from .broker import connect
+from .runner import benchmark
+
+#: Number of messages published/consumed by a single run.
+MESSAGES = 1000
+
+QUEUE = 'bench'
+
+
+def _setup(**kwargs):
+    conn = connect(**kwargs)
+    channel = conn.channel()
+    channel.queue_declare(QUEUE)
+    return conn, channel
+
+
+def _message(body=b'x' * 256):
+    return Message(body, content_type='application/json',
+                   application_headers=HEADERS)
+
+
+def _sync(channel):
+    # round-trip to make sure the broker got everything sent before.
+    return channel.queue_declare(QUEUE, passive=True).message_count
+
+
+@benchmark('endtoend.publish', ops=MESSAGES)
+def publish():
+    conn, channel = _setup()
+    msg = _message()
+
+    def run():
+        for _ in range(MESSAGES):
+            channel.basic_publish(msg, routing_key=QUEUE)
+        _sync(channel)
+        channel.queue_purge(QUEUE)
+    return run, conn.close
+
+
+@benchmark('endtoend.publish_batch', ops=MESSAGES)
+def publish_batch():
+    conn, channel = _setup()
+    messages = [_message()] * MESSAGES
+
+    def run():
+        channel.basic_publish_batch(messages, routing_key=QUEUE)
+        _sync(channel)
+        channel.queue_purge(QUEUE)
+    return run, conn.close
+
+
+@benchmark('endtoend.publish_prepared', ops=MESSAGES)
+def publish_prepared():
+    conn, channel = _setup()
+    publish = channel.prepare_publish(_message(), routing_key=QUEUE)
+    body = b'x' * 256
+
+    def run():
+        for _ in range(MESSAGES):
+            publish(body)
+        _sync(channel)
+        channel.queue_purge(QUEUE)
+    return run, conn.close
+
+
+@benchmark('endtoend.publish_confirm', ops=MESSAGES)
+def publish_confirm():
+    conn, channel = _setup()
+    channel.confirm_select()
+    msg = _message()
+
+    def run():
+        for _ in range(MESSAGES):
+            channel.basic_publish(msg, routing_key=QUEUE)
+        channel.wait_for_confirms()
+        channel.queue_purge(QUEUE)
+    return run, conn.close
+
+
+def _register_roundtrip(name, body, max_frames=None):
+    @benchmark('endtoend.roundtrip.' + name, ops=MESSAGES)
+    def _bench():
+        # messages are published then consumed by the same connection.
+        conn, channel = _setup()
+        received = []
+        channel.basic_consume(QUEUE, callback=received.append, no_ack=True)
+        msg = _message(body)
+
+        def run():
+            for _ in range(MESSAGES):
+                channel.basic_publish(msg, routing_key=QUEUE)
+            while len(received) < MESSAGES:
+                conn.drain_events(timeout=10, max_frames=max_frames)
+            received[:] = []
+        return run, conn.close
+
+
+_register_roundtrip('small', b'x' * 256)
+_register_roundtrip('small_bulk', b'x' * 256, max_frames=1000)
+_register_roundtrip('large', b'x' * (512 * 1024))
+
+
+@benchmark('endtoend.roundtrip.small_batch', ops=MESSAGES)
+def roundtrip_batch():
+    # as small_bulk, with a batch consumer acking every batch.
+    conn, channel = _setup()
+    received = []
+
+    def on_batch(messages):
+        received.extend(messages)
+        channel.basic_ack_batch(messages)
+    channel.basic_consume(QUEUE, callback=on_batch, batch_size=100)
+    msg = _message()
+
+    def run():
+        for _ in range(MESSAGES):
+            channel.basic_publish(msg, routing_key=QUEUE)
+        while len(received) < MESSAGES:
+            conn.drain_events(timeout=10, max_frames=1000)
+        received[:] = []
+    return run, conn.close
+
+
+@benchmark('endtoend.basic_get', ops=100)
+def basic_get():
+    conn, channel = _setup()
+    msg = _message()
+
+    def run():
+        for _ in range(100):
+            channel.basic_publish(msg, routing_key=QUEUE)
+        for _ in range(100):
+            channel.basic_get(QUEUE, no_ack=True)
+    return run, conn.close
@@ -0,0 +1,169 @@
+"""Benchmarks for :mod:`amqp.method_framing`."""
+from __future__ import absolute_import, unicode_literals
+
+from amqp import spec
+from amqp.basic_message import Message
+from amqp.channel import Channel
+from amqp.connection import Connection
+from amqp.method_framing import frame_handler, frame_writer
+from amqp.platform import unpack_from
+from amqp.serialization import dumps
+
+from .bench_serialization import HEADERS
+from .runner import benchmark
+
+#: Number of messages in the recorded frame streams.
+MESSAGES = 100
+
+SMALL_BODY = b'x' * 256
+LARGE_BODY = b'x' * (1024 * 1024)
+
+
+class RecordingTransport(object):
+    """Transport keeping what's written in memory."""
+
+    def __init__(self):
+        self.data = []
+
+    def write(self, s):
+        self.data.append(bytes(s))
+
+    def writev(self, buffers):
+        self.data.append(b''.join(buffers))
+
+    def getvalue(self):
+        return b''.join(self.data)
+
+
+class NullTransport(object):
+    """Transport discarding what's written."""
+
+    def write(self, s):
+        pass
+
+    def writev(self, buffers):
+        pass
+
+
+def split_frames(data):
+    """Split a byte stream into frames, as returned by the transport."""
+    frames = []
+    offset = 0
+    while offset < len(data):
+        frame_type, channel, size = unpack_from('>BHI', data, offset)
+        offset += 7
+        frames.append((frame_type, channel, data[offset:offset + size]))
+        offset += size + 1
+    return frames
+
+
+def record_deliveries(body, n=MESSAGES, channel=1):
+    """Record the frames for ``n`` deliveries of a message."""
+    conn = Connection()
+    transport = RecordingTransport()
+    write_frame = frame_writer(conn, transport)
+    for i in range(n):
+        msg = Message(body, content_type='application/json',
+                      application_headers=HEADERS)
+        args = dumps('sLbss', ('amq.ctag-1', i + 1, False,
+                               'celery', 'celery.tasks'))
+        write_frame(1, channel, spec.Basic.Deliver, args, msg)
+    return split_frames(transport.getvalue())
+
+
+def _handler(**kwargs):
+    conn = Connection(**kwargs)
+    conn.bytes_recv = 0
+    return frame_handler(conn, lambda *args: None)
+
+
+def _register_handler(name, body, **kwargs):
+    @benchmark('frame_handler.' + name, ops=MESSAGES)
+    def _bench():
+        frames = record_deliveries(body)
+        on_frame = _handler(**kwargs)
+
+        def run():
+            for frame in frames:
+                on_frame(frame)
+        return run
+
+
+_register_handler('small', SMALL_BODY)
+_register_handler('large', LARGE_BODY)
+_register_handler('small_lazy', SMALL_BODY, lazy_properties=True)
+
+
+@benchmark('frame_handler.methods', ops=MESSAGES)
+def frame_handler_methods():
+    payload = b''.join([
+        b'\x00\x3c\x00\x50',  # Basic.Ack
+        dumps('Lb', (1234567, False)),
+    ])
+    frames = [(1, 1, payload)] * MESSAGES
+    on_frame = _handler()
+
+    def run():
+        for frame in frames:
+            on_frame(frame)
+    return run
+
+
+def _register_writer(name, body):
+    @benchmark('frame_writer.' + name)
+    def _bench():
+        conn = Connection()
+        write_frame = frame_writer(conn, NullTransport())
+        msg = Message(body, content_type='application/json',
+                      application_headers=HEADERS)
+        args = dumps('Bssbb', (0, 'celery', 'celery.tasks', False, False))
+        return lambda: write_frame(
+            1, 1, spec.Basic.Publish, args, msg)
+
+
+_register_writer('small', SMALL_BODY)
+_register_writer('large', LARGE_BODY)
+
+
+@benchmark('frame_writer.method')
+def frame_writer_method():
+    conn = Connection()
+    write_frame = frame_writer(conn, NullTransport())
+    args = dumps('Lb', (1234567, False))
+    return lambda: write_frame(1, 1, spec.Basic.Ack, args, None)
+
+
+@benchmark('frame_writer.republish')
+def frame_writer_republish():
+    # message received then published again as-is.
+    received = []
+    conn = Connection()
+    conn.bytes_recv = 0
+    on_frame = frame_handler(conn, lambda *args: received.append(args[3]))
+    for frame in record_deliveries(SMALL_BODY, n=1):
+        on_frame(frame)
+    msg, = received
+    write_frame = frame_writer(conn, NullTransport())
+    args = dumps('Bssbb', (0, 'celery', 'celery.tasks', False, False))
+    return lambda: write_frame(1, 1, spec.Basic.Publish, args, msg)
+
+
+def _register_consume(name, **kwargs):
+    @benchmark('frame_handler.consume.' + name, ops=MESSAGES)
+    def _bench():
+        # deliveries dispatched to the consumer callback of a channel.
+        frames = record_deliveries(SMALL_BODY)
+        conn = Connection(**kwargs)
+        conn.bytes_recv = 0
+        channel = Channel(conn, 1)
+        channel.callbacks['amq.ctag-1'] = lambda message: None
+        on_frame = frame_handler(conn, conn.on_inbound_method)
+
+        def run():
+            for frame in frames:
+                on_frame(frame)
+        return run
+
+
+_register_consume('small')
+_register_consume('small_lazy', lazy_properties=True)
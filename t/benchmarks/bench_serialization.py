@@ -0,0 +1,125 @@
+"""Benchmarks for :mod:`amqp.serialization`."""
+from __future__ import absolute_import, unicode_literals
+
+from amqp.basic_message import Message
+from amqp.serialization import decode_properties_basic, dumps, loads
+
+from .runner import benchmark
+
+HEADERS = {
+    'id': '8b4d9e3e-2f43-4e1f-9b1a-1f6a0c3b2d7e',
+    'task': 'proj.tasks.add',
+    'retries': 0,
+    'eta': None,
+    'expires': None,
+    'timelimit': [None, None],
+    'argsrepr': '(2, 2)',
+    'kwargsrepr': '{}',
+    'origin': 'gen1234@worker.example.com',
+}
+
+#: Headers with nested tables, e.g. tracing and routing information.
+NESTED_HEADERS = dict(HEADERS, tracing={
+    'trace_id': '4bf92f3577b34da6a3ce929d0e0e4736',
+    'span': {'id': '00f067aa0ba902b7', 'sampled': True,
+             'baggage': {'tenant': 'acme', 'region': 'eu-west-1'}},
+}, routing={'hops': [{'exchange': 'celery', 'at': 1530446400}] * 3})
+
+#: Method arguments by argsig, for the most frequent methods.
+ARGS = [
+    # Basic.Publish
+    ('Bssbb', (0, 'celery', 'celery.tasks', False, False)),
+    # Basic.Deliver
+    ('sLbss', ('amq.ctag-gD5Ra4xVBJrRj1c8Ab2d1Q', 1234567, False,
+               'celery', 'celery.tasks')),
+    # Basic.Ack
+    ('Lb', (1234567, False)),
+    # Basic.Consume
+    ('BssbbbbF', (0, 'celery', 'amq.ctag-1', False, False, False, False,
+                  {'x-priority': 10})),
+    # Queue.Declare
+    ('BsbbbbbF', (0, 'celery', False, True, False, False, False,
+                  {'x-message-ttl': 60000, 'x-max-priority': 10})),
+    # Connection.Start (large table)
+    ('ooFSS', (0, 9, {
+        'capabilities': {
+            'publisher_confirms': True,
+            'exchange_exchange_bindings': True,
+            'basic.nack': True,
+            'consumer_cancel_notify': True,
+            'connection.blocked': True,
+            'authentication_failure_close': True,
+        },
+        'cluster_name': 'rabbit@broker.example.com',
+        'copyright': 'Copyright (c) 2007-2018 Pivotal Software, Inc.',
+        'platform': 'Erlang/OTP 20.3',
+        'product': 'RabbitMQ',
+        'version': '3.7.7',
+    }, 'AMQPLAIN PLAIN', 'en_US')),
+]
+
+PROPERTIES = {
+    'content_type': 'application/json',
+    'content_encoding': 'utf-8',
+    'application_headers': HEADERS,
+    'delivery_mode': 2,
+    'priority': 0,
+    'correlation_id': HEADERS['id'],
+    'reply_to': '7a4d6c2e-b1f5-3c3e-8a9e-4c2b5f1d8e0a',
+    'timestamp': 1530446400,
+}
+
+
+def _register_codecs(format, args):
+    @benchmark('loads.' + format)
+    def _loads():
+        buf = dumps(format, args)
+        return lambda: loads(format, buf, 0)
+
+    @benchmark('dumps.' + format)
+    def _dumps():
+        return lambda: dumps(format, args)
+
+
+for _format, _args in ARGS:
+    _register_codecs(_format, _args)
+
+
+@benchmark('loads.table')
+def loads_table():
+    buf = dumps('F', (HEADERS,))
+    return lambda: loads('F', buf, 0)
+
+
+@benchmark('dumps.table')
+def dumps_table():
+    args = (HEADERS,)
+    return lambda: dumps('F', args)
+
+
+@benchmark('dumps.nested_table')
+def dumps_nested_table():
+    args = (NESTED_HEADERS,)
+    return lambda: dumps('F', args)
+
+
+@benchmark('decode_properties_basic.minimal')
+def decode_properties_minimal():
+    buf = Message(b'', content_type='text/plain')._serialize_properties()
+    return lambda: decode_properties_basic(buf, 0)
+
+
+@benchmark('decode_properties_basic.full')
+def decode_properties_full():
+    buf = Message(b'', **PROPERTIES)._serialize_properties()
+    return lambda: decode_properties_basic(buf, 0)
+
+
+@benchmark('serialize_properties.minimal')
+def serialize_properties_minimal():
+    return Message(b'', content_type='text/plain')._serialize_properties
+
+
+@benchmark('serialize_properties.full')
+def serialize_properties_full():
+    return Message(b'', **PROPERTIES)._serialize_properties
@@ -0,0 +1,302 @@
+"""In-process fake broker, for the end-to-end benchmarks.
+
+The broker runs in a thread, serving a single client connected
+through a socket pair, and implements just enough of the protocol
+to publish and consume messages: queues are only reachable through
+the default exchange, and messages go to the first consumer of the
+queue.
+"""
+from __future__ import absolute_import, unicode_literals
+
+import socket
+import threading
+from collections import deque
+
+from amqp import spec
+from amqp.connection import Connection
+from amqp.five import Queue
+from amqp.platform import pack, unpack_from
+from amqp.serialization import dumps, loads
+from amqp.transport import TCPTransport
+
+__all__ = ['FakeBroker', 'connect']
+
+FRAME_MAX = 131072
+
+
+def _frame(frame_type, channel, payload):
+    return b''.join([
+        pack('>BHI', frame_type, channel, len(payload)), payload, b'\xce',
+    ])
+
+
+def _method(channel, method_sig, format=None, args=None):
+    return _frame(1, channel, b''.join([
+        pack('>HH', *method_sig), dumps(format, args) if format else b'',
+    ]))
+
+
+class FakeBroker(threading.Thread):
+    """Fake broker serving one connection over ``sock``."""
+
+    def __init__(self, sock, frame_max=FRAME_MAX):
+        super(FakeBroker, self).__init__(name='FakeBroker')
+        self.daemon = True
+        self.sock = sock
+        self.frame_max = frame_max
+        self.queues = {}
+        self.consumers = {}
+        self.confirm = set()
+        self.published = {}
+        self._out = []
+        self._outq = Queue()
+        self._content = {}
+        self._handlers = {
+            spec.Connection.StartOk: self.on_start_ok,
+            spec.Connection.TuneOk: self.on_ignore,
+            spec.Connection.Open: self.on_connection_open,
+            spec.Connection.Close: self.on_connection_close,
+            spec.Channel.Open: self.on_channel_open,
+            spec.Channel.Close: self.on_channel_close,
+            spec.Queue.Declare: self.on_queue_declare,
+            spec.Queue.Purge: self.on_queue_purge,
+            spec.Basic.Qos: self.on_basic_qos,
+            spec.Basic.Consume: self.on_basic_consume,
+            spec.Basic.Cancel: self.on_basic_cancel,
+            spec.Basic.Publish: self.on_basic_publish,
+            spec.Basic.Get: self.on_basic_get,
+            spec.Basic.Ack: self.on_ignore,
+            spec.Confirm.Select: self.on_confirm_select,
+        }
+
+    def run(self):
+        # The replies are sent by another thread, so that the broker
+        # keeps reading while the client is busy publishing.
+        writer = threading.Thread(target=self._write, name='FakeBrokerWriter')
+        writer.daemon = True
+        writer.start()
+        try:
+            self._serve()
+        except socket.error:
+            pass
+        finally:
+            self._outq.put(None)
+            writer.join()
+            self.sock.close()
+
+    def _write(self):
+        while 1:
+            data = self._outq.get()
+            if data is None:
+                break
+            try:
+                self.sock.sendall(data)
+            except socket.error:
+                break
+
+    def _serve(self):
+        buf = bytearray()
+        header = b''
+        while len(header) < 8:
+            data = self.sock.recv(8 - len(header))
+            if not data:
+                return
+            header += data
+        self.send(_method(0, spec.Connection.Start, 'ooFSS', (
+            0, 9, {'product': 'FakeBroker'}, 'AMQPLAIN PLAIN', 'en_US')))
+        self.flush()
+        while 1:
+            data = self.sock.recv(1048576)
+            if not data:
+                return
+            buf.extend(data)
+            offset = 0
+            while len(buf) - offset >= 7:
+                frame_type, channel, size = unpack_from('>BHI', buf, offset)
+                if len(buf) - offset < size + 8:
+                    break
+                payload = bytes(buf[offset + 7:offset + 7 + size])
+                offset += size + 8
+                if self.on_frame(frame_type, channel, payload) is False:
+                    self.flush()
+                    return
+            del buf[:offset]
+            self.flush()
+
+    def send(self, data):
+        self._out.append(data)
+
+    def flush(self):
+        if self._out:
+            self._outq.put(b''.join(self._out))
+            self._out[:] = []
+
+    def on_frame(self, frame_type, channel, payload):
+        if frame_type == 1:
+            method_sig = unpack_from('>HH', payload, 0)
+            return self._handlers[method_sig](channel, payload)
+        elif frame_type == 2:
+            content = self._content[channel]
+            content['header'] = payload
+            content['size'], = unpack_from('>Q', payload, 4)
+        elif frame_type == 3:
+            content = self._content[channel]
+            content['body'].append(payload)
+            content['received'] += len(payload)
+        else:
+            return
+        if content['size'] == content['received']:
+            self._content.pop(channel)
+            self.on_message(channel, content)
+
+    def on_ignore(self, channel, payload):
+        pass
+
+    def on_start_ok(self, channel, payload):
+        self.send(_method(0, spec.Connection.Tune, 'BlB',
+                          (0, self.frame_max, 0)))
+
+    def on_connection_open(self, channel, payload):
+        self.send(_method(0, spec.Connection.OpenOk, 's', ('',)))
+
+    def on_connection_close(self, channel, payload):
+        self.send(_method(0, spec.Connection.CloseOk))
+        return False
+
+    def on_channel_open(self, channel, payload):
+        self.send(_method(channel, spec.Channel.OpenOk, 'S', ('',)))
+
+    def on_channel_close(self, channel, payload):
+        for tag, consumer in list(self.consumers.items()):
+            if consumer['channel'] == channel:
+                self.consumers.pop(tag)
+        self.confirm.discard(channel)
+        self.send(_method(channel, spec.Channel.CloseOk))
+
+    def on_queue_declare(self, channel, payload):
+        (_, queue, _, _, _, _, _, _), _ = loads('BsbbbbbF', payload, 4)
+        messages = self.queues.setdefault(queue, deque())
+        consumers = sum(
+            1 for c in self.consumers.values() if c['queue'] == queue)
+        self.send(_method(channel, spec.Queue.DeclareOk, 'sll',
+                          (queue, len(messages), consumers)))
+
+    def on_queue_purge(self, channel, payload):
+        (_, queue, _), _ = loads('Bsb', payload, 4)
+        messages = self.queues.setdefault(queue, deque())
+        count = len(messages)
+        messages.clear()
+        self.send(_method(channel, spec.Queue.PurgeOk, 'l', (count,)))
+
+    def on_basic_qos(self, channel, payload):
+        self.send(_method(channel, spec.Basic.QosOk))
+
+    def on_basic_consume(self, channel, payload):
+        (_, queue, tag, _, _, _, nowait, _), _ = loads(
+            'BssbbbbF', payload, 4)
+        tag = tag or 'amq.ctag-{0}'.format(len(self.consumers) + 1)
+        self.consumers[tag] = {
+            'channel': channel, 'queue': queue, 'delivery_tag': 0,
+        }
+        if not nowait:
+            self.send(_method(channel, spec.Basic.ConsumeOk, 's', (tag,)))
+        messages = self.queues.setdefault(queue, deque())
+        while messages:
+            self.deliver(tag, messages.popleft())
+
+    def on_basic_cancel(self, channel, payload):
+        (tag, nowait), _ = loads('sb', payload, 4)
+        self.consumers.pop(tag, None)
+        if not nowait:
+            self.send(_method(channel, spec.Basic.CancelOk, 's', (tag,)))
+
+    def on_basic_publish(self, channel, payload):
+        (_, exchange, routing_key, _, _), _ = loads('Bssbb', payload, 4)
+        self._content[channel] = {
+            'routing_key': routing_key, 'body': [], 'received': 0,
+        }
+
+    def on_basic_get(self, channel, payload):
+        (_, queue, _), _ = loads('Bsb', payload, 4)
+        messages = self.queues.setdefault(queue, deque())
+        if not messages:
+            self.send(_method(channel, spec.Basic.GetEmpty, 's', ('',)))
+            return
+        content = messages.popleft()
+        self.send(_method(channel, spec.Basic.GetOk, 'Lbssl', (
+            1, False, '', content['routing_key'], len(messages))))
+        self.send_content(channel, content)
+
+    def on_confirm_select(self, channel, payload):
+        self.confirm.add(channel)
+        self.published[channel] = 0
+        if not unpack_from('>B', payload, 4)[0]:
+            self.send(_method(channel, spec.Confirm.SelectOk))
+
+    def on_message(self, channel, content):
+        if channel in self.confirm:
+            self.published[channel] += 1
+            self.send(_method(channel, spec.Basic.Ack, 'Lb',
+                              (self.published[channel], False)))
+        queue = content['routing_key']
+        for tag, consumer in self.consumers.items():
+            if consumer['queue'] == queue:
+                self.deliver(tag, content)
+                return
+        self.queues.setdefault(queue, deque()).append(content)
+
+    def deliver(self, tag, content):
+        consumer = self.consumers[tag]
+        consumer['delivery_tag'] += 1
+        channel = consumer['channel']
+        self.send(_method(channel, spec.Basic.Deliver, 'sLbss', (
+            tag, consumer['delivery_tag'], False, '',
+            content['routing_key'])))
+        self.send_content(channel, content)
+
+    def send_content(self, channel, content):
+        self.send(_frame(2, channel, content['header']))
+        chunk_size = self.frame_max - 8
+        for body in content['body']:
+            for i in range(0, len(body), chunk_size):
+                self.send(_frame(3, channel, body[i:i + chunk_size]))
+
+
+class SocketPairTransport(TCPTransport):
+    """Transport using an already connected socket."""
+
+    def __init__(self, sock, *args, **kwargs):
+        self._sock = sock
+        super(SocketPairTransport, self).__init__(*args, **kwargs)
+
+    def _connect(self, host, port, timeout):
+        self.sock = self._sock
+
+    def _set_socket_options(self, socket_settings):
+        pass  # not a TCP socket.
+
+
+class FakeBrokerConnection(Connection):
+    """Connection to a :class:`FakeBroker`."""
+
+    def __init__(self, sock, **kwargs):
+        self._sock = sock
+        super(FakeBrokerConnection, self).__init__(**kwargs)
+
+    def Transport(self, host, connect_timeout,
+                  ssl=False, read_timeout=None, write_timeout=None,
+                  socket_settings=None, **kwargs):
+        return SocketPairTransport(
+            self._sock, host, connect_timeout=connect_timeout,
+            read_timeout=read_timeout, write_timeout=write_timeout,
+            socket_settings=socket_settings, **kwargs)
+
+
+def connect(**kwargs):
+    """Start a fake broker, and return a connection to it."""
+    client, server = socket.socketpair()
+    broker = FakeBroker(server)
+    broker.start()
+    conn = FakeBrokerConnection(client, **kwargs)
+    conn.connect()
+    return conn
@@ -0,0 +1,205 @@
+"""Benchmark registry and runner."""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import fnmatch
+import gc
+import importlib
+import json
+import platform
+import sys
+from collections import OrderedDict
+from timeit import default_timer
+
+__all__ = ['benchmark', 'Benchmark', 'run', 'compare', 'main']
+
+#: Modules containing the benchmarks, relative to this package.
+MODULES = ['bench_serialization', 'bench_framing', 'bench_endtoend']
+
+#: Registered benchmarks, by name.
+registry = OrderedDict()
+
+
+class Benchmark(object):
+    """A registered benchmark.
+
+    Arguments:
+        name (str): Unique name, used to compare results.
+        setup (Callable): Called once before the benchmark is timed,
+            and returns the function to time.  The setup can also
+            return a ``(function, teardown)`` tuple.
+        ops (int): Number of operations done by a single call
+            of the timed function, used to report the time per operation.
+    """
+
+    def __init__(self, name, setup, ops=1):
+        self.name = name
+        self.setup = setup
+        self.ops = ops
+
+    def run(self, repeat=5, min_time=0.2, timer=default_timer):
+        """Time the benchmark.
+
+        The function is called in a loop until ``min_time`` seconds
+        have passed, and this is repeated ``repeat`` times.
+
+        Returns:
+            float: The best time per operation, in seconds.
+        """
+        fun = self.setup()
+        teardown = None
+        if isinstance(fun, tuple):
+            fun, teardown = fun
+        try:
+            fun()  # warmup, and fill the codec caches.
+            number = self._calibrate(fun, min_time, timer)
+            best = None
+            gcold = gc.isenabled()
+            gc.disable()
+            try:
+                for _ in range(repeat):
+                    t0 = timer()
+                    for _ in range(number):
+                        fun()
+                    elapsed = timer() - t0
+                    if best is None or elapsed < best:
+                        best = elapsed
+            finally:
+                if gcold:
+                    gc.enable()
+            return best / (number * self.ops)
+        finally:
+            if teardown is not None:
+                teardown()
+
+    def _calibrate(self, fun, min_time, timer):
+        number = 1
+        while 1:
+            t0 = timer()
+            for _ in range(number):
+                fun()
+            if timer() - t0 >= min_time / 10.0:
+                return number
+            number *= 2
+
+
+def benchmark(name=None, ops=1):
+    """Decorator registering a benchmark setup function.
+
+    Example:
+        >>> @benchmark('loads.Bssbb')
+        ... def loads_publish():
+        ...     buf = dumps('Bssbb', (0, 'exchange', 'rkey', 0, 0))
+        ...     return lambda: loads('Bssbb', buf)
+    """
+    def _inner(setup):
+        bench = Benchmark(name or setup.__name__, setup, ops=ops)
+        if bench.name in registry:
+            raise ValueError('Duplicate benchmark: {0}'.format(bench.name))
+        registry[bench.name] = bench
+        return setup
+    return _inner
+
+
+def load():
+    for module in MODULES:
+        importlib.import_module('.' + module, __package__)
+    return registry
+
+
+def run(patterns=None, repeat=5, min_time=0.2, out=sys.stdout):
+    """Run the benchmarks matching any of the glob ``patterns``.
+
+    Returns:
+        Dict[str, float]: time per operation (in seconds) by name.
+    """
+    results = OrderedDict()
+    for name, bench in load().items():
+        if patterns and not any(fnmatch.fnmatch(name, p) for p in patterns):
+            continue
+        results[name] = t = bench.run(repeat=repeat, min_time=min_time)
+        print('{0:<45} {1:>12} {2:>14,.0f} ops/s'.format(
+            name, format_time(t), 1.0 / t), file=out)
+    return results
+
+
+def compare(results, baseline, threshold=1.1, out=sys.stdout):
+    """Compare results with a baseline.
+
+    Returns:
+        List[str]: names of the benchmarks more than ``threshold``
+            times slower than in the baseline.
+    """
+    regressions = []
+    for name, t in results.items():
+        try:
+            prev = baseline[name]
+        except KeyError:
+            continue
+        ratio = t / prev
+        if ratio > threshold:
+            regressions.append(name)
+        print('{0:<45} {1:>12} -> {2:>12} {3:>7.2f}x{4}'.format(
+            name, format_time(prev), format_time(t), ratio,
+            '  REGRESSION' if ratio > threshold else ''), file=out)
+    return regressions
+
+
+def format_time(t):
+    for unit, scale in (('s', 1.0), ('ms', 1e3), ('us', 1e6)):
+        if t * scale >= 1.0:
+            return '{0:.3f} {1}'.format(t * scale, unit)
+    return '{0:.1f} ns'.format(t * 1e9)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m t.benchmarks',
+        description='Run the py-amqp benchmarks.',
+    )
+    parser.add_argument(
+        'patterns', nargs='*', metavar='PATTERN',
+        help='only run the benchmarks matching these glob patterns')
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=5,
+        help='number of timing runs, the best is kept (default: 5)')
+    parser.add_argument(
+        '-t', '--min-time', type=float, default=0.2,
+        help='minimum duration of a timing run in seconds (default: 0.2)')
+    parser.add_argument(
+        '-o', '--output', metavar='FILE',
+        help='save the results as JSON, to be used as a baseline')
+    parser.add_argument(
+        '-c', '--compare', metavar='FILE',
+        help='compare the results with a baseline saved with --output')
+    parser.add_argument(
+        '--threshold', type=float, default=1.1,
+        help='slowdown ratio reported as a regression (default: 1.1)')
+    parser.add_argument(
+        '-l', '--list', action='store_true',
+        help='list the benchmarks and exit')
+    options = parser.parse_args(argv)
+
+    if options.list:
+        for name in load():
+            print(name)
+        return 0
+
+    results = run(options.patterns, options.repeat, options.min_time)
+    if options.output:
+        with open(options.output, 'w') as fh:
+            json.dump({
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'results': results,
+            }, fh, indent=2)
+    if options.compare:
+        with open(options.compare) as fh:
+            baseline = json.load(fh)['results']
+        print()
+        regressions = compare(results, baseline, options.threshold)
+        if regressions:
+            print('\n{0} regression(s): {1}'.format(
+                len(regressions), ', '.join(regressions)))
+            return 1
+    return 0
@@ -0,0 +1,381 @@
+from __future__ import absolute_import, unicode_literals
+
+import socket
+
+import pytest
+from case import Mock, patch
+
+from amqp import spec
+from amqp.basic_message import Message
+from amqp.exceptions import (AccessRefused, ConsumerCancelled, MessageNacked,
+                             NotFound, RecoverableConnectionError,
+                             UnexpectedFrame)
+from amqp.platform import pack
+from amqp.protocol import queue_declare_ok_t
+from amqp.serialization import dumps
+from amqp.transport import AMQP_PROTOCOL_HEADER
+
+aio = pytest.importorskip('amqp.aio')
+asyncio = pytest.importorskip('asyncio')
+
+
+def frame(frame_type, channel, payload):
+    return b''.join([
+        pack('>BHI', frame_type, channel, len(payload)), payload, b'\xce',
+    ])
+
+
+def method(channel, sig, format=None, args=None, content=None):
+    data = frame(1, channel, b''.join([
+        pack('>HH', *sig), dumps(format, args) if format else b'',
+    ]))
+    if content is not None:
+        body = content.body
+        data += frame(2, channel, b''.join([
+            pack('>HHQ', sig[0], 0, len(body)),
+            content._serialize_properties(),
+        ]))
+        data += frame(3, channel, body)
+    return data
+
+
+def done(result=None):
+    fut = asyncio.Future()
+    fut.set_result(result)
+    return fut
+
+
+class test_AsyncTransport:
+
+    @pytest.fixture(autouse=True)
+    def setup_transport(self):
+        self.t = aio.AsyncTransport('localhost')
+        self.t.on_frame = Mock(name='on_frame')
+        self.t.on_error = Mock(name='on_error')
+        self.sock = Mock(name='transport')
+        self.t.connection_made(self.sock)
+
+    def test_connection_made(self):
+        assert self.t.connected
+        self.sock.write.assert_called_with(AMQP_PROTOCOL_HEADER)
+
+    def test_data_received(self):
+        data = frame(1, 1, b'foo') + frame(3, 2, b'x' * 100)
+        self.t.data_received(data[:5])
+        self.t.data_received(data[5:20])
+        self.t.on_frame.assert_called_once_with((1, 1, b'foo'))
+        self.t.data_received(data[20:])
+        self.t.on_frame.assert_called_with((3, 2, b'x' * 100))
+        assert not self.t._buffer
+
+    def test_data_received__bad_frame_end(self):
+        self.t.data_received(frame(1, 1, b'foo')[:-1] + b'\x00')
+        self.t.on_frame.assert_not_called()
+        exc = self.t.on_error.call_args[0][0]
+        assert isinstance(exc, UnexpectedFrame)
+        self.sock.close.assert_called_with()
+        assert not self.t.connected
+
+    def test_data_received__closed_by_handler(self):
+        self.t.on_frame.side_effect = lambda frame: self.t.close()
+        self.t.data_received(frame(1, 1, b'foo') + frame(1, 1, b'bar'))
+        self.t.on_frame.assert_called_once_with((1, 1, b'foo'))
+
+    def test_connection_lost(self):
+        self.t.connection_lost(None)
+        assert not self.t.connected
+        exc = self.t.on_error.call_args[0][0]
+        assert isinstance(exc, RecoverableConnectionError)
+
+    def test_connection_lost__after_close(self):
+        self.t.close()
+        self.t.connection_lost(None)
+        self.t.on_error.assert_not_called()
+
+    def test_write(self):
+        buf = bytearray(b'foobar')
+        self.t.write(memoryview(buf)[:3])
+        self.sock.write.assert_called_with(b'foo')
+        self.t.writev([b'foo', b'bar'])
+        self.sock.writelines.assert_called_with([b'foo', b'bar'])
+
+    def test_write__closed(self):
+        self.t.close()
+        with pytest.raises(RecoverableConnectionError):
+            self.t.write(b'foo')
+        with pytest.raises(RecoverableConnectionError):
+            self.t.writev([b'foo'])
+
+    def test_drain(self):
+        loop = asyncio.new_event_loop()
+        try:
+            self.t.loop = loop
+            loop.run_until_complete(self.t.drain())
+            self.t.pause_writing()
+            task = loop.create_task(self.t.drain())
+            loop.run_until_complete(asyncio.sleep(0))
+            assert not task.done()
+            self.t.resume_writing()
+            loop.run_until_complete(task)
+        finally:
+            loop.close()
+
+
+class test_Connection:
+
+    @pytest.fixture(autouse=True)
+    def setup_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.conn = aio.Connection(loop=self.loop)
+        yield
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def spin(self):
+        self.run(asyncio.sleep(0))
+
+    def feed(self, *frames):
+        self.conn.transport.data_received(b''.join(frames))
+        self.spin()
+
+    def connect(self):
+        self.sock = Mock(name='transport')
+
+        def on_connect():
+            self.conn.transport.connection_made(self.sock)
+            return done()
+
+        with patch('amqp.aio.transport.AsyncTransport.connect') as connect:
+            connect.side_effect = on_connect
+            task = self.loop.create_task(self.conn.connect())
+            self.spin()
+        return task
+
+    def handshake(self):
+        task = self.connect()
+        self.feed(
+            method(0, spec.Connection.Start, 'ooFSS',
+                   (0, 9, {'product': 'fake'}, 'AMQPLAIN PLAIN', 'en_US')),
+            method(0, spec.Connection.Tune, 'BlB', (0, 131072, 0)),
+            method(0, spec.Connection.OpenOk, 's', ('',)),
+        )
+        self.run(task)
+        self.sock.reset_mock()
+
+    def open_channel(self, channel_id=1):
+        task = self.loop.create_task(self.conn.channel(channel_id))
+        self.spin()
+        self.feed(method(channel_id, spec.Channel.OpenOk, 'S', ('',)))
+        return self.run(task)
+
+    def test_connect(self):
+        self.handshake()
+        assert self.conn.connected
+        assert self.conn.server_properties == {'product': 'fake'}
+        assert self.conn.on_open.ready
+
+    def test_connect__access_refused(self):
+        task = self.connect()
+        self.feed(
+            method(0, spec.Connection.Start, 'ooFSS',
+                   (0, 9, {}, 'AMQPLAIN', 'en_US')),
+            method(0, spec.Connection.Close, 'BsBB',
+                   (403, 'ACCESS_REFUSED', 0, 0)),
+        )
+        with pytest.raises(AccessRefused):
+            self.run(task)
+        assert not self.conn.connected
+
+    def test_connection_lost(self):
+        self.handshake()
+        channel = self.open_channel()
+        fut = channel.wait(spec.Queue.DeclareOk)
+        self.conn.transport.connection_lost(None)
+        with pytest.raises(RecoverableConnectionError):
+            self.run(fut)
+        assert self.conn.channels is None
+
+    def test_wait__timeout(self):
+        self.handshake()
+        channel = self.open_channel()
+        with pytest.raises(socket.timeout):
+            self.run(channel.wait(spec.Queue.DeclareOk, timeout=0.01))
+        assert not channel._pending
+        assert not channel._waiters
+
+    def test_queue_declare(self):
+        self.handshake()
+        channel = self.open_channel()
+        task = self.loop.create_task(channel.queue_declare('foo'))
+        self.spin()
+        self.feed(method(1, spec.Queue.DeclareOk, 'sll', ('foo', 3, 1)))
+        assert self.run(task) == queue_declare_ok_t('foo', 3, 1)
+
+    def test_basic_consume(self):
+        self.handshake()
+        channel = self.open_channel()
+        callback = Mock(name='callback')
+        task = self.loop.create_task(
+            channel.basic_consume('foo', callback=callback))
+        self.spin()
+        # the first message arrives together with the Consume-Ok.
+        self.feed(
+            method(1, spec.Basic.ConsumeOk, 's', ('ctag',)),
+            method(1, spec.Basic.Deliver, 'sLbss',
+                   ('ctag', 1, False, 'ex', 'rkey'),
+                   content=Message(b'hello')),
+        )
+        assert self.run(task) == 'ctag'
+        msg = callback.call_args[0][0]
+        assert msg.body == 'hello'
+        assert msg.delivery_info['delivery_tag'] == 1
+        assert msg.channel is channel
+
+    def test_coalesce_acks__timer(self):
+        self.handshake()
+        channel = self.open_channel()
+        channel.coalesce_acks(max_pending=10, max_delay=0.01)
+        channel.callbacks['ctag'] = Mock(name='callback')
+        self.feed(method(1, spec.Basic.Deliver, 'sLbss',
+                         ('ctag', 1, False, 'ex', 'rkey'),
+                         content=Message(b'hello')))
+        self.sock.reset_mock()
+        channel.basic_ack(1)
+        self.sock.write.assert_not_called()
+        assert channel._ack_timer is not None
+        # sent without waiting for drain_events().
+        self.run(asyncio.sleep(0.05))
+        data = self.sock.write.call_args[0][0]
+        assert data == method(1, spec.Basic.Ack, 'Lb', (1, True))
+        assert channel._ack_timer is None
+
+    def test_coalesce_acks__flushed_before_timer(self):
+        self.handshake()
+        channel = self.open_channel()
+        channel.coalesce_acks(max_pending=10, max_delay=10)
+        channel.callbacks['ctag'] = Mock(name='callback')
+        self.feed(method(1, spec.Basic.Deliver, 'sLbss',
+                         ('ctag', 1, False, 'ex', 'rkey'),
+                         content=Message(b'hello')))
+        channel.basic_ack(1)
+        timer = channel._ack_timer
+        channel._flush_acks()
+        assert timer.cancelled()
+        assert channel._ack_timer is None
+
+    def test_basic_get(self):
+        self.handshake()
+        channel = self.open_channel()
+        task = self.loop.create_task(channel.basic_get('foo'))
+        self.spin()
+        self.feed(method(1, spec.Basic.GetOk, 'Lbssl',
+                         (1, False, 'ex', 'rkey', 0),
+                         content=Message(b'hello')))
+        msg = self.run(task)
+        assert msg.body == 'hello'
+        assert msg.delivery_info['message_count'] == 0
+
+    def test_basic_get__empty(self):
+        self.handshake()
+        channel = self.open_channel()
+        task = self.loop.create_task(channel.basic_get('foo'))
+        self.spin()
+        self.feed(method(1, spec.Basic.GetEmpty, 's', ('',)))
+        assert self.run(task) is None
+
+    def test_basic_publish(self):
+        self.handshake()
+        channel = self.open_channel()
+        self.sock.reset_mock()
+        self.run(channel.basic_publish(Message(b'hello'), 'ex', 'rkey'))
+        data = self.sock.write.call_args[0][0]
+        assert isinstance(data, bytes)
+        assert data.endswith(frame(3, 1, b'hello'))
+
+    def test_basic_publish__confirm(self):
+        self.handshake()
+        channel = self.open_channel()
+        task = asyncio.ensure_future(channel.confirm_select())
+        self.feed(method(1, spec.Confirm.SelectOk))
+        self.run(task)
+        p1 = self.run(channel.basic_publish(Message(b'1'), 'ex', 'rkey'))
+        p2 = self.run(channel.basic_publish(Message(b'2'), 'ex', 'rkey'))
+        task = self.loop.create_task(channel.wait_for_confirms())
+        self.spin()
+        self.feed(method(1, spec.Basic.Ack, 'Lb', (1, False)))
+        assert p1.ready
+        assert not task.done()
+        self.feed(method(1, spec.Basic.Nack, 'Lbb', (2, False, False)))
+        assert p2.failed
+        assert self.run(task) is False
+
+    def test_basic_publish_confirm__nacked(self):
+        self.handshake()
+        channel = self.open_channel()
+        task = asyncio.ensure_future(channel.confirm_select())
+        self.feed(method(1, spec.Confirm.SelectOk))
+        self.run(task)
+        channel._confirm_selected = True
+        task = self.loop.create_task(
+            channel.basic_publish_confirm(Message(b'1'), 'ex', 'rkey'))
+        self.spin()
+        self.feed(method(1, spec.Basic.Nack, 'Lbb', (1, False, False)))
+        with pytest.raises(MessageNacked):
+            self.run(task)
+
+    def test_channel_closed_by_server(self):
+        self.handshake()
+        channel = self.open_channel()
+        task = self.loop.create_task(channel.queue_declare('foo', passive=1))
+        self.spin()
+        self.feed(method(1, spec.Channel.Close, 'BsBB',
+                         (404, 'NOT_FOUND', 50, 10)))
+        with pytest.raises(NotFound):
+            self.run(task)
+
+    def test_drain_events__unhandled_error(self):
+        self.handshake()
+        self.open_channel()
+        task = self.loop.create_task(self.conn.drain_events())
+        self.spin()
+        self.feed(method(1, spec.Basic.Cancel, 's', ('ctag',)))
+        with pytest.raises(ConsumerCancelled):
+            self.run(task)
+
+    def test_drain_events__timeout(self):
+        self.handshake()
+        with pytest.raises(socket.timeout):
+            self.run(self.conn.drain_events(timeout=0.01))
+
+    def test_close(self):
+        self.handshake()
+        channel = self.open_channel()
+        task = self.loop.create_task(self.conn.close())
+        self.spin()
+        self.feed(method(0, spec.Connection.CloseOk))
+        self.run(task)
+        assert self.conn.channels is None
+        assert not channel.is_open
+        self.sock.close.assert_called_with()
+
+    def test_close_channel(self):
+        self.handshake()
+        channel = self.open_channel()
+        task = self.loop.create_task(channel.close())
+        self.spin()
+        self.feed(method(1, spec.Channel.CloseOk))
+        self.run(task)
+        assert 1 not in self.conn.channels
+
+    def test_unexpected_frame(self):
+        self.handshake()
+        channel = self.open_channel()
+        fut = channel.wait(spec.Queue.DeclareOk)
+        self.feed(frame(3, 1, b'body without header'))
+        with pytest.raises(UnexpectedFrame):
+            self.run(fut)
+        assert self.conn.channels is None
@@ -1,8 +1,11 @@
 from __future__ import absolute_import, unicode_literals
 
+import pickle
+
+import pytest
 from case import Mock
 
-from amqp.basic_message import Message
+from amqp.basic_message import CompactMessage, Message
 
 
 class test_Message:
@@ -17,3 +20,74 @@ class test_Message:
         assert m.body == 'foo'
         assert m.channel
         assert m.headers == {'h': 'v'}
+
+    def test_set_delivery_info(self):
+        m = Message('foo')
+        assert m.delivery_info is None
+        m._set_delivery_info(1, False, 'ex', 'rkey', consumer_tag='ctag')
+        assert m.delivery_info == {
+            'delivery_tag': 1, 'redelivered': False, 'exchange': 'ex',
+            'routing_key': 'rkey', 'consumer_tag': 'ctag',
+        }
+        assert m.delivery_tag == 1
+
+    def test_set_attribute(self):
+        m = Message('foo')
+        m.foo = 'bar'
+        assert m.foo == 'bar'
+
+    @pytest.mark.parametrize('protocol', range(pickle.HIGHEST_PROTOCOL + 1))
+    def test_pickle(self, protocol):
+        m = Message('foo', application_headers={'h': 'v'})
+        m._set_delivery_info(1, False, 'ex', 'rkey', message_count=3)
+        m.foo = 'bar'
+        m2 = pickle.loads(pickle.dumps(m, protocol))
+        assert m2.body == 'foo'
+        assert m2.headers == {'h': 'v'}
+        assert m2.delivery_info == m.delivery_info
+        assert m2.foo == 'bar'
+
+
+class test_CompactMessage:
+
+    def test_delivery_info(self):
+        m = CompactMessage('foo')
+        assert m.delivery_info is None
+        m._set_delivery_info(1, True, 'ex', 'rkey', consumer_tag='ctag')
+        assert m.delivery_tag == 1
+        assert m.routing_key == 'rkey'
+        assert m.message_count is None
+        assert m._delivery_info is None
+        assert m.delivery_info == {
+            'delivery_tag': 1, 'redelivered': True, 'exchange': 'ex',
+            'routing_key': 'rkey', 'consumer_tag': 'ctag',
+        }
+        assert m.delivery_info is m.delivery_info
+
+    def test_delivery_info__basic_get(self):
+        m = CompactMessage('foo')
+        m._set_delivery_info(1, False, 'ex', 'rkey', message_count=0)
+        assert m.delivery_info == {
+            'delivery_tag': 1, 'redelivered': False, 'exchange': 'ex',
+            'routing_key': 'rkey', 'message_count': 0,
+        }
+
+    def test_set_delivery_info_dict(self):
+        m = CompactMessage('foo')
+        m.delivery_info = {'delivery_tag': 2, 'exchange': 'ex'}
+        assert m.delivery_tag == 2
+        assert m.exchange == 'ex'
+        assert m.routing_key is None
+        m.delivery_info = None
+        assert m.delivery_info is None
+        assert m.delivery_tag is None
+
+    @pytest.mark.parametrize('protocol', range(pickle.HIGHEST_PROTOCOL + 1))
+    def test_pickle(self, protocol):
+        m = CompactMessage('foo', content_type='text/plain')
+        m._set_delivery_info(1, False, 'ex', 'rkey', consumer_tag='ctag')
+        m2 = pickle.loads(pickle.dumps(m, protocol))
+        assert m2.body == 'foo'
+        assert m2.content_type == 'text/plain'
+        assert m2.delivery_tag == 1
+        assert m2.delivery_info == m.delivery_info
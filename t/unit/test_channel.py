@@ -1,11 +1,19 @@
 from __future__ import absolute_import, unicode_literals
 
+import socket
+from collections import OrderedDict
+
 import pytest
-from case import ContextMock, Mock, patch
+from case import ANY, ContextMock, Mock, patch
 
 from amqp import spec
+from amqp.basic_message import Message
 from amqp.channel import Channel
-from amqp.exceptions import ConsumerCancelled, NotFound
+from amqp.exceptions import (ChannelError, ConsumerCancelled, MessageNacked,
+                             NotFound, RecoverableChannelError,
+                             RecoverableConnectionError)
+from amqp.method_framing import frame_writer
+from amqp.serialization import dumps
 
 
 class test_Channel:
@@ -15,6 +23,7 @@ class test_Channel:
         self.conn = Mock(name='connection')
         self.conn.channels = {}
         self.conn._get_free_channel_id.return_value = 2
+        self.conn.confirm_publish = False
         self.c = Channel(self.conn, 1)
         self.c.send_method = Mock(name='send_method')
 
@@ -281,6 +290,254 @@ class test_Channel:
         )
         assert 123 in self.c.no_ack_consumers
 
+    def _batch_message(self, delivery_tag):
+        msg = Message()
+        self.c._on_basic_deliver(123, delivery_tag, False, 'ex', 'rk', msg)
+        return msg
+
+    def test_basic_consume__batch(self):
+        callback = Mock(name='callback')
+        self.c.basic_consume('q', 123, callback=callback, batch_size=2)
+        self.conn._batch_channels.add.assert_called_with(self.c)
+        m1, m2 = self._batch_message(1), self._batch_message(2)
+        callback.assert_called_once_with([m1, m2])
+        m3 = self._batch_message(3)
+        callback.assert_called_once_with([m1, m2])
+        self.c._flush_batches()
+        callback.assert_called_with([m3])
+        self.c._flush_batches()
+        assert callback.call_count == 2
+
+    def test_basic_consume__batch_timeout(self):
+        callback = Mock(name='callback')
+        self.c.basic_consume('q', 123, callback=callback,
+                             batch_size=10, batch_timeout=5)
+        with patch('amqp.channel.monotonic') as monotonic:
+            monotonic.return_value = 100.0
+            m1 = self._batch_message(1)
+            monotonic.return_value = 104.0
+            m2 = self._batch_message(2)
+            self.c._flush_batches()
+            callback.assert_not_called()
+            monotonic.return_value = 105.0
+            self.c._flush_batches()
+            callback.assert_called_with([m1, m2])
+
+    def test_batch_deadline(self):
+        self.c.basic_consume('q', 123, callback=Mock(),
+                             batch_size=10, batch_timeout=5)
+        assert self.c._batch_deadline() is None
+        with patch('amqp.channel.monotonic') as monotonic:
+            monotonic.return_value = 100.0
+            self._batch_message(1)
+        assert self.c._batch_deadline() == 105.0
+
+    def test_basic_consume__batch_cancel(self):
+        callback = Mock(name='callback')
+        self.c.basic_consume('q', 123, callback=callback, batch_size=10)
+        m1 = self._batch_message(1)
+        self.c._on_basic_cancel_ok(123)
+        callback.assert_called_with([m1])
+        self.conn._batch_channels.discard.assert_called_with(self.c)
+        assert not self.c._batches
+
+    def test_basic_consume__batch_collect(self):
+        callback = Mock(name='callback')
+        self.c.basic_consume('q', 123, callback=callback, batch_size=10)
+        self._batch_message(1)
+        self.c.collect()
+        self.conn._batch_channels.discard.assert_called_with(self.c)
+        assert not self.c._batches
+        callback.assert_not_called()
+
+    def test_basic_consume__stream(self):
+        on_header, on_chunk = Mock(name='on_header'), Mock(name='on_chunk')
+        on_complete = Mock(name='on_complete')
+        self.c.basic_consume('q', 'ctag', on_header=on_header,
+                             on_chunk=on_chunk, on_complete=on_complete)
+        self.conn._stream_channels.add.assert_called_with(1)
+        msg = Message(frame_method=spec.Basic.Deliver,
+                      frame_args=self._deliver_payload())
+        stream = self.c._stream_for(msg)
+        assert stream is self.c.callbacks['ctag']
+        stream(msg)
+        on_header.assert_called_once_with(msg)
+        stream.on_chunk(msg, b'foo')
+        on_chunk.assert_called_once_with(msg, b'foo')
+        stream.complete(msg)
+        on_complete.assert_called_once_with(msg)
+
+    def test_basic_consume__stream_callback_as_header(self):
+        callback = Mock(name='callback')
+        self.c.basic_consume('q', 'ctag', callback=callback, on_chunk=Mock())
+        self.c.callbacks['ctag']('msg')
+        callback.assert_called_once_with('msg')
+        self.c.callbacks['ctag'].complete('msg')
+
+    def test_basic_consume__stream_batch(self):
+        with pytest.raises(ValueError):
+            self.c.basic_consume('q', 'ctag', on_chunk=Mock(), batch_size=2)
+
+    def test_basic_consume__stream_other_consumer(self):
+        self.c.basic_consume('q', 'ctag', on_chunk=Mock())
+        msg = Message(frame_method=spec.Basic.Deliver,
+                      frame_args=self._deliver_payload('other'))
+        assert self.c._stream_for(msg) is None
+        msg = Message(frame_method=spec.Basic.GetOk, frame_args=b'')
+        assert self.c._stream_for(msg) is None
+
+    def test_basic_consume__stream_cancel(self):
+        self.c.basic_consume('q', 'ctag', on_chunk=Mock())
+        self.c._on_basic_cancel_ok('ctag')
+        self.conn._stream_channels.discard.assert_called_with(1)
+        assert not self.c._streams
+
+    def test_basic_consume__stream_collect(self):
+        self.c.basic_consume('q', 'ctag', on_chunk=Mock())
+        self.c.collect()
+        self.conn._stream_channels.discard.assert_called_with(1)
+        assert not self.c._streams
+
+    def test_basic_ack_batch(self):
+        self.c.basic_consume('q', 123, callback=Mock(), batch_size=10)
+        messages = [self._batch_message(i) for i in (3, 1, 2)]
+        self.c.basic_ack_batch(messages)
+        self.c.send_method.assert_called_with(
+            spec.Basic.Ack, 'Lb', (3, True),
+        )
+
+    def test_basic_ack_batch__empty(self):
+        self.c.basic_ack_batch([])
+        self.c.send_method.assert_not_called()
+
+    def _acks_sent(self):
+        return [
+            c[0][2] for c in self.c.send_method.call_args_list
+            if c[0][0] == spec.Basic.Ack
+        ]
+
+    def _deliver(self, *delivery_tags, **kwargs):
+        consumer_tag = kwargs.get('consumer_tag', 123)
+        self.c.callbacks.setdefault(consumer_tag, Mock(name='callback'))
+        for delivery_tag in delivery_tags:
+            self.c._on_basic_deliver(
+                consumer_tag, delivery_tag, False, 'ex', 'rk', Message())
+
+    def test_coalesce_acks(self):
+        self.c.coalesce_acks(max_pending=3, max_delay=10)
+        self._deliver(1, 2, 3)
+        self.c.basic_ack(1)
+        self.c.basic_ack(2)
+        assert not self._acks_sent()
+        self.conn._ack_channels.add.assert_called_with(self.c)
+        self.c.basic_ack(3)
+        assert self._acks_sent() == [(3, True)]
+        self.conn._ack_channels.discard.assert_called_with(self.c)
+
+    def test_coalesce_acks__out_of_order(self):
+        self.c.coalesce_acks(max_pending=10, max_delay=10)
+        self._deliver(1, 2, 3, 4)
+        self.c.basic_ack(2)
+        self.c.basic_ack(4)
+        self.c._flush_acks()
+        assert self._acks_sent() == [(2, False), (4, False)]
+        self.c.basic_ack(1)
+        self.c._flush_acks()
+        # 2 is acked already, the broker would not know it anymore.
+        assert self._acks_sent()[2:] == [(1, True)]
+        self.c.basic_ack(3)
+        self.c._flush_acks()
+        assert self._acks_sent()[3:] == [(3, True)]
+
+    def test_coalesce_acks__max_delay(self):
+        self.c.coalesce_acks(max_pending=10, max_delay=1)
+        self._deliver(1, 2)
+        with patch('amqp.channel.monotonic') as monotonic:
+            monotonic.return_value = 100.0
+            self.c.basic_ack(1)
+            assert not self._acks_sent()
+            monotonic.return_value = 101.0
+            self.c.basic_ack(2)
+            assert self._acks_sent() == [(2, True)]
+
+    def test_coalesce_acks__no_ack_consumer(self):
+        self.c.coalesce_acks(max_pending=10, max_delay=10)
+        self.c.no_ack_consumers.add('noack')
+        self._deliver(1, consumer_tag='noack')
+        self._deliver(2)
+        self.c.basic_ack(2)
+        self.c._flush_acks()
+        assert self._acks_sent() == [(2, True)]
+
+    def test_coalesce_acks__reject(self):
+        self.c.coalesce_acks(max_pending=10, max_delay=10)
+        self._deliver(1, 2)
+        self.c.basic_reject(1, requeue=True)
+        self.c.basic_ack(2)
+        self.c._flush_acks()
+        assert self._acks_sent() == [(2, True)]
+
+    def test_coalesce_acks__reject_after_ack(self):
+        self.c.coalesce_acks(max_pending=10, max_delay=10)
+        self._deliver(1, 2)
+        self.c.basic_ack(1)
+        self.c.basic_reject(2, requeue=True)
+        self.c._flush_acks()
+        assert self._acks_sent() == [(1, True)]
+
+    def test_coalesce_acks__multiple(self):
+        self.c.coalesce_acks(max_pending=10, max_delay=10)
+        self._deliver(1, 2, 3, 4)
+        self.c.basic_ack(1)
+        self.c.basic_ack(4)
+        self.c.basic_ack(3, multiple=True)
+        assert self._acks_sent() == [(1, True), (4, False), (3, True)]
+        self._deliver(5)
+        self.c.basic_ack(5)
+        self.c._flush_acks()
+        assert self._acks_sent()[3:] == [(5, True)]
+
+    def test_coalesce_acks__all(self):
+        self.c.coalesce_acks(max_pending=10, max_delay=10)
+        self._deliver(1, 2, 3)
+        self.c.basic_ack(0, multiple=True)
+        self._deliver(4)
+        self.c.basic_ack(4)
+        self.c._flush_acks()
+        assert self._acks_sent() == [(0, True), (4, True)]
+
+    def test_coalesce_acks__recover(self):
+        self.c.coalesce_acks(max_pending=10, max_delay=10)
+        self._deliver(1, 2)
+        self.c.basic_ack(2)
+        self.c.basic_recover(requeue=True)
+        assert self._acks_sent() == [(2, False)]
+        self._deliver(3)
+        self.c.basic_ack(3)
+        self.c._flush_acks()
+        assert self._acks_sent()[1:] == [(3, True)]
+
+    def test_coalesce_acks__close(self):
+        self.c.coalesce_acks(max_pending=10, max_delay=10)
+        self.c.is_open = True
+        self._deliver(1)
+        self.c.basic_ack(1)
+        self.c.close()
+        assert self._acks_sent() == [(1, True)]
+
+    def test_coalesce_acks__disable(self):
+        self.c.coalesce_acks(max_pending=10, max_delay=10)
+        self._deliver(1)
+        self.c.basic_ack(1)
+        self.c.coalesce_acks(None)
+        assert self._acks_sent() == [(1, True)]
+        assert self.c._acks is None
+
+    def test_coalesce_acks__consuming(self):
+        self.c.callbacks[123] = Mock(name='callback')
+        with pytest.raises(ChannelError):
+            self.c.coalesce_acks()
+
     def test_on_basic_deliver(self):
         msg = Mock()
         self.c._on_basic_deliver(123, '321', False, 'ex', 'rkey', msg)
@@ -288,6 +545,74 @@ class test_Channel:
         self.c._on_basic_deliver(123, '321', False, 'ex', 'rkey', msg)
         callback.assert_called_with(msg)
 
+    def test_on_basic_deliver__delivery_info(self):
+        msg = Message()
+        callback = self.c.callbacks[123] = Mock(name='cb')
+        self.c._on_basic_deliver(123, '321', False, 'ex', 'rkey', msg)
+        callback.assert_called_with(msg)
+        assert msg.channel is self.c
+        assert msg.delivery_info == {
+            'consumer_tag': 123, 'delivery_tag': '321', 'redelivered': False,
+            'exchange': 'ex', 'routing_key': 'rkey',
+        }
+
+    def _deliver_payload(self, consumer_tag='ctag'):
+        return b'\x00\x3c\x00\x3c' + dumps(
+            'sLbss', (consumer_tag, 321, True, 'ex', 'rkey'))
+
+    def test_dispatch_method__deliver(self):
+        msg = Message(b'foo', content_encoding='utf-8')
+        callback = self.c.callbacks['ctag'] = Mock(name='cb')
+        self.c.dispatch_method(
+            spec.Basic.Deliver, self._deliver_payload(), msg)
+        callback.assert_called_once_with(msg)
+        assert msg.body == 'foo'
+        assert msg.channel is self.c
+        assert msg.delivery_info == {
+            'consumer_tag': 'ctag', 'delivery_tag': 321, 'redelivered': True,
+            'exchange': 'ex', 'routing_key': 'rkey',
+        }
+
+    def test_dispatch_method__deliver_no_auto_decode(self):
+        self.c.auto_decode = False
+        msg = Message(b'foo', content_encoding='utf-8')
+        self.c.callbacks['ctag'] = Mock(name='cb')
+        self.c.dispatch_method(
+            spec.Basic.Deliver, self._deliver_payload(), msg)
+        assert msg.body == b'foo'
+
+    def test_dispatch_method__deliver_decode_error(self):
+        msg = Message(b'\xff', content_encoding='utf-8')
+        callback = self.c.callbacks['ctag'] = Mock(name='cb')
+        self.c.dispatch_method(
+            spec.Basic.Deliver, self._deliver_payload(), msg)
+        callback.assert_called_once_with(msg)
+        assert msg.body == b'\xff'
+
+    def test_dispatch_method__deliver_lazy_properties(self):
+        msg = Message()
+        msg.inbound_header(
+            b'\x00\x3c\x00\x00' + b'\x00' * 8 + Message(
+                content_encoding='utf-8', priority=3,
+            )._serialize_properties(), lazy=True)
+        msg.body = b'foo'
+        self.c.callbacks['ctag'] = Mock(name='cb')
+        self.c.dispatch_method(
+            spec.Basic.Deliver, self._deliver_payload(), msg)
+        assert msg.body == 'foo'
+        # the other properties are still not decoded.
+        assert msg._raw_properties is not None
+
+    def test_dispatch_method__deliver_pending(self):
+        msg = Message(b'foo')
+        self.c.callbacks['ctag'] = Mock(name='cb')
+        pending = self.c._pending[spec.Basic.Deliver] = Mock(name='pending')
+        self.c.dispatch_method(
+            spec.Basic.Deliver, self._deliver_payload(), msg)
+        pending.assert_called_once_with(
+            'ctag', 321, True, 'ex', 'rkey', msg)
+        self.c.callbacks['ctag'].assert_called_once_with(msg)
+
     def test_basic_get(self):
         self.c._on_get_empty = Mock()
         self.c._on_get_ok = Mock()
@@ -324,18 +649,117 @@ class test_Channel:
             (0, 'ex', 'rkey', False, False), 'msg',
         )
 
+    def test_basic_publish_batch(self):
+        transport = self.c.connection.transport
+        transport.having_timeout = ContextMock()
+
+        def write_frame(type_, channel, method_sig, args, content, out):
+            out.append(content)
+        self.c.connection.frame_writer.side_effect = write_frame
+        self.c.basic_publish_batch(['m1', 'm2'], 'ex', 'rkey', timeout=3)
+        self.c.connection.frame_writer.assert_called_with(
+            1, 1, spec.Basic.Publish,
+            dumps('Bssbb', (0, 'ex', 'rkey', False, False)), 'm2', ANY,
+        )
+        transport.having_timeout.assert_called_with(3)
+        transport.writev.assert_called_once_with(['m1', 'm2'])
+
+    def test_basic_publish_batch__write_lock(self):
+        lock = self.c.connection.write_lock = Mock(name='write_lock')
+        transport = self.c.connection.transport
+        transport.having_timeout = ContextMock()
+        transport.writev.side_effect = lambda buffers: (
+            lock.release.assert_not_called())
+        self.c.basic_publish_batch(['m1', 'm2'], 'ex', 'rkey')
+        lock.acquire.assert_called_once_with()
+        lock.release.assert_called_once_with()
+
+    def test_basic_publish_batch__empty(self):
+        assert self.c.basic_publish_batch([], 'ex', 'rkey') is None
+        self.c.connection.transport.writev.assert_not_called()
+
+    def test_basic_publish_batch__empty_confirm(self):
+        self.c._unconfirmed = OrderedDict()
+        assert self.c.basic_publish_batch([], 'ex', 'rkey') == []
+        self.c.connection.transport.writev.assert_not_called()
+
+    def test_basic_publish_batch__confirm_publish(self):
+        self.conn.confirm_publish = True
+
+        def confirm_select():
+            self.c._unconfirmed = OrderedDict()
+        self.c.confirm_select = Mock(name='confirm_select')
+        self.c.confirm_select.side_effect = confirm_select
+        self.c.connection.transport.having_timeout = ContextMock()
+        self.c.connection.frame_writer.side_effect = (
+            lambda *args: args[-1].append(b'frame'))
+        self.c.wait = Mock(name='wait')
+        self.c.wait.side_effect = lambda *a: self.c._on_basic_ack(
+            self.c._publish_seq, True)
+        promises = self.c.basic_publish_batch(['m1', 'm2'], 'ex', 'rkey')
+        assert len(promises) == 2
+        assert all(p.ready for p in promises)
+        self.c.wait.assert_called_with([spec.Basic.Ack, spec.Basic.Nack])
+        assert self.c.basic_publish_batch([], 'ex', 'rkey') == []
+        self.c.confirm_select.assert_called_once_with()
+
+    def test_basic_publish_batch__confirm_publish_nacked(self):
+        self.conn.confirm_publish = True
+        self.c._confirm_selected = True
+        self.c._unconfirmed = OrderedDict()
+        self.c.connection.transport.having_timeout = ContextMock()
+        self.c.connection.frame_writer.side_effect = (
+            lambda *args: args[-1].append(b'frame'))
+        self.c.wait = Mock(name='wait')
+        self.c.wait.side_effect = lambda *a: self.c._on_basic_nack(
+            self.c._publish_seq, False, False)
+        with pytest.raises(MessageNacked):
+            self.c.basic_publish_batch(['m1'], 'ex', 'rkey')
+
+    def test_basic_publish_batch__timeout(self):
+        transport = self.c.connection.transport
+        transport.having_timeout = ContextMock()
+        transport.writev.side_effect = socket.timeout()
+        self.c.connection.frame_writer.side_effect = (
+            lambda *args: args[-1].append(b'frame'))
+        with pytest.raises(RecoverableChannelError):
+            self.c.basic_publish_batch([Mock()], 'ex', 'rkey')
+
+    def test_basic_publish_batch__connection_closed(self):
+        self.c.connection = None
+        with pytest.raises(RecoverableConnectionError):
+            self.c.basic_publish_batch([Mock()], 'ex', 'rkey')
+
     def test_basic_publish_confirm(self):
         self.c._confirm_selected = False
         self.c.confirm_select = Mock(name='confirm_select')
+        self.c._unconfirmed = OrderedDict()
         self.c._basic_publish = Mock(name='_basic_publish')
+        self.c._basic_publish.side_effect = lambda *a, **kw: (
+            self.c._track_confirm())
         self.c.wait = Mock(name='wait')
+        self.c.wait.side_effect = lambda *a: self.c._on_basic_ack(
+            self.c._publish_seq, False)
         ret = self.c.basic_publish_confirm(1, 2, arg=1)
         self.c.confirm_select.assert_called_with()
         assert self.c._confirm_selected
         self.c._basic_publish.assert_called_with(1, 2, arg=1)
-        assert ret is self.c._basic_publish()
-        self.c.wait.assert_called_with(spec.Basic.Ack)
+        assert ret.ready
+        self.c.wait.assert_called_with([spec.Basic.Ack, spec.Basic.Nack])
         self.c.basic_publish_confirm(1, 2, arg=1)
+        self.c.confirm_select.assert_called_once_with()
+
+    def test_basic_publish_confirm__nacked(self):
+        self.c._confirm_selected = True
+        self.c._unconfirmed = OrderedDict()
+        self.c._basic_publish = Mock(name='_basic_publish')
+        self.c._basic_publish.side_effect = lambda *a, **kw: (
+            self.c._track_confirm())
+        self.c.wait = Mock(name='wait')
+        self.c.wait.side_effect = lambda *a: self.c._on_basic_nack(
+            self.c._publish_seq, False, False)
+        with pytest.raises(MessageNacked):
+            self.c.basic_publish_confirm(1, 2)
 
     def test_basic_qos(self):
         self.c.basic_qos(0, 123, False)
@@ -405,3 +829,244 @@ class test_Channel:
         self.c.events['basic_ack'].add(callback)
         self.c._on_basic_ack(123, True)
         callback.assert_called_with(123, True)
+
+    def test_on_basic_nack(self):
+        callback = Mock(name='callback')
+        self.c.events['basic_nack'].add(callback)
+        self.c._on_basic_nack(123, True, False)
+        callback.assert_called_with(123, True)
+
+    def confirm_mode(self):
+        self.c.connection.transport.having_timeout = ContextMock()
+        self.c.confirm_select()
+
+    def test_publish_returns_confirm_promise(self):
+        self.confirm_mode()
+        p1 = self.c._basic_publish('msg1')
+        p2 = self.c._basic_publish('msg2')
+        assert self.c.unconfirmed == 2
+        self.c._on_basic_ack(2, False)
+        assert p2.ready and not p1.ready
+        self.c._on_basic_ack(1, False)
+        assert p1.ready
+        assert not self.c.unconfirmed
+
+    def test_publish_without_confirms(self):
+        self.c.connection.transport.having_timeout = ContextMock()
+        ret = self.c._basic_publish('msg')
+        assert ret is self.c.send_method()
+        assert not self.c.unconfirmed
+
+    def test_confirms__multiple(self):
+        self.confirm_mode()
+        promises = [self.c._basic_publish('msg') for _ in range(4)]
+        self.c._on_basic_ack(3, True)
+        assert [p.ready for p in promises] == [True, True, True, False]
+        self.c._on_basic_ack(0, True)
+        assert promises[3].ready
+
+    def test_confirms__nack(self):
+        self.confirm_mode()
+        p1 = self.c._basic_publish('msg1')
+        p2 = self.c._basic_publish('msg2')
+        self.c._on_basic_nack(1, False, False)
+        assert p1.failed
+        assert isinstance(p1.reason, MessageNacked)
+        self.c._on_basic_ack(2, False)
+        assert p2.ready and not p2.failed
+
+    def test_confirms__unknown_tag(self):
+        self.confirm_mode()
+        self.c._on_basic_ack(10, False)
+        self.c._on_basic_nack(10, True, False)
+
+    def test_confirms__batch(self):
+        self.confirm_mode()
+        self.conn.frame_writer.side_effect = (
+            lambda *args: args[-1].append(b'frame'))
+        promises = self.c.basic_publish_batch(['m1', 'm2', 'm3'])
+        assert len(promises) == 3
+        self.c._on_basic_ack(3, True)
+        assert all(p.ready for p in promises)
+
+    def test_confirms__tracked_before_write(self):
+        # the confirm may be dispatched by another thread
+        # before the write returns.
+        self.confirm_mode()
+        self.c.send_method.side_effect = lambda *a: self.c._on_basic_ack(
+            1, False)
+        p = self.c._basic_publish('msg')
+        assert p.ready
+        self.conn.frame_writer.side_effect = lambda *args: (
+            args[-1].append(b'frame'))
+        self.conn.transport.writev.side_effect = lambda buffers: (
+            self.c._on_basic_ack(3, True))
+        promises = self.c.basic_publish_batch(['m1', 'm2'])
+        assert all(p.ready for p in promises)
+
+    def test_confirms__untracked_on_error(self):
+        self.confirm_mode()
+        p = self.c._basic_publish('msg1')
+        self.c.send_method.side_effect = socket.timeout()
+        with pytest.raises(RecoverableChannelError):
+            self.c._basic_publish('msg2')
+        self.conn.frame_writer.side_effect = lambda *args: (
+            args[-1].append(b'frame'))
+        self.conn.transport.writev.side_effect = socket.error()
+        with pytest.raises(socket.error):
+            self.c.basic_publish_batch(['m1', 'm2'])
+        assert self.c.unconfirmed == 1
+        assert self.c._publish_seq == 1
+        self.c._on_basic_ack(1, False)
+        assert p.ready
+
+    def test_confirms__reset_on_collect(self):
+        self.confirm_mode()
+        p = self.c._basic_publish('msg')
+        self.c.collect()
+        assert p.failed
+        assert isinstance(p.reason, RecoverableChannelError)
+
+    def test_wait_for_confirms(self):
+        self.confirm_mode()
+        self.c._basic_publish('msg1')
+        self.c._basic_publish('msg2')
+        acks = iter([(1, False), (2, False)])
+        self.conn.drain_events.side_effect = (
+            lambda timeout=None: self.c._on_basic_ack(*next(acks)))
+        assert self.c.wait_for_confirms(timeout=10)
+        assert self.conn.drain_events.call_count == 2
+
+    def test_wait_for_confirms__nacked(self):
+        self.confirm_mode()
+        self.c._basic_publish('msg')
+        self.conn.drain_events.side_effect = (
+            lambda timeout=None: self.c._on_basic_nack(1, False, False))
+        assert not self.c.wait_for_confirms()
+        # flag is reset after being reported.
+        assert self.c.wait_for_confirms()
+
+    def test_wait_for_confirms__timeout(self):
+        self.confirm_mode()
+        self.c._basic_publish('msg')
+        with patch('amqp.channel.monotonic') as monotonic:
+            monotonic.side_effect = [100.0, 100.5, 102.0]
+            with pytest.raises(socket.timeout):
+                self.c.wait_for_confirms(timeout=1)
+        self.conn.drain_events.assert_called_once_with(timeout=0.5)
+
+    def test_wait_for_confirms__not_in_confirm_mode(self):
+        with pytest.raises(ChannelError):
+            self.c.wait_for_confirms()
+
+
+class test_PreparedPublish:
+
+    @pytest.fixture(autouse=True)
+    def setup_conn(self):
+        self.conn = Mock(name='connection')
+        self.conn.channels = {}
+        self.conn.frame_max = 128
+        self.conn.bytes_sent = 0
+        self.conn.write_lock = None
+        self.conn.confirm_publish = False
+        self.conn.transport.having_timeout = ContextMock()
+        self.c = Channel(self.conn, 1)
+        self.prototype = Message(content_type='application/json',
+                                 application_headers={'x': 1})
+        self.publish = self.c.prepare_publish(
+            self.prototype, 'ex', 'rkey', mandatory=True)
+
+    def expected(self, body):
+        # what the frame writer writes for the same message.
+        out = []
+        write_frame = frame_writer(self.conn, self.conn.transport)
+        message = Message(body, **self.prototype.properties)
+        write_frame(1, 1, spec.Basic.Publish,
+                    dumps('Bssbb', (0, 'ex', 'rkey', True, False)),
+                    message, out)
+        return b''.join(bytes(bytearray(buf)) for buf in out)
+
+    def written(self):
+        buffers, = self.conn.transport.writev.call_args[0]
+        return b''.join(bytes(bytearray(buf)) for buf in buffers)
+
+    @pytest.mark.parametrize('body', [b'foo', b'', b'x' * 300, '\u00fcnicode'])
+    def test_call(self, body):
+        assert self.publish(body, timeout=3) is None
+        assert self.conn.bytes_sent == 1
+        assert self.written() == self.expected(body)
+        self.conn.transport.having_timeout.assert_called_with(3)
+
+    def test_publish_batch(self):
+        self.publish.publish_batch([b'foo', b'bar'])
+        assert self.conn.bytes_sent == 2
+        assert self.written() == self.expected(b'foo') + self.expected(b'bar')
+
+    def test_publish_batch__empty(self):
+        assert self.publish.publish_batch([]) == []
+        self.conn.transport.writev.assert_not_called()
+
+    def test_prototype_copied(self):
+        self.prototype.properties['priority'] = 9
+        self.publish(b'foo')
+        self.prototype.properties.pop('priority')
+        assert self.written() == self.expected(b'foo')
+
+    def test_write_lock(self):
+        lock = self.conn.write_lock = Mock(name='write_lock')
+        self.conn.transport.writev.side_effect = lambda buffers: (
+            lock.release.assert_not_called())
+        self.publish(b'foo')
+        lock.acquire.assert_called_once_with()
+        lock.release.assert_called_once_with()
+
+    def test_confirm_mode(self):
+        self.c._unconfirmed = {}
+        self.c._delivery_tag = 0
+        promise = self.publish(b'foo')
+        assert self.c._unconfirmed == {1: promise}
+
+    def test_confirm_mode__timeout(self):
+        self.c._unconfirmed = OrderedDict()
+        self.conn.transport.writev.side_effect = socket.timeout()
+        with pytest.raises(RecoverableChannelError):
+            self.publish.publish_batch([b'foo', b'bar'])
+        assert not self.c._unconfirmed
+        assert self.c._publish_seq == 0
+
+    def test_confirm_publish(self):
+        self.conn.confirm_publish = True
+
+        def confirm_select():
+            self.c._unconfirmed = OrderedDict()
+        self.c.confirm_select = Mock(name='confirm_select')
+        self.c.confirm_select.side_effect = confirm_select
+        self.c.wait = Mock(name='wait')
+        self.c.wait.side_effect = lambda *a: self.c._on_basic_ack(
+            self.c._publish_seq, True)
+        promises = self.publish.publish_batch([b'foo', b'bar'])
+        assert all(p.ready for p in promises)
+        self.c.wait.assert_called_with([spec.Basic.Ack, spec.Basic.Nack])
+        self.publish(b'baz')
+        self.c.confirm_select.assert_called_once_with()
+
+    def test_confirm_publish__nacked(self):
+        self.conn.confirm_publish = True
+        self.c._confirm_selected = True
+        self.c._unconfirmed = OrderedDict()
+        self.c.wait = Mock(name='wait')
+        self.c.wait.side_effect = lambda *a: self.c._on_basic_nack(
+            self.c._publish_seq, False, False)
+        with pytest.raises(MessageNacked):
+            self.publish(b'foo')
+
+    def test_timeout(self):
+        self.conn.transport.writev.side_effect = socket.timeout()
+        with pytest.raises(RecoverableChannelError):
+            self.publish(b'foo')
+
+    def test_channel_closed(self):
+        self.c.collect()
+        with pytest.raises(RecoverableConnectionError):
+            self.publish(b'foo')
@@ -261,6 +261,11 @@ class test_Connection:
         assert self.conn._handshake_complete
         self.conn.on_open.assert_called_with(self.conn)
 
+    def test_on_open_ok__heartbeat_thread(self):
+        self.conn.heartbeat_thread = Mock(name='heartbeat_thread')
+        self.conn._on_open_ok()
+        self.conn.heartbeat_thread.add.assert_called_with(self.conn)
+
     def test_connected(self):
         self.conn.transport.connected = False
         assert not self.conn.connected
@@ -280,6 +285,11 @@ class test_Connection:
             if i:
                 channel.collect.assert_called_with()
 
+    def test_collect__heartbeat_thread(self):
+        self.conn.heartbeat_thread = Mock(name='heartbeat_thread')
+        self.conn.collect()
+        self.conn.heartbeat_thread.remove.assert_called_with(self.conn)
+
     def test_collect__channel_raises_socket_error(self):
         self.conn.channels = self.conn.channels = {1: Mock(name='c1')}
         self.conn.channels[1].collect.side_effect = socket.error()
@@ -323,6 +333,108 @@ class test_Connection:
         self.conn.drain_events(30)
         self.conn.blocking_read.assert_called_with(30)
 
+    def test_drain_events__max_frames(self):
+        self.conn.bulk_read = Mock(name='bulk_read')
+        self.conn.blocking_read = Mock(name='blocking_read')
+        self.conn.drain_events(30, max_frames=100)
+        self.conn.bulk_read.assert_called_with(30, 100)
+        self.conn.blocking_read.assert_not_called()
+
+    def test_drain_events__batches(self):
+        self.conn.blocking_read = Mock(name='blocking_read')
+        channel = Mock(name='channel')
+        channel._batch_deadline.return_value = None
+        self.conn._batch_channels.add(channel)
+        self.conn.drain_events(30)
+        channel._flush_batches.assert_called_with()
+
+        channel._flush_batches.reset_mock()
+        self.conn.blocking_read.side_effect = socket.timeout()
+        with pytest.raises(socket.timeout):
+            self.conn.drain_events(30)
+        channel._flush_batches.assert_called_with()
+
+    def test_drain_events__fills_batches(self):
+        self.conn.blocking_read = Mock(name='blocking_read')
+        self.conn.on_inbound_frame = Mock(name='on_inbound_frame')
+        self.conn.transport.readable.side_effect = [True, True, True]
+        self.conn.transport.read_ready_frames.side_effect = [
+            iter([(1, 1, b'a'), (2, 1, b'b')]), iter([(3, 1, b'c')]),
+        ]
+        channel = Mock(name='channel')
+        # partial batch, until the last frame is read.
+        channel._batch_deadline.side_effect = [None, 100.0, 100.0, None]
+        channel._flush_batches.side_effect = lambda: (
+            self.conn.on_inbound_frame.assert_called_with((3, 1, b'c')))
+        self.conn._batch_channels.add(channel)
+        self.conn.drain_events(30)
+        assert self.conn.on_inbound_frame.call_count == 3
+        channel._flush_batches.assert_called_once_with()
+
+    def test_drain_events__fills_batches_not_readable(self):
+        self.conn.blocking_read = Mock(name='blocking_read')
+        self.conn.transport.readable.return_value = False
+        channel = Mock(name='channel')
+        channel._batch_deadline.side_effect = [None, 100.0]
+        self.conn._batch_channels.add(channel)
+        self.conn.drain_events(30)
+        self.conn.transport.read_ready_frames.assert_not_called()
+
+    def test_drain_events__batch_deadline(self, patching):
+        monotonic = patching('amqp.connection.monotonic')
+        monotonic.return_value = 100.0
+        self.conn.blocking_read = Mock(name='blocking_read')
+        self.conn.blocking_read.side_effect = socket.timeout()
+        channel = Mock(name='channel')
+        channel._batch_deadline.return_value = 102.0
+        self.conn._batch_channels.add(channel)
+        # returns once the batch is passed on.
+        self.conn.drain_events()
+        self.conn.blocking_read.assert_called_with(2.0)
+        channel._flush_batches.assert_called_once_with()
+
+        # the timeout is kept if shorter.
+        with pytest.raises(socket.timeout):
+            self.conn.drain_events(timeout=1)
+        self.conn.blocking_read.assert_called_with(1)
+
+    def test_drain_events__batch_due(self, patching):
+        monotonic = patching('amqp.connection.monotonic')
+        monotonic.return_value = 100.0
+        self.conn.blocking_read = Mock(name='blocking_read')
+        channel = Mock(name='channel')
+        channel._batch_deadline.return_value = 99.0
+        self.conn._batch_channels.add(channel)
+        self.conn.drain_events()
+        self.conn.blocking_read.assert_not_called()
+        channel._flush_batches.assert_called_once_with()
+
+    def test_drain_events__acks(self):
+        self.conn.blocking_read = Mock(name='blocking_read')
+        channel = Mock(name='channel')
+        self.conn._ack_channels.add(channel)
+        self.conn.drain_events(30)
+        channel._flush_acks.assert_called_with()
+
+    def test_bulk_read(self):
+        frames = [(1, 1, b'a'), (2, 1, b'b'), (3, 1, b'c')]
+        self.conn.transport.having_timeout = ContextMock()
+        self.conn.transport.read_frames.return_value = iter(frames)
+        self.conn.on_inbound_frame = Mock(name='on_inbound_frame')
+        self.conn.on_inbound_frame.side_effect = [True, False, False]
+        assert self.conn.bulk_read(3, 10)
+        self.conn.transport.read_frames.assert_called_with(10)
+        self.conn.transport.having_timeout.assert_called_with(3)
+        self.conn.on_inbound_frame.assert_has_calls(
+            [call(frame) for frame in frames])
+
+    def test_bulk_read__not_ready(self):
+        self.conn.transport.having_timeout = ContextMock()
+        self.conn.transport.read_frames.return_value = iter([(1, 1, b'a')])
+        self.conn.on_inbound_frame = Mock(name='on_inbound_frame')
+        self.conn.on_inbound_frame.return_value = False
+        assert not self.conn.bulk_read()
+
     def test_blocking_read__no_timeout(self):
         self.conn.on_inbound_frame = Mock(name='on_inbound_frame')
         self.conn.transport.having_timeout = ContextMock()
@@ -437,6 +549,62 @@ class test_Connection:
         with pytest.raises(ConnectionError):
             self.conn.heartbeat_tick()
 
+    def test_send_heartbeat_if_due(self):
+        self.conn.heartbeat = 3
+        self.conn.send_heartbeat_if_due()
+        self.conn.frame_writer.assert_not_called()
+        self.conn.last_heartbeat_received = 1
+        self.conn.last_heartbeat_sent -= 1000
+        # nothing received for a long time, but only sending matters.
+        self.conn.send_heartbeat_if_due()
+        self.conn.frame_writer.assert_called_with(8, 0, None, None, None)
+
+    def test_check_heartbeats(self):
+        self.conn.heartbeat = 3
+        self.conn.check_heartbeats()
+        self.conn.last_heartbeat_received -= 1000
+        with pytest.raises(ConnectionError):
+            self.conn.check_heartbeats()
+        self.conn.frame_writer.assert_not_called()
+
+    def test_heartbeat_tick__no_debug_logging(self, patching):
+        logger = patching('amqp.connection.AMQP_LOGGER')
+        logger.isEnabledFor.return_value = False
+        self.conn.heartbeat = 3
+        self.conn.heartbeat_tick()
+        self.conn.last_heartbeat_sent -= 1000
+        self.conn.heartbeat_tick()
+        self.conn.frame_writer.assert_called_with(8, 0, None, None, None)
+        logger.debug.assert_not_called()
+
+    def test_heartbeat_tick__debug_logging(self, patching):
+        logger = patching('amqp.connection.AMQP_LOGGER')
+        logger.isEnabledFor.return_value = True
+        self.conn.heartbeat = 3
+        self.conn.heartbeat_tick()
+        assert logger.debug.call_count == 2
+
+    def test_enable_write_lock(self):
+        frame_writer = self.conn.frame_writer
+        lock = self.conn.enable_write_lock()
+        assert self.conn.write_lock is lock
+        assert self.conn.enable_write_lock() is lock
+
+        def write_frame(*args):
+            assert lock._is_owned()
+        frame_writer.side_effect = write_frame
+        self.conn.frame_writer(8, 0, None, None, None)
+        frame_writer.assert_called_with(8, 0, None, None, None)
+        assert not lock._is_owned()
+
+    def test_enable_write_lock__new_frame_writer(self):
+        lock = self.conn.enable_write_lock()
+        frame_writer = Mock(name='frame_writer')
+        frame_writer.side_effect = lambda *args: lock._is_owned()
+        self.conn.frame_writer = frame_writer
+        assert self.conn.frame_writer(8, 0, None, None, None)
+        frame_writer.assert_called_with(8, 0, None, None, None)
+
     def test_server_capabilities(self):
         self.conn.server_properties['capabilities'] = {'foo': 1}
         assert self.conn.server_capabilities == {'foo': 1}
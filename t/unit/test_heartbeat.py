@@ -0,0 +1,137 @@
+from __future__ import absolute_import, unicode_literals
+
+import socket
+import threading
+
+import pytest
+from case import Mock
+
+from amqp.heartbeat import HeartbeatSchedule, HeartbeatThread
+
+
+def _connection(heartbeat=10):
+    conn = Mock(name='connection')
+    conn.heartbeat = heartbeat
+    conn.connected = True
+    return conn
+
+
+class test_HeartbeatSchedule:
+
+    @pytest.fixture(autouse=True)
+    def setup_schedule(self):
+        self.schedule = HeartbeatSchedule()
+
+    def test_add(self):
+        conn = _connection()
+        self.schedule.add(conn, now=100.0)
+        assert conn in self.schedule
+        assert len(self.schedule) == 1
+        assert self.schedule.next_deadline() == 105.0
+
+    def test_add__no_heartbeat(self):
+        conn = _connection(heartbeat=0)
+        self.schedule.add(conn, now=100.0)
+        assert conn not in self.schedule
+        assert self.schedule.next_deadline() is None
+
+    def test_remove(self):
+        conn = _connection()
+        self.schedule.add(conn, now=100.0)
+        self.schedule.remove(conn)
+        self.schedule.remove(conn)
+        assert conn not in self.schedule
+        assert self.schedule.next_deadline() is None
+        assert self.schedule.pop_due(200.0) == []
+
+    def test_pop_due(self):
+        conn1, conn2 = _connection(10), _connection(30)
+        self.schedule.add(conn1, now=100.0)
+        self.schedule.add(conn2, now=100.0)
+        assert self.schedule.pop_due(104.0) == []
+        assert self.schedule.pop_due(105.0) == [conn1]
+        assert self.schedule.next_deadline() == 110.0
+        assert self.schedule.pop_due(115.0) == [conn1, conn2]
+        assert self.schedule.next_deadline() == 120.0
+
+    def test_added_again(self):
+        conn = _connection()
+        self.schedule.add(conn, now=100.0)
+        self.schedule.remove(conn)
+        self.schedule.add(conn, now=102.0)
+        assert self.schedule.next_deadline() == 107.0
+        assert self.schedule.pop_due(107.0) == [conn]
+
+
+class test_HeartbeatThread:
+
+    @pytest.fixture(autouse=True)
+    def setup_thread(self):
+        self.on_error = Mock(name='on_error')
+        self.thread = HeartbeatThread(on_error=self.on_error)
+        yield
+        self.thread.stop(timeout=5)
+        assert not self.thread.is_alive()
+
+    def test_add(self):
+        conn = _connection()
+        self.thread.add(conn)
+        conn.enable_write_lock.assert_called_with()
+        assert conn in self.thread.schedule
+        assert self.thread.is_alive()
+
+    def test_add__no_heartbeat(self):
+        conn = _connection(heartbeat=0)
+        self.thread.add(conn)
+        conn.enable_write_lock.assert_not_called()
+        assert not self.thread.is_alive()
+
+    def test_remove(self):
+        conn = _connection()
+        self.thread.add(conn)
+        self.thread.remove(conn)
+        assert conn not in self.thread.schedule
+
+    def test_stop__not_started(self):
+        self.thread.stop()
+
+    def test_heartbeat_tick(self):
+        ticked = threading.Event()
+        conn = _connection(heartbeat=0.02)
+        conn.send_heartbeat_if_due.side_effect = lambda: ticked.set()
+        self.thread.add(conn)
+        assert ticked.wait(5)
+        # missed heartbeats are checked by the thread reading frames.
+        conn.heartbeat_tick.assert_not_called()
+        conn.check_heartbeats.assert_not_called()
+
+    def test_tick__error(self):
+        conn = _connection()
+        exc = conn.send_heartbeat_if_due.side_effect = socket.error()
+        self.thread.schedule.add(conn)
+        self.thread._tick(conn)
+        self.on_error.assert_called_once_with(conn, exc)
+        assert conn not in self.thread.schedule
+
+    def test_tick__error_logged(self, patching):
+        logger = patching('amqp.heartbeat.AMQP_LOGGER')
+        self.thread.on_error = None
+        conn = _connection()
+        conn.send_heartbeat_if_due.side_effect = socket.error()
+        self.thread.schedule.add(conn)
+        self.thread._tick(conn)
+        logger.error.assert_called()
+        assert conn not in self.thread.schedule
+
+    def test_tick__not_connected(self):
+        conn = _connection()
+        conn.connected = False
+        self.thread.schedule.add(conn)
+        self.thread._tick(conn)
+        conn.send_heartbeat_if_due.assert_not_called()
+        assert conn not in self.thread.schedule
+
+    def test_tick__removed(self):
+        conn = _connection()
+        self.thread._tick(conn)
+        conn.send_heartbeat_if_due.assert_not_called()
@@ -0,0 +1,246 @@
+from __future__ import absolute_import, unicode_literals
+
+import socket
+
+import pytest
+from case import ANY, Mock, call, patch
+
+from amqp.exceptions import ConnectionForced
+from amqp.hub import Hub, selectors
+from amqp.platform import pack
+from amqp.transport import TCPTransport
+
+pytestmark = pytest.mark.skipif(
+    selectors is None, reason='selectors module not available')
+
+
+class Transport(TCPTransport):
+
+    def __init__(self, sock):
+        super(Transport, self).__init__('localhost')
+        self.sock = sock
+        self._setup_transport()
+        self.connected = True
+
+    def _connect(self, *args):
+        pass
+
+    def _init_socket(self, *args):
+        pass
+
+
+def _frame(channel, payload):
+    return pack('>BHI', 1, channel, len(payload)) + payload + b'\xce'
+
+
+class test_Hub:
+
+    @pytest.fixture(autouse=True)
+    def setup_hub(self):
+        self.on_error = Mock(name='on_error')
+        self.hub = Hub(on_error=self.on_error)
+        self.sockets = []
+        yield
+        self.hub.close()
+        for sock in self.sockets:
+            sock.close()
+
+    def connection(self, heartbeat=0):
+        a, b = socket.socketpair()
+        self.sockets.extend([a, b])
+        conn = Mock(name='connection')
+        conn.heartbeat = heartbeat
+        conn._ack_channels = set()
+        conn._batch_channels = set()
+        conn.transport = Transport(a)
+        conn.sock = a
+        conn.connected = True
+        return conn, b
+
+    def test_add(self):
+        conn, _ = self.connection()
+        self.hub.add(conn)
+        assert conn in self.hub.connections
+        assert self.hub.selector.get_key(conn.sock).data is conn
+        assert conn not in self.hub.heartbeats
+
+    def test_add__heartbeat(self):
+        conn, _ = self.connection(heartbeat=10)
+        with patch('amqp.heartbeat.monotonic') as monotonic:
+            monotonic.return_value = 100.0
+            self.hub.add(conn)
+        assert self.hub.heartbeats.next_deadline() == 105.0
+
+    def test_remove(self):
+        conn, _ = self.connection()
+        self.hub.add(conn)
+        self.hub.remove(conn)
+        assert conn not in self.hub.connections
+        assert not self.hub.selector.get_map()
+        self.hub.remove(conn)
+
+    def test_remove__socket_closed(self):
+        conn, _ = self.connection()
+        self.hub.add(conn)
+        conn.sock.close()
+        self.hub.remove(conn)
+        assert not self.hub.connections
+
+    def test_run_once(self):
+        conn1, peer1 = self.connection()
+        conn2, peer2 = self.connection()
+        self.hub.add(conn1)
+        self.hub.add(conn2)
+        peer1.sendall(_frame(1, b'the') + _frame(2, b'quick'))
+        peer2.sendall(_frame(1, b'brown') + _frame(1, b'fox'))
+        events = 0
+        while events < 2:
+            events += self.hub.run_once(timeout=1)
+        conn1.on_inbound_frame.assert_has_calls([
+            call((1, 1, b'the')), call((1, 2, b'quick')),
+        ])
+        conn2.on_inbound_frame.assert_has_calls([
+            call((1, 1, b'brown')), call((1, 1, b'fox')),
+        ])
+
+    def test_run_once__timeout(self):
+        conn, _ = self.connection()
+        self.hub.add(conn)
+        assert self.hub.run_once(timeout=0) == 0
+        conn.on_inbound_frame.assert_not_called()
+
+    def test_run_once__socket_closed(self):
+        conn, peer = self.connection()
+        self.hub.add(conn)
+        peer.close()
+        self.hub.run_once(timeout=1)
+        assert conn not in self.hub.connections
+        self.on_error.assert_called_once_with(conn, ANY)
+
+    def test_run_once__error_raised_without_on_error(self):
+        self.hub.on_error = None
+        conn, peer = self.connection()
+        conn.on_inbound_frame.side_effect = KeyError('foo')
+        self.hub.add(conn)
+        peer.sendall(_frame(1, b'fox'))
+        with pytest.raises(KeyError):
+            self.hub.run_once(timeout=1)
+        assert conn not in self.hub.connections
+
+    def test_run_once__closed_by_callback(self):
+        conn, peer = self.connection()
+
+        def on_inbound_frame(frame):
+            conn.connected = False
+        conn.on_inbound_frame.side_effect = on_inbound_frame
+        self.hub.add(conn)
+        peer.sendall(_frame(1, b'the') + _frame(1, b'fox'))
+        self.hub.run_once(timeout=1)
+        conn.on_inbound_frame.assert_called_once_with((1, 1, b'the'))
+        assert conn not in self.hub.connections
+        self.on_error.assert_not_called()
+
+    def test_run_once__flushes_acks_and_batches(self):
+        conn, _ = self.connection()
+        conn._ack_channels.add(Mock(name='channel'))
+        conn._batch_channels.add(Mock(name='channel'))
+        conn._batch_timeout.return_value = (0, False)
+        self.hub.add(conn)
+        self.hub.run_once(timeout=0)
+        conn._flush_acks.assert_called_once_with()
+        conn._flush_batches.assert_called_once_with()
+
+    def test_run_forever(self):
+        conn, peer = self.connection()
+        self.hub.add(conn)
+        peer.close()
+        self.hub.run_forever(timeout=1)
+        assert not self.hub.connections
+
+
+class test_Hub_heartbeats:
+
+    @pytest.fixture(autouse=True)
+    def setup_hub(self, patching):
+        self.monotonic = patching('amqp.hub.monotonic')
+        self.monotonic.return_value = 100.0
+        patching('amqp.heartbeat.monotonic', self.monotonic)
+        self.selector = Mock(name='selector')
+        self.selector.select.return_value = []
+        self.on_error = Mock(name='on_error')
+        self.hub = Hub(self.selector, on_error=self.on_error)
+
+    def connection(self, heartbeat=10):
+        conn = Mock(name='connection')
+        conn.heartbeat = heartbeat
+        conn._ack_channels = set()
+        conn._batch_channels = set()
+        return conn
+
+    def test_timeout_shortened(self):
+        self.hub.add(self.connection())
+        self.hub.run_once(timeout=30)
+        self.selector.select.assert_called_with(5.0)
+        self.monotonic.return_value = 103.0
+        self.hub.run_once()
+        self.selector.select.assert_called_with(2.0)
+        self.hub.run_once(timeout=1)
+        self.selector.select.assert_called_with(1)
+
+    def test_timeout_shortened__batches(self):
+        conn = self.connection(heartbeat=0)
+        conn._batch_channels.add(Mock(name='channel'))
+        conn._batch_timeout.return_value = (0.5, True)
+        self.hub.add(conn)
+        self.hub.add(self.connection())
+        self.hub.run_once()
+        conn._batch_timeout.assert_called_with(5.0)
+        self.selector.select.assert_called_with(0.5)
+        conn._flush_batches.assert_called_once_with()
+
+    def test_heartbeat_tick(self):
+        conn = self.connection()
+        self.hub.add(conn)
+        self.hub.run_once()
+        conn.heartbeat_tick.assert_not_called()
+        self.monotonic.return_value = 105.0
+        self.hub.run_once()
+        conn.heartbeat_tick.assert_called_once_with()
+        assert self.hub.heartbeats.next_deadline() == 110.0
+
+    def test_heartbeat_tick__missed(self):
+        conn = self.connection()
+        exc = conn.heartbeat_tick.side_effect = ConnectionForced('missed')
+        self.hub.add(conn)
+        self.monotonic.return_value = 105.0
+        self.hub.run_once()
+        self.on_error.assert_called_once_with(conn, exc)
+        assert conn not in self.hub.connections
+        assert self.hub.heartbeats.next_deadline() is None
+
+    def test_heartbeat_tick__removed(self):
+        conn = self.connection()
+        self.hub.add(conn)
+        self.hub.remove(conn)
+        self.monotonic.return_value = 105.0
+        self.hub.run_once()
+        conn.heartbeat_tick.assert_not_called()
+        assert self.hub.heartbeats.next_deadline() is None
+
+    def test_heartbeat_tick__added_again(self):
+        conn = self.connection()
+        self.hub.add(conn)
+        self.hub.remove(conn)
+        self.monotonic.return_value = 101.0
+        self.hub.add(conn)
+        self.monotonic.return_value = 105.0
+        self.hub.run_once()
+        conn.heartbeat_tick.assert_not_called()
+        self.monotonic.return_value = 106.0
+        self.hub.run_once()
+        conn.heartbeat_tick.assert_called_once_with()
+
+    def test_no_heartbeat(self):
+        self.hub.add(self.connection(heartbeat=0))
+        self.hub.run_once()
+        self.selector.select.assert_called_with(None)
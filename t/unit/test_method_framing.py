@@ -1,12 +1,18 @@
 from __future__ import absolute_import, unicode_literals
 
+import io
+import mmap
+import tempfile
+import threading
+
 import pytest
 from case import Mock
 
 from amqp import spec
-from amqp.basic_message import Message
-from amqp.exceptions import UnexpectedFrame
-from amqp.method_framing import frame_handler, frame_writer
+from amqp.basic_message import CompactMessage, Message
+from amqp.exceptions import RecoverableConnectionError, UnexpectedFrame
+from amqp.method_framing import (frame_handler, frame_writer,
+                                 locked_frame_writer)
 from amqp.platform import pack
 
 
@@ -16,6 +22,11 @@ class test_frame_handler:
     def setup_conn(self):
         self.conn = Mock(name='connection')
         self.conn.bytes_recv = 0
+        self.conn.lazy_properties = False
+        self.conn.bytearray_bodies = False
+        self.conn.spool_threshold = None
+        self.conn._stream_channels = set()
+        self.conn.message_class = Message
         self.callback = Mock(name='callback')
         self.g = frame_handler(self.conn, self.callback)
 
@@ -66,6 +77,112 @@ class test_frame_handler:
         )
         assert msg.body == b'thequickbrownfox'
 
+    def test_header_message_bytearray_bodies(self):
+        self.conn.bytearray_bodies = True
+        self.g = frame_handler(self.conn, self.callback)
+        self.g((1, 1, pack('>HH', *spec.Basic.Deliver)))
+        m = Message()
+        buf = pack('>HxxQ', m.CLASS_ID, 16) + m._serialize_properties()
+        self.g((2, 1, buf))
+        self.g((3, 1, memoryview(b'thequick')))
+        self.g((3, 1, memoryview(b'brownfox')))
+        msg = self.callback.call_args[0][3]
+        assert isinstance(msg.body, bytearray)
+        assert msg.body == b'thequickbrownfox'
+
+    def test_header_message_spooled(self):
+        self.conn.spool_threshold = 8
+        self.g = frame_handler(self.conn, self.callback)
+        self.g((1, 1, pack('>HH', *spec.Basic.Deliver)))
+        m = Message()
+        buf = pack('>HxxQ', m.CLASS_ID, 16) + m._serialize_properties()
+        self.g((2, 1, buf))
+        self.g((3, 1, memoryview(b'thequick')))
+        self.g((3, 1, memoryview(b'brownfox')))
+        msg = self.callback.call_args[0][3]
+        assert isinstance(msg.body, mmap.mmap)
+        assert msg.body[:] == b'thequickbrownfox'
+
+    def test_header_message_lazy_properties(self):
+        self.conn.lazy_properties = True
+        self.g = frame_handler(self.conn, self.callback)
+        self.g((1, 1, pack('>HH', *spec.Basic.Deliver)))
+
+        m = Message(content_type='text/plain', priority=3)
+        buf = pack('>HxxQ', m.CLASS_ID, 0)
+        buf += m._serialize_properties()
+        self.g((2, 1, buf))
+
+        msg = self.callback.call_args[0][3]
+        assert msg._raw_properties
+        assert msg.priority == 3
+        assert msg.properties == {
+            'content_type': 'text/plain',
+            'content_encoding': 'utf-8',
+            'priority': 3,
+        }
+
+    def _stream(self):
+        stream = Mock(name='stream')
+        self.conn._stream_channels = {1}
+        self.conn.channels = {1: Mock(name='channel')}
+        self.conn.channels[1]._stream_for.return_value = stream
+        self.g = frame_handler(self.conn, self.callback)
+        return stream
+
+    def test_stream(self):
+        stream = self._stream()
+        self.g((1, 1, pack('>HH', *spec.Basic.Deliver)))
+        m = Message()
+        buf = pack('>HxxQ', m.CLASS_ID, 16) + m._serialize_properties()
+        self.g((2, 1, buf))
+        msg = self.callback.call_args[0][3]
+        self.callback.assert_called_once_with(
+            1, msg.frame_method, msg.frame_args, msg,
+        )
+        self.conn.channels[1]._stream_for.assert_called_once_with(msg)
+
+        self.g((3, 1, b'thequick'))
+        stream.on_chunk.assert_called_once_with(msg, memoryview(b'thequick'))
+        assert isinstance(stream.on_chunk.call_args[0][1], memoryview)
+        stream.complete.assert_not_called()
+        self.g((3, 1, memoryview(b'brownfox')))
+        stream.on_chunk.assert_called_with(msg, memoryview(b'brownfox'))
+        stream.complete.assert_called_once_with(msg)
+        assert msg.ready
+        assert not msg.body
+        assert self.callback.call_count == 1
+
+        # the next message is not streamed.
+        self.conn.channels[1]._stream_for.return_value = None
+        self.g((1, 1, pack('>HH', *spec.Basic.Deliver)))
+        self.g((2, 1, buf))
+        self.g((3, 1, b'thequickbrownfox'))
+        assert self.callback.call_args[0][3].body == b'thequickbrownfox'
+        assert stream.on_chunk.call_count == 2
+
+    def test_stream__empty_body(self):
+        stream = self._stream()
+        self.g((1, 1, pack('>HH', *spec.Basic.Deliver)))
+        m = Message()
+        buf = pack('>HxxQ', m.CLASS_ID, 0) + m._serialize_properties()
+        self.g((2, 1, buf))
+        msg = self.callback.call_args[0][3]
+        stream.complete.assert_called_once_with(msg)
+        stream.on_chunk.assert_not_called()
+        with pytest.raises(UnexpectedFrame):
+            self.g((3, 1, b'foo'))
+
+    def test_message_class(self):
+        self.conn.message_class = CompactMessage
+        self.g = frame_handler(self.conn, self.callback)
+        self.g((1, 1, pack('>HH', *spec.Basic.Deliver)))
+        m = Message()
+        buf = pack('>HxxQ', m.CLASS_ID, 0) + m._serialize_properties()
+        self.g((2, 1, buf))
+        msg = self.callback.call_args[0][3]
+        assert isinstance(msg, CompactMessage)
+
     def test_heartbeat_frame(self):
         self.g((8, 1, ''))
         assert self.conn.bytes_recv
@@ -97,10 +214,200 @@ class test_frame_writer:
         msg = Message(body=b'y' * 2048, content_type='utf-8')
         frame = 2, 1, spec.Basic.Publish, b'x' * 10, msg
         self.g(*frame)
-        self.write.assert_called()
+        self.transport.writev.assert_called()
+        self.write.assert_not_called()
+
+    def test_write_slow_content__frames(self):
+        body = b''.join(pack('>H', i) for i in range(1024))
+        msg = Message(body=body, content_type='utf-8')
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10, msg)
+        data = b''.join(
+            bytes(bytearray(b)) for b in self.transport.writev.call_args[0][0])
+
+        properties = msg._serialize_properties()
+        header = pack('>HHQ', 60, 0, len(body)) + properties
+        chunk_size = self.connection.frame_max - 8
+        expected = [
+            pack('>BHIHH', 1, 1, 14, 60, 40) + b'x' * 10 + b'\xce',
+            pack('>BHI', 2, 1, len(header)) + header + b'\xce',
+        ]
+        for i in range(0, len(body), chunk_size):
+            chunk = body[i:i + chunk_size]
+            expected.append(pack('>BHI', 3, 1, len(chunk)) + chunk + b'\xce')
+        assert data == b''.join(expected)
+
+    def test_write_slow_content__unicode(self):
+        msg = Message(body='\N{SNOWMAN}' * 1024, content_type='utf-8')
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10, msg)
+        buffers = self.transport.writev.call_args[0][0]
+        body = b''.join(bytes(bytearray(b)) for b in buffers[3::2])
+        assert body == msg.body.encode('utf-8')
 
     def test_write_zero_len_body(self):
         msg = Message(body=b'', content_type='application/octet-stream')
         frame = 2, 1, spec.Basic.Publish, b'x' * 10, msg
         self.g(*frame)
         self.write.assert_called()
+
+    def test_write_to_out(self):
+        out = []
+        msg = Message(body=b'y' * 10, content_type='utf-8')
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10, msg, out)
+        msg = Message(body=b'y' * 2048, content_type='utf-8')
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10, msg, out)
+        self.write.assert_not_called()
+        self.transport.writev.assert_not_called()
+        assert isinstance(out[0], bytes)
+        assert len(out) > 2
+
+    BODY = b''.join(pack('>H', i) for i in range(1024))
+
+    def written(self):
+        return b''.join(
+            bytes(bytearray(buf)) for c in self.transport.writev.call_args_list
+            for buf in c[0][0])
+
+    def expected(self, body=BODY, chunks=None):
+        # frames written for the same body in memory.
+        transport = Mock(name='transport')
+        g = frame_writer(self.connection, transport)
+        g(1, 1, spec.Basic.Publish, b'x' * 10,
+          Message(body, content_type='utf-8'))
+        if transport.write.called:
+            expected = bytes(bytearray(transport.write.call_args[0][0]))
+        else:
+            expected = b''.join(
+                bytes(bytearray(buf))
+                for buf in transport.writev.call_args[0][0]
+            )
+        if chunks is not None:
+            # body frames the size of the chunks.
+            header = expected[:expected.index(b'\xce', 28) + 1]
+            expected = header + b''.join(
+                pack('>BHI', 3, 1, len(chunk)) + chunk + b'\xce'
+                for chunk in chunks)
+        return expected
+
+    def test_write_mmap(self):
+        body = mmap.mmap(-1, len(self.BODY))
+        body.write(self.BODY)
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+               Message(body, content_type='utf-8'))
+        assert self.written() == self.expected()
+        self.write.assert_not_called()
+
+    def test_write_small_memoryview(self):
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+               Message(memoryview(b'foo'), content_type='utf-8'))
+        assert self.written() == self.expected(b'foo')
+
+    def test_write_empty_memoryview(self):
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+               Message(memoryview(b''), content_type='utf-8'))
+        # the content header is sent, without body frames.
+        assert self.written() == self.expected(b'')
+
+    def test_write_file(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(b'skipped' + self.BODY)
+            f.seek(7)
+            self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+                   Message(f, content_type='utf-8'))
+        assert self.connection.bytes_sent == 1
+        assert self.written() == self.expected()
+
+    def test_write_file__body_size(self):
+        f = io.BytesIO(self.BODY + b'not sent')
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+               Message(f, body_size=len(self.BODY), content_type='utf-8'))
+        assert self.written() == self.expected()
+
+    def test_write_file__raw(self):
+        class RawFile(object):
+            def __init__(self, data):
+                self.read = io.BytesIO(data).read
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+               Message(RawFile(self.BODY), body_size=len(self.BODY),
+                       content_type='utf-8'))
+        assert self.written() == self.expected()
+
+    def test_write_file__truncated(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(self.BODY)
+            f.seek(0)
+            with pytest.raises(ValueError):
+                self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+                       Message(f, body_size=len(self.BODY) + 1))
+        # checked before writing anything.
+        self.transport.writev.assert_not_called()
+        self.transport.close.assert_not_called()
+
+    def test_write_file__truncated_unknown_size(self):
+        f = io.BytesIO(self.BODY)
+        with pytest.raises(RecoverableConnectionError):
+            self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+                   Message(f, body_size=len(self.BODY) + 1))
+        # the frames announced by the header can't be sent anymore.
+        self.transport.close.assert_called_once_with()
+
+    def test_write_iterator(self):
+        chunks = [b'a' * 10, b'b' * 600, b'c']
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+               Message(iter(chunks), body_size=611, content_type='utf-8'))
+        # chunks larger than a frame are split.
+        assert self.written() == self.expected(
+            b''.join(chunks), [b'a' * 10, b'b' * 504, b'b' * 96, b'c'])
+
+    def test_write_iterator__to_out(self):
+        out = []
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+               Message(iter([b'foo', 'bar']), body_size=6,
+                       content_type='utf-8'), out)
+        self.transport.writev.assert_not_called()
+        assert b''.join(bytes(bytearray(buf)) for buf in out) == self.expected(
+            b'foobar', [b'foo', b'bar'])
+
+    def test_write_iterator__no_body_size(self):
+        with pytest.raises(ValueError):
+            self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+                   Message(iter([b'foo'])))
+        self.transport.writev.assert_not_called()
+
+    def test_write_iterator__too_large(self):
+        with pytest.raises(RecoverableConnectionError):
+            self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+                   Message(iter([b'foo', b'bar']), body_size=4))
+        self.transport.close.assert_called_once_with()
+
+    def test_write_iterator__too_large_to_out(self):
+        out = []
+        with pytest.raises(ValueError):
+            self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+                   Message(iter([b'foo', b'bar']), body_size=4), out)
+        self.transport.close.assert_not_called()
+
+    def test_write_iterator__read_error(self):
+        def chunks():
+            yield b'foo'
+            raise IOError()
+        with pytest.raises(RecoverableConnectionError):
+            self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+                   Message(chunks(), body_size=6))
+        self.transport.close.assert_called_once_with()
+
+    def test_write_iterator__empty(self):
+        self.g(1, 1, spec.Basic.Publish, b'x' * 10,
+               Message(iter([]), body_size=0, content_type='utf-8'))
+        assert self.written() == self.expected(b'')
+
+
+class test_locked_frame_writer:
+
+    def test_write_frame(self):
+        lock = threading.RLock()
+        write_frame = Mock(name='write_frame')
+        write_frame.side_effect = lambda *args: lock._is_owned()
+        locked = locked_frame_writer(write_frame, lock)
+        assert locked(8, 0, None, None, None)
+        write_frame.assert_called_once_with(8, 0, None, None, None)
+        assert not lock._is_owned()
@@ -0,0 +1,234 @@
+from __future__ import absolute_import, unicode_literals
+
+import socket
+import threading
+
+import pytest
+from case import Mock
+
+from amqp.exceptions import (ConnectionForced, PoolLimitExceeded,
+                             RecoverableConnectionError)
+from amqp.pool import ChannelPool, ConnectionPool
+
+
+def _connection(*args, **kwargs):
+    conn = Mock(name='connection')
+    conn.connected = True
+    conn.heartbeat = 0
+    conn.heartbeat_thread = None
+    conn.connection_errors = (socket.error, IOError)
+    conn.drain_events.side_effect = socket.timeout()
+    conn.kwargs = kwargs
+    conn.channel.side_effect = lambda: _channel(conn)
+    return conn
+
+
+def _channel(connection):
+    channel = Mock(name='channel')
+    channel.connection = connection
+    channel.is_open = True
+    channel.callbacks = {}
+    return channel
+
+
+class test_ChannelPool:
+
+    @pytest.fixture(autouse=True)
+    def setup_pool(self):
+        self.conn = _connection()
+        self.pool = ChannelPool(self.conn, limit=2)
+
+    def test_acquire__new(self):
+        channel = self.pool.acquire()
+        assert channel.connection is self.conn
+        self.conn.channel.assert_called_once_with()
+
+    def test_release__reused(self):
+        channel = self.pool.acquire()
+        self.pool.release(channel)
+        assert len(self.pool) == 1
+        assert self.pool.acquire() is channel
+        channel.close.assert_not_called()
+
+    def test_release__closed_channel(self):
+        channel = self.pool.acquire()
+        channel.is_open = False
+        self.pool.release(channel)
+        assert not len(self.pool)
+        channel.close.assert_not_called()
+
+    def test_release__consumers(self):
+        channel = self.pool.acquire()
+        channel.callbacks['ctag'] = Mock()
+        self.pool.release(channel)
+        assert not len(self.pool)
+        channel.close.assert_called_once_with()
+
+    def test_release__limit(self):
+        channels = [self.pool.acquire() for _ in range(3)]
+        for channel in channels:
+            self.pool.release(channel)
+        assert len(self.pool) == 2
+        channels[2].close.assert_called_once_with()
+
+    def test_acquire__skips_closed(self):
+        channel = self.pool.acquire()
+        self.pool.release(channel)
+        channel.is_open = False
+        assert self.pool.acquire() is not channel
+
+    def test_channel(self):
+        with self.pool.channel() as channel:
+            pass
+        assert self.pool.acquire() is channel
+
+    def test_close(self):
+        channel = self.pool.acquire()
+        self.pool.release(channel)
+        channel.close.side_effect = KeyError()
+        self.pool.close()
+        assert not len(self.pool)
+        channel.close.assert_called_once_with()
+
+
+class test_ConnectionPool:
+
+    @pytest.fixture(autouse=True)
+    def setup_pool(self):
+        self.connection_class = Mock(name='connection_class')
+        self.connection_class.side_effect = _connection
+        self.pool = ConnectionPool(
+            limit=2, connection_class=self.connection_class, host='foo')
+
+    def test_acquire__new(self):
+        conn = self.pool.acquire()
+        assert conn.kwargs == {'host': 'foo'}
+        conn.connect.assert_called_once_with()
+        assert len(self.pool) == 1
+
+    def test_acquire__connect_fails(self):
+        self.connection_class.side_effect = socket.error()
+        with pytest.raises(socket.error):
+            self.pool.acquire()
+        assert not len(self.pool)
+
+    def test_release__reused(self):
+        conn = self.pool.acquire()
+        self.pool.release(conn)
+        assert self.pool.acquire() is conn
+        conn.drain_events.assert_called_with(timeout=0)
+        assert len(self.pool) == 1
+
+    def test_release__disconnected(self):
+        conn = self.pool.acquire()
+        conn.connected = False
+        self.pool.release(conn)
+        conn.collect.assert_called_once_with()
+        assert not len(self.pool)
+
+    def test_acquire__closed_by_broker(self):
+        conn = self.pool.acquire()
+        self.pool.release(conn)
+
+        def drain_events(timeout=None):
+            conn.connected = False
+            raise ConnectionForced('closed')
+        conn.drain_events.side_effect = drain_events
+        other = self.pool.acquire()
+        assert other is not conn
+        conn.collect.assert_called_once_with()
+        assert len(self.pool) == 1
+
+    def test_acquire__heartbeats_missed(self):
+        conn = self.pool.acquire()
+        conn.heartbeat = 10
+        conn.heartbeat_tick.side_effect = ConnectionForced('missed')
+        self.pool.release(conn)
+        assert self.pool.acquire() is not conn
+        conn.close.assert_called_once_with()
+
+    def test_acquire__heartbeat_thread(self):
+        conn = self.pool.acquire()
+        conn.heartbeat = 10
+        conn.heartbeat_thread = Mock(name='heartbeat_thread')
+        self.pool.release(conn)
+        assert self.pool.acquire() is conn
+        conn.heartbeat_tick.assert_not_called()
+
+    def test_acquire__limit(self):
+        self.pool.acquire()
+        self.pool.acquire()
+        with pytest.raises(PoolLimitExceeded):
+            self.pool.acquire(block=False)
+        with pytest.raises(PoolLimitExceeded):
+            self.pool.acquire(timeout=0.01)
+
+    def test_acquire__waits_for_release(self):
+        conn = self.pool.acquire()
+        self.pool.acquire()
+        threading.Timer(0.05, self.pool.release, (conn,)).start()
+        assert self.pool.acquire(timeout=5) is conn
+
+    def test_evict_idle(self, patching):
+        monotonic = patching('amqp.pool.monotonic')
+        monotonic.return_value = 100.0
+        self.pool.max_idle = 10
+        conn1, conn2 = self.pool.acquire(), self.pool.acquire()
+        self.pool.release(conn1)
+        monotonic.return_value = 105.0
+        self.pool.release(conn2)
+        monotonic.return_value = 111.0
+        self.pool.evict_idle()
+        conn1.close.assert_called_once_with()
+        conn2.close.assert_not_called()
+        assert len(self.pool) == 1
+
+    def test_connection(self):
+        with self.pool.connection() as conn:
+            pass
+        assert self.pool.acquire() is conn
+
+    def test_connection__error(self):
+        with pytest.raises(KeyError):
+            with self.pool.connection() as conn:
+                raise KeyError()
+        assert self.pool.acquire() is conn
+
+    def test_connection__connection_error(self):
+        with pytest.raises(socket.error):
+            with self.pool.connection() as conn:
+                raise socket.error()
+        conn.close.assert_called_once_with()
+        assert not len(self.pool)
+
+    def test_channel(self):
+        with self.pool.channel() as channel:
+            conn = channel.connection
+        with self.pool.channel() as channel2:
+            pass
+        assert channel2 is channel
+        conn.channel.assert_called_once_with()
+
+    def test_discard__closes_channels(self):
+        with self.pool.channel() as channel:
+            conn = channel.connection
+        self.pool.discard(conn)
+        channel.close.assert_called_once_with()
+        conn.close.assert_called_once_with()
+
+    def test_discard__close_fails(self):
+        conn = self.pool.acquire()
+        conn.close.side_effect = socket.error()
+        self.pool.discard(conn)
+        conn.collect.assert_called_once_with()
+
+    def test_close(self):
+        conn1, conn2 = self.pool.acquire(), self.pool.acquire()
+        self.pool.release(conn1)
+        self.pool.close()
+        conn1.close.assert_called_once_with()
+        self.pool.release(conn2)
+        conn2.close.assert_called_once_with()
+        assert not len(self.pool)
+        with pytest.raises(RecoverableConnectionError):
+            self.pool.acquire()
@@ -1,5 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 
+import mmap
+import sys
 from datetime import datetime
 from decimal import Decimal
 from math import ceil
@@ -8,8 +10,10 @@ import pytest
 
 from amqp.basic_message import Message
 from amqp.exceptions import FrameSyntaxError
-from amqp.platform import pack
-from amqp.serialization import GenericContent, _read_item, dumps, loads
+from amqp.platform import pack, unpack_from
+from amqp.serialization import (GenericContent, _compile_dumps,
+                                _compile_loads, _read_item, _ShortstrCache,
+                                decode_properties_basic, dumps, loads)
 
 
 class _ANY(object):
@@ -56,6 +60,37 @@ class test_serialization:
             datetime(2015, 3, 13, 10, 23),
         ] == y[0]
 
+    def test_roundtrip__consecutive_bits(self):
+        format = 'BssbbbbbbbbbF'
+        values = [0, 'q', 't'] + [True, False, True] * 3 + [{'x': 1}]
+        x = dumps(format, values)
+        # nine bits are packed into two octets
+        assert len(x) == 2 + 2 + 2 + 2 + 4 + 7
+        assert loads(format, x) == (values, len(x))
+
+    def test_loads__offset(self):
+        x = b'\0' * 3 + dumps('sLbss', ['ctag', 312, True, 'ex', 'rk'])
+        assert loads('sLbss', x, 3) == (['ctag', 312, True, 'ex', 'rk'],
+                                        len(x))
+
+    def test_codecs_are_cached(self):
+        codecs = {}
+        x = dumps('Bssbb', [0, 'ex', 'rk', False, True], _codecs=codecs)
+        encode = codecs['Bssbb']
+        dumps('Bssbb', [0, 'ex', 'rk', False, True], _codecs=codecs)
+        assert codecs['Bssbb'] is encode
+        assert x == _compile_dumps('Bssbb')([0, 'ex', 'rk', False, True])
+
+        codecs = {}
+        loads('Bssbb', x, _codecs=codecs)
+        decode = codecs['Bssbb']
+        loads('Bssbb', x, _codecs=codecs)
+        assert codecs['Bssbb'] is decode
+        assert _compile_loads('Bssbb')(x, 0) == loads('Bssbb', x)
+
+    def test_dumps__fewer_values(self):
+        assert dumps('Bsb', [3]) == pack('>H', 3)
+
     def test_int_boundaries(self):
         format = b'F'
         x = dumps(format, [
@@ -78,6 +113,17 @@ class test_serialization:
         table = {'foo': 32, 'bar': 'baz', 'nil': None}
         assert loads(b'F', dumps(b'F', [table]))[0][0] == table
 
+    def test_table__nested(self):
+        table = {'a': {'b': {'c': [1, {'d': 'e'}, []]}, 'f': {}}, 'g': 1}
+        buf = dumps(b'FS', [table, 'after'])
+        assert loads(b'FS', buf) == ([table, 'after'], len(buf))
+        # the length of the outer table covers the nested ones.
+        assert unpack_from('>I', buf, 0)[0] == len(buf) - 4 - 4 - 5
+
+    def test_table__nested_unknown_type(self):
+        with pytest.raises(FrameSyntaxError):
+            dumps('F', [{'a': {'b': object()}}])
+
     def test_array(self):
         array = [
             'A', 1, True, 33.3,
@@ -97,6 +143,47 @@ class test_serialization:
             dumps('A', [[object()]])
 
 
+class test_ShortstrCache:
+
+    @pytest.mark.skipif(sys.version_info[0] < 3,
+                        reason='shortstr arguments are unicode on Python 2')
+    def test_shared(self):
+        x = dumps('sLbss', ['ctag', 1, False, 'ex', 'rk'])
+        y = dumps('sLbss', ['ctag', 2, False, 'ex', 'rk'])
+        a, b = loads('sLbss', x)[0], loads('sLbss', y)[0]
+        assert a == ['ctag', 1, False, 'ex', 'rk']
+        assert a[3] is b[3]
+        assert a[4] is b[4]
+
+    def test_table_keys(self):
+        x = dumps('F', [{'some-header': 1}])
+        a, b = loads('F', x)[0][0], loads('F', x)[0][0]
+        assert list(a)[0] is list(b)[0]
+
+    def test_properties(self):
+        m = Message(content_type='text/plain', message_id='1')
+        buf = m._serialize_properties()
+        a = decode_properties_basic(buf)[0]
+        b = decode_properties_basic(bytearray(buf))[0]
+        assert a == b == {
+            'content_type': 'text/plain', 'content_encoding': 'utf-8',
+            'message_id': '1',
+        }
+        assert a['content_type'] is b['content_type']
+
+    def test_maxsize(self):
+        cache = _ShortstrCache(maxsize=2)
+        assert cache[b'a'] == 'a'
+        assert cache[b'b'] == 'b'
+        assert len(cache) == 2
+        assert cache[b'c'] == 'c'
+        assert list(cache) == [b'c']
+
+    def test_loads__bytearray(self):
+        x = bytearray(dumps('sLbss', ['ctag', 1, False, 'ex', 'rk']))
+        assert loads('sLbss', x)[0] == ['ctag', 1, False, 'ex', 'rk']
+
+
 class test_GenericContent:
 
     @pytest.fixture(autouse=True)
@@ -169,6 +256,97 @@ class test_GenericContent:
         assert m.properties['content_type'] == 'application/json'
         assert not m.ready
 
+    def test_inbound_header__lazy(self):
+        m = Message()
+        m.properties = {
+            'content_type': 'application/json',
+            'content_encoding': 'utf-8',
+            'application_headers': {'foo': 1},
+            'delivery_mode': 2,
+        }
+        buf = pack('>HxxQ', m.CLASS_ID, 16) + m._serialize_properties()
+        m2 = Message()
+        assert m2.inbound_header(buf, lazy=True) == 12
+        assert m2.body_size == 16
+        assert m2.content_type == 'application/json'
+        assert m2.content_encoding == 'utf-8'
+        assert m2._raw_properties
+
+        assert m2.headers == {'foo': 1}
+        assert m2._raw_properties is None
+        assert m2.delivery_mode == 2
+        assert m2.properties == m.properties
+
+    def test_inbound_header__lazy_missing_head(self):
+        # only delivery_mode is set.
+        buf = pack('>HxxQHB', Message.CLASS_ID, 16, 0x1000, 2)
+        m2 = Message()
+        m2.inbound_header(buf, lazy=True)
+        assert not hasattr(m2, 'content_encoding')
+        assert m2._raw_properties
+        assert m2.properties == {'delivery_mode': 2}
+        assert m2._raw_properties is None
+
+    def test_inbound_header__lazy_set_properties(self):
+        m = Message()
+        m.properties = {'content_type': 'text/plain', 'delivery_mode': 2}
+        buf = pack('>HxxQ', m.CLASS_ID, 16) + m._serialize_properties()
+        m2 = Message()
+        m2.inbound_header(buf, lazy=True)
+        m2.properties = {'priority': 1}
+        assert m2.properties == {'priority': 1}
+        assert not hasattr(m2, 'content_type')
+
+    def _received(self, lazy=False):
+        # content_type and application_headers, but no content_encoding
+        # as Message would add when encoding the properties.
+        properties = pack('>H', 0xa000) + dumps(
+            'sF', ['text/plain', {'foo': 1}])
+        buf = pack('>HxxQ', Message.CLASS_ID, 16) + properties
+        m = Message()
+        m.inbound_header(buf, lazy=lazy)
+        return m, properties
+
+    def test_serialize_properties__received(self):
+        m, properties = self._received()
+        assert m._serialize_properties() == properties
+        assert 'content_encoding' not in m.properties
+
+    def test_serialize_properties__received_lazy(self):
+        m, properties = self._received(lazy=True)
+        assert m._serialize_properties() == properties
+        assert m._raw_properties
+
+    def test_serialize_properties__received_scalar_access(self):
+        m, properties = self._received()
+        assert m.content_type == 'text/plain'
+        with pytest.raises(AttributeError):
+            m.priority
+        assert m._serialize_properties() == properties
+
+    def test_serialize_properties__received_modified(self):
+        m, properties = self._received()
+        m.headers['foo'] = 2
+        assert m._serialize_properties() != properties
+        assert m._encoded_properties is None
+        m2 = Message()
+        m2._load_properties(m2.CLASS_ID, m._serialize_properties())
+        assert m2.headers == {'foo': 2}
+
+    def test_serialize_properties__received_table_access(self):
+        m, _ = self._received()
+        m.application_headers['foo'] = 2
+        m2 = Message()
+        m2._load_properties(m2.CLASS_ID, m._serialize_properties())
+        assert m2.headers == {'foo': 2}
+
+    def test_serialize_properties__received_replaced(self):
+        m, _ = self._received()
+        m.properties = {'priority': 3}
+        m2 = Message()
+        m2._load_properties(m2.CLASS_ID, m._serialize_properties())
+        assert m2.properties == {'priority': 3, 'content_encoding': 'utf-8'}
+
     def test_inbound_header__empty_body(self):
         m = Message()
         m.properties = {}
@@ -193,3 +371,59 @@ class test_GenericContent:
         m.body_size = 16
         m.inbound_body('thequickbrownfox')
         assert m.ready
+
+    def test_inbound_body__memoryview(self):
+        m = Message()
+        m.body_size = 16
+        buf = bytearray(b'thequickbrownfox')
+        m.inbound_body(memoryview(buf)[:8])
+        buf[:8] = b'\0' * 8
+        m.inbound_body(memoryview(buf)[8:])
+        assert m.ready
+        assert m.body == b'thequickbrownfox'
+
+    def test_inbound_body__inplace(self):
+        m = Message()
+        m.body_size = 16
+        buf = bytearray(b'thequickbrownfox')
+        m.inbound_body(memoryview(buf)[:8], inplace=True)
+        assert not m.ready
+        body = m._pending_chunks
+        assert len(body) == 16
+        buf[:8] = b'\0' * 8
+        m.inbound_body(memoryview(buf)[8:], inplace=True)
+        assert m.ready
+        assert m.body is body
+        assert m.body == b'thequickbrownfox'
+        assert m._pending_chunks is None
+
+    def test_inbound_body__inplace_single_frame(self):
+        m = Message()
+        m.body_size = 3
+        m.inbound_body(b'foo', inplace=True)
+        assert m.ready
+        assert m.body == bytearray(b'foo')
+
+    def test_inbound_body__spool(self):
+        m = Message()
+        m.body_size = 16
+        buf = bytearray(b'thequickbrownfox')
+        m.inbound_body(memoryview(buf)[:8], spool=8)
+        assert not m.ready
+        spool = m._pending_chunks
+        buf[:8] = b'\0' * 8
+        m.inbound_body(memoryview(buf)[8:], spool=8)
+        assert m.ready
+        assert spool.closed
+        assert m._pending_chunks is None
+        assert isinstance(m.body, mmap.mmap)
+        assert m.body[:] == b'thequickbrownfox'
+        with pytest.raises(TypeError):
+            m.body[0] = b'x'
+        m.body.close()
+
+    def test_inbound_body__spool_below_threshold(self):
+        m = Message()
+        m.body_size = 16
+        m.inbound_body(b'thequickbrownfox', spool=16)
+        assert m.body == b'thequickbrownfox'
@@ -0,0 +1,233 @@
+from __future__ import absolute_import, unicode_literals
+
+import socket
+import threading
+
+import pytest
+from case import ContextMock, Mock, call
+
+from amqp import spec
+from amqp.exceptions import RecoverableConnectionError
+from amqp.five import monotonic
+from amqp.threadsafe import ThreadSafeChannel, ThreadSafeConnection
+
+
+class test_ThreadSafeConnection:
+
+    @pytest.fixture(autouse=True)
+    def setup_conn(self):
+        self.conn = ThreadSafeConnection(
+            frame_handler=Mock(name='frame_handler'),
+            frame_writer=Mock(name='frame_writer'),
+        )
+        self.conn.Transport = Mock(name='Transport')
+        self.conn.transport = self.conn.Transport.return_value
+        self.conn.frame_writer = Mock(name='frame_writer')
+        self.conn._reader = Mock(name='reader')
+        self.channel = Mock(name='channel')
+        self.conn.channels[1] = self.channel
+
+    def test_channel_class(self):
+        assert self.conn.Channel is ThreadSafeChannel
+
+    def test_connect(self):
+        conn = ThreadSafeConnection()
+        conn.Transport = Mock(name='Transport')
+        conn.transport = None
+        conn._handshake_complete = True
+        read = threading.Event()
+        conn.Transport.return_value.read_frame.side_effect = (
+            lambda: read.set() or read.wait())
+        conn.connect()
+        assert conn.write_lock is not None
+        assert conn._reader.daemon
+        assert read.wait(5)
+
+    def test_on_inbound_method__handshake(self):
+        self.conn._reader = None
+        self.conn.on_inbound_method(1, (60, 80), b'args', None)
+        self.channel.dispatch_method.assert_called_with(
+            (60, 80), b'args', None)
+
+    def test_drain_channel(self):
+        self.conn.on_inbound_method(1, (60, 80), b'1', None)
+        self.conn.on_inbound_method(1, (60, 80), b'2', None)
+        self.channel.dispatch_method.assert_not_called()
+        self.conn.drain_channel(1)
+        self.channel.dispatch_method.assert_has_calls([
+            call((60, 80), b'1', None), call((60, 80), b'2', None),
+        ])
+        assert not self.conn._owners
+
+    def test_drain_channel__timeout(self):
+        with pytest.raises(socket.timeout):
+            self.conn.drain_channel(1, timeout=0.01)
+        assert not self.conn._owners
+
+    def test_drain_channel__wakes_up(self):
+        def receive():
+            self.conn.on_inbound_method(1, (60, 80), b'1', None)
+        threading.Timer(0.05, receive).start()
+        self.conn.drain_channel(1, timeout=5)
+        self.channel.dispatch_method.assert_called_with(
+            (60, 80), b'1', None)
+
+    def test_drain_channel__reader_error(self):
+        self.conn._reader_error = IOError('Socket closed')
+        with pytest.raises(IOError):
+            self.conn.drain_channel(1)
+
+    def test_drain_channel__dispatch_error_keeps_queued(self):
+        self.channel.dispatch_method.side_effect = [KeyError('foo'), None]
+        self.conn.on_inbound_method(1, (60, 80), b'1', None)
+        self.conn.on_inbound_method(1, (60, 80), b'2', None)
+        with pytest.raises(KeyError):
+            self.conn.drain_channel(1)
+        self.conn.drain_channel(1)
+        self.channel.dispatch_method.assert_called_with(
+            (60, 80), b'2', None)
+
+    def test_drain_events(self):
+        channel2 = self.conn.channels[2] = Mock(name='channel2')
+        self.conn.on_inbound_method(1, (60, 80), b'1', None)
+        self.conn.on_inbound_method(2, (60, 80), b'2', None)
+        self.conn.drain_events(timeout=1)
+        self.channel.dispatch_method.assert_called_with(
+            (60, 80), b'1', None)
+        channel2.dispatch_method.assert_called_with((60, 80), b'2', None)
+
+    def test_drain_events__timeout(self):
+        channel = Mock(name='channel')
+        channel._batch_deadline.return_value = None
+        self.conn._batch_channels.add(channel)
+        self.conn._flush_batches = Mock(name='_flush_batches')
+        with pytest.raises(socket.timeout):
+            self.conn.drain_events(timeout=0.01)
+        self.conn._flush_batches.assert_called_with()
+
+    def test_drain_events__batch_deadline(self):
+        channel = Mock(name='channel')
+        channel._batch_deadline.return_value = monotonic() + 0.01
+        self.conn._batch_channels.add(channel)
+        self.conn._flush_batches = Mock(name='_flush_batches')
+        self.conn.drain_events()
+        self.conn._flush_batches.assert_called_with()
+
+    def test_drain_events__skips_channels_claimed_by_other_thread(self):
+        claimed, release = threading.Event(), threading.Event()
+
+        def waiter():
+            with self.conn._claimed(1):
+                claimed.set()
+                release.wait(5)
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        try:
+            assert claimed.wait(5)
+            self.conn.on_inbound_method(1, (60, 80), b'1', None)
+            with pytest.raises(socket.timeout):
+                self.conn.drain_events(timeout=0.01)
+            self.channel.dispatch_method.assert_not_called()
+        finally:
+            release.set()
+            thread.join()
+        self.conn.drain_events(timeout=1)
+        self.channel.dispatch_method.assert_called_with(
+            (60, 80), b'1', None)
+
+    def test_drain_events__claims_ready_channels(self):
+        # claimed before the condition is released, and so still
+        # claimed by the draining thread while dispatching.
+        self.conn.on_inbound_method(1, (60, 80), b'1', None)
+        current, owners = threading.current_thread(), self.conn._owners
+        dispatched = []
+        self.channel.dispatch_method.side_effect = lambda *a: (
+            dispatched.append(owners[1]))
+        self.conn.drain_events(timeout=1)
+        assert dispatched == [(current, 2)]
+        assert not owners
+
+    def test_claimed__reentrant(self):
+        with self.conn._claimed(1):
+            with self.conn._claimed(1):
+                assert self.conn._owners[1][1] == 2
+            assert self.conn._owners[1][1] == 1
+        assert not self.conn._owners
+
+    def test_claimed__waits_for_other_thread(self):
+        order = []
+
+        def other():
+            with self.conn._claimed(1):
+                order.append('other')
+        with self.conn._claimed(1):
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join(0.05)
+            order.append('current')
+        thread.join(5)
+        assert order == ['current', 'other']
+
+    def test_wait(self):
+        def receive():
+            self.conn.on_inbound_method(
+                0, spec.Connection.Blocked, b'', None)
+        self.conn.on_blocked = Mock(name='on_blocked')
+        threading.Timer(0.05, receive).start()
+        self.conn.wait(spec.Connection.Blocked, timeout=5)
+        self.conn.on_blocked.assert_called_once()
+
+    def test_read_frames(self):
+        self.conn.on_inbound_frame = Mock(name='on_inbound_frame')
+        self.conn.transport.read_frame.side_effect = [
+            (1, 1, b'1'), socket.timeout(), (1, 1, b'2'), IOError('closed'),
+        ]
+        self.conn._read_frames()
+        self.conn.on_inbound_frame.assert_has_calls([
+            call((1, 1, b'1')), call((1, 1, b'2')),
+        ])
+        assert isinstance(self.conn._reader_error, IOError)
+
+    def test_read_frames__connection_closed(self):
+        def read_frame():
+            self.conn._transport = None
+            raise IOError('closed')
+        self.conn.on_inbound_frame = Mock(name='on_inbound_frame')
+        self.conn.transport.read_frame.side_effect = read_frame
+        self.conn._read_frames()
+        assert isinstance(
+            self.conn._reader_error, RecoverableConnectionError)
+
+    def test_close__joins_reader(self):
+        self.conn.send_method = Mock(name='send_method')
+
+        def send_method(*args, **kwargs):
+            self.conn._transport = None
+        self.conn.send_method.side_effect = send_method
+        self.conn.close()
+        self.conn._reader.join.assert_called_with()
+
+
+class test_ThreadSafeChannel:
+
+    @pytest.fixture(autouse=True)
+    def setup_channel(self):
+        self.conn = Mock(name='connection')
+        self.conn.channels = {}
+        self.conn._get_free_channel_id.return_value = 2
+        self.c = ThreadSafeChannel(self.conn, 1)
+
+    def test_drain_events(self):
+        self.c._drain_events(3)
+        self.conn.drain_channel.assert_called_with(1, 3)
+        self.conn.drain_events.assert_not_called()
+
+    def test_basic_consume__stream(self):
+        with pytest.raises(NotImplementedError):
+            self.c.basic_consume('q', on_chunk=Mock(name='on_chunk'))
+
+    def test_wait_for_confirms(self):
+        self.conn._claimed.return_value = ContextMock()
+        self.c._unconfirmed = {}
+        assert self.c.wait_for_confirms()
+        self.conn._claimed.assert_called_with(1)
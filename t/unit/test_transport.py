@@ -1,6 +1,7 @@
 from __future__ import absolute_import, unicode_literals
 
 import errno
+import os
 import socket
 
 import pytest
@@ -299,11 +300,34 @@ class test_AbstractTransport:
         with pytest.raises(UnexpectedFrame):
             self.t.read_frame()
 
+    def test_read_frames(self):
+        self.t.read_frame = Mock(name='read_frame')
+        assert list(self.t.read_frames(10)) == [self.t.read_frame()]
+
+    def test_read_ready_frames(self):
+        self.t.read_frame = Mock(name='read_frame')
+        assert list(self.t.read_ready_frames()) == [self.t.read_frame()]
+
     def test_write__success(self):
         self.t._write = Mock()
         self.t.write('foo')
         self.t._write.assert_called_with('foo')
 
+    def test_writev(self):
+        self.t._write = Mock()
+        self.t.writev([b'the', memoryview(b'quick'), b'fox'])
+        self.t._write.assert_called_with(b'thequickfox')
+
+    def test_writev__EBADF(self):
+        self.t.connected = True
+        self.t._write = Mock()
+        exc = OSError()
+        exc.errno = errno.EBADF
+        self.t._write.side_effect = exc
+        with pytest.raises(OSError):
+            self.t.writev([b'foo'])
+        assert not self.t.connected
+
     def test_write__socket_timeout(self):
         self.t._write = Mock()
         self.t._write.side_effect = socket.timeout
@@ -497,6 +521,12 @@ class test_SSLTransport:
             assert ctx.check_hostname
             ctx.wrap_socket.assert_called_with(sock, f=1)
 
+    def test_read_ready_frames(self):
+        self.t.read_frame = Mock(name='read_frame')
+        self.t.sock = Mock(name='sock')
+        self.t.sock.pending.side_effect = [1, 1, 0]
+        assert len(list(self.t.read_ready_frames())) == 3
+
     def test_shutdown_transport(self):
         self.t.sock = None
         self.t._shutdown_transport()
@@ -527,3 +557,299 @@ class test_TCPTransport:
         assert self.t._write is self.t.sock.sendall
         assert self.t._read_buffer is not None
         assert self.t._quick_recv is self.t.sock.recv
+
+    def test_read_buffer_is_reused(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            buf = self.t._read_buffer
+            b.sendall(pack('>BHI', 1, 1, 16) + b'thequickbrownfox\xce')
+            b.sendall(pack('>BHI', 3, 1, 3) + b'fox\xce')
+            frame_type, channel, payload = self.t.read_frame()
+            assert (frame_type, channel) == (1, 1)
+            assert payload == b'thequickbrownfox'
+            assert isinstance(payload, bytes)
+            frame_type, channel, payload = self.t.read_frame()
+            assert (frame_type, channel) == (3, 1)
+            assert isinstance(payload, memoryview)
+            assert payload.tobytes() == b'fox'
+            assert self.t._read_buffer is buf
+        finally:
+            a.close()
+            b.close()
+
+    def test_readable(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            assert not self.t.readable()
+            b.sendall(pack('>BHI', 1, 1, 3) + b'fox\xce')
+            assert self.t.readable()
+            self.t.read_frame()
+            assert not self.t.readable()
+        finally:
+            a.close()
+            b.close()
+
+    def test_readable__frames_in_buffer(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            b.sendall((pack('>BHI', 1, 1, 3) + b'fox\xce') * 3)
+            assert len(list(self.t.read_frames(max_frames=1))) == 1
+            # complete frames left in the buffer, none on the socket.
+            assert self.t.readable()
+            a.settimeout(1)
+            assert len(list(self.t.read_ready_frames())) == 2
+            assert not self.t.readable()
+        finally:
+            a.close()
+            b.close()
+
+    def test_readable__partial_frame(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            frame = pack('>BHI', 1, 1, 3) + b'fox\xce'
+            b.sendall(frame + frame[:5])
+            assert len(list(self.t.read_frames())) == 1
+            assert not self.t.readable()
+        finally:
+            a.close()
+            b.close()
+
+    def test_readable__high_fd(self):
+        # select() can't watch file descriptors above FD_SETSIZE.
+        a, b = socket.socketpair()
+        fd = 1500
+        try:
+            os.dup2(a.fileno(), fd)
+        except OSError:
+            a.close()
+            b.close()
+            pytest.skip('cannot open fd {0}'.format(fd))
+        try:
+            self.t.sock = Mock(name='sock')
+            self.t.sock.fileno.return_value = fd
+            self.t._setup_transport()
+            assert not self.t.readable()
+            b.sendall(b'x')
+            assert self.t.readable()
+        finally:
+            os.close(fd)
+            a.close()
+            b.close()
+
+    def test_read_frame__grows_buffer(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.read_buffer_size = 16
+            self.t.sock = a
+            self.t._setup_transport()
+            body = b'x' * 100
+            b.sendall(pack('>BHI', 3, 1, len(body)) + body + b'\xce')
+            assert self.t.read_frame()[2].tobytes() == body
+            assert len(self.t._read_buffer) >= len(body) + 8
+        finally:
+            a.close()
+            b.close()
+
+    def test_read_frame__timeout_keeps_partial_frame(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            frame = pack('>BHI', 1, 1, 16) + b'thequickbrownfox\xce'
+            b.sendall(frame[:10])
+            with self.t.having_timeout(0.01):
+                with pytest.raises(socket.timeout):
+                    self.t.read_frame()
+            b.sendall(frame[10:])
+            assert self.t.read_frame() == (1, 1, b'thequickbrownfox')
+        finally:
+            a.close()
+            b.close()
+
+    def test_read_frame__socket_closed(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            b.close()
+            with pytest.raises(IOError):
+                self.t.read_frame()
+            assert not self.t.connected
+        finally:
+            a.close()
+
+    def test_read_frame__bad_frame_end(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            b.sendall(pack('>BHI', 1, 1, 3) + b'fox\x13')
+            with pytest.raises(UnexpectedFrame):
+                self.t.read_frame()
+        finally:
+            a.close()
+            b.close()
+
+    def test_read(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            b.sendall(b'thequickbrownfox')
+            assert self.t._read(8) == b'thequick'
+            assert self.t._read(8) == b'brownfox'
+        finally:
+            a.close()
+            b.close()
+
+    def test_read_frames(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            b.sendall(
+                pack('>BHI', 1, 1, 3) + b'the\xce' +
+                pack('>BHI', 1, 2, 5) + b'quick\xce' +
+                pack('>BHI', 1, 3, 5) + b'brown\xce' +
+                pack('>BHI', 1, 4, 3)
+            )
+            assert list(self.t.read_frames()) == [
+                (1, 1, b'the'), (1, 2, b'quick'), (1, 3, b'brown'),
+            ]
+            b.sendall(b'fox\xce')
+            assert list(self.t.read_frames()) == [(1, 4, b'fox')]
+        finally:
+            a.close()
+            b.close()
+
+    def test_read_frames__max_frames(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            b.sendall(b''.join(
+                pack('>BHI', 1, i, 3) + b'fox\xce' for i in range(5)))
+            assert len(list(self.t.read_frames(max_frames=2))) == 2
+            assert len(list(self.t.read_frames(max_frames=2))) == 2
+            assert list(self.t.read_frames(max_frames=2)) == [
+                (1, 4, b'fox'),
+            ]
+        finally:
+            a.close()
+            b.close()
+
+    def test_read_frames__unprocessed_frames_are_kept(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            b.sendall(b''.join(
+                pack('>BHI', 1, i, 3) + b'fox\xce' for i in range(3)))
+            frames = self.t.read_frames()
+            assert next(frames) == (1, 0, b'fox')
+            del frames
+            assert self.t.read_frame() == (1, 1, b'fox')
+        finally:
+            a.close()
+            b.close()
+
+    def test_read_ready_frames(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            b.sendall(
+                pack('>BHI', 1, 1, 3) + b'the\xce' +
+                pack('>BHI', 1, 2, 5) + b'quick\xce' +
+                pack('>BHI', 1, 3, 5) + b'bro'
+            )
+            assert list(self.t.read_ready_frames()) == [
+                (1, 1, b'the'), (1, 2, b'quick'),
+            ]
+            b.sendall(b'wn\xce')
+            assert list(self.t.read_ready_frames()) == [(1, 3, b'brown')]
+        finally:
+            a.close()
+            b.close()
+
+    def test_read_ready_frames__partial_header(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            frame = pack('>BHI', 1, 1, 3) + b'fox\xce'
+            b.sendall(frame[:4])
+            assert list(self.t.read_ready_frames()) == []
+            b.sendall(frame[4:])
+            assert list(self.t.read_ready_frames()) == [(1, 1, b'fox')]
+        finally:
+            a.close()
+            b.close()
+
+    def test_read_ready_frames__grows_buffer(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.read_buffer_size = 16
+            self.t.sock = a
+            self.t._setup_transport()
+            body = b'x' * 100
+            b.sendall(pack('>BHI', 1, 1, len(body)) + body + b'\xce')
+            frames = []
+            while not frames:
+                frames = list(self.t.read_ready_frames())
+            assert frames == [(1, 1, body)]
+        finally:
+            a.close()
+            b.close()
+
+    def test_read_ready_frames__socket_closed(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            b.close()
+            with pytest.raises(IOError):
+                list(self.t.read_ready_frames())
+            assert not self.t.connected
+        finally:
+            a.close()
+
+    def test_read_ready_frames__spurious_wakeup(self):
+        self.t.sock = Mock(name='sock')
+        self.t._setup_transport()
+        self.t._quick_recv_into = Mock(name='recv_into')
+        self.t._quick_recv_into.side_effect = socket.error(
+            errno.EAGAIN, 'again')
+        assert list(self.t.read_ready_frames()) == []
+
+    def test_writev(self):
+        a, b = socket.socketpair()
+        try:
+            self.t.sock = a
+            self.t._setup_transport()
+            body = memoryview(b'thequickbrownfox')
+            self.t.writev([b'the', body[3:8], b'', body[8:], b'!'])
+            assert b.recv(64) == b'thequickbrownfox!'
+        finally:
+            a.close()
+            b.close()
+
+    def test_writev__partial_sends(self):
+        self.t.sock = Mock(name='sock')
+        sent = []
+
+        def sendmsg(buffers):
+            data = b''.join(bytes(bytearray(buf)) for buf in buffers)[:3]
+            sent.append(data)
+            return len(data)
+        self.t.sock.sendmsg.side_effect = sendmsg
+        self.t._writev([b'the', b'quick', b'', b'brown', b'fox'], iov_max=2)
+        assert b''.join(sent) == b'thequickbrownfox'